@@ -0,0 +1,133 @@
+import os
+import math
+import time
+import threading
+from collections import Counter
+
+# TTL (s) das mensagens de steering quando nada indica estabilidade ou instabilidade
+DEFAULT_TTL = 10
+
+# Variação absoluta mínima para uma mudança de condição contar (evita que perdas de 0.01% -> 0.02% contem como incidente)
+CHANGE_FLOORS = {'latency': 10, 'packet_loss': 0.25, 'bandwidth': 0}
+
+class AdaptiveTTL:
+    """
+    TTL da mensagem de steering calculado pela estabilidade da rede.
+
+    A instabilidade (0 a 1) é o maior entre:
+      - o coeficiente de variação do throughput da sessão (média/variância móveis);
+      - a queda da QoE da sessão em relação à sua média móvel;
+      - a proximidade da última mudança no conjunto de nós saudáveis (monitor)
+        ou da última mudança significativa nas condições de rede (variação
+        relativa acima de change_threshold), com decaimento exponencial.
+
+    Com instabilidade 0 o TTL tende a max_ttl, com 1 vai a min_ttl. O TTL cai
+    imediatamente, mas só cresce por um fator (growth) a cada consulta: um período
+    estável curto não deixa o player dezenas de segundos sem reagir.
+    """
+    def __init__(self, min_ttl=4, max_ttl=30, initial_ttl=DEFAULT_TTL, alpha=0.3, cv_unstable=0.5,
+                 qoe_drop_unstable=0.5, churn_decay=30.0, change_threshold=0.25, growth=1.5):
+        if not 1 <= min_ttl <= max_ttl:
+            raise ValueError(f"Limites de TTL inválidos: mínimo {min_ttl}, máximo {max_ttl}")
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.initial_ttl = min(max(initial_ttl, min_ttl), max_ttl)
+        self.alpha = alpha  # Peso da amostra nova nas médias móveis
+        self.cv_unstable = cv_unstable  # Coeficiente de variação do throughput considerado instável
+        self.qoe_drop_unstable = qoe_drop_unstable  # Queda de QoE (abaixo da média) considerada instável
+        self.churn_decay = churn_decay  # Segundos para o efeito de uma mudança cair a 1/e
+        self.change_threshold = change_threshold  # Variação relativa das condições considerada mudança
+        self.growth = growth
+        self.clock = time.time  # Substituível (ex.: relógio simulado no simulator.py)
+
+        self.last_nodes = None
+        self.last_conditions_version = None
+        self.reference_conditions = None  # Condições na última mudança significativa
+        self.last_change = 0.0
+        self.lock = threading.Lock()
+        self.issued = Counter()
+
+    def observe_network(self, nodes, conditions_version, conditions, now=None):
+        """
+        Registra mudanças no conjunto de nós saudáveis ou nas condições de rede.
+        As condições só são comparadas quando a versão do network_control muda.
+        """
+        now = now or self.clock()
+        names = tuple(name for name, _ in nodes)
+        with self.lock:
+            changed = self.last_nodes is not None and names != self.last_nodes
+            self.last_nodes = names
+            if conditions_version != self.last_conditions_version:
+                self.last_conditions_version = conditions_version
+                reference = self.reference_conditions
+                if reference is None or self._significant_change(reference, conditions):
+                    self.reference_conditions = {key: conditions[key] for key in ('latency', 'packet_loss', 'bandwidth')}
+                    changed = changed or reference is not None
+            if changed:
+                self.last_change = now
+
+    def _significant_change(self, reference, conditions):
+        for key, previous in reference.items():
+            current = conditions[key]
+            if abs(current - previous) > max(self.change_threshold * abs(previous), CHANGE_FLOORS[key]):
+                return True
+        return False
+
+    def _update_session(self, session, throughput, qoe):
+        alpha = self.alpha
+        if throughput > 0:
+            if session.throughput_mean is None:
+                session.throughput_mean = throughput
+            else:
+                # Média e variância móveis exponenciais
+                diff = throughput - session.throughput_mean
+                increment = alpha * diff
+                session.throughput_mean += increment
+                session.throughput_var = (1 - alpha) * (session.throughput_var + diff * increment)
+
+        qoe_drop = 0.0
+        if qoe is not None:
+            if session.qoe_mean is None:
+                session.qoe_mean = qoe
+            qoe_drop = max(session.qoe_mean - qoe, 0.0)
+            session.qoe_mean += alpha * (qoe - session.qoe_mean)
+        return qoe_drop
+
+    def instability(self, session, qoe_drop, now):
+        throughput_cv = (math.sqrt(session.throughput_var) / session.throughput_mean
+                         if session.throughput_mean else 0.0)
+        churn = math.exp(-(now - self.last_change) / self.churn_decay) if self.last_change else 0.0
+        return min(max(throughput_cv / self.cv_unstable, qoe_drop / self.qoe_drop_unstable, churn), 1.0)
+
+    def compute(self, session, throughput, qoe, now=None):
+        """
+        Atualiza o histórico da sessão e retorna o TTL (s, inteiro) da próxima mensagem.
+        """
+        now = now or self.clock()
+        qoe_drop = self._update_session(session, throughput, qoe)
+        instability = self.instability(session, qoe_drop, now)
+        target = self.max_ttl - (self.max_ttl - self.min_ttl) * instability
+
+        previous = session.ttl or self.initial_ttl
+        ttl = min(target, previous * self.growth) if target > previous else target
+        ttl = int(round(min(max(ttl, self.min_ttl), self.max_ttl)))
+        session.ttl = ttl
+        self.issued[ttl] += 1
+        return ttl
+
+    def get_stats(self):
+        issued = dict(self.issued)
+        total = sum(issued.values())
+        return {
+            'min_ttl': self.min_ttl,
+            'max_ttl': self.max_ttl,
+            'mean_ttl': round(sum(ttl * count for ttl, count in issued.items()) / total, 2) if total else None,
+            'issued': {str(ttl): count for ttl, count in sorted(issued.items())},
+            'seconds_since_change': round(self.clock() - self.last_change, 1) if self.last_change else None
+        }
+
+# Criar uma única instância para ser usada em toda a aplicação
+adaptive_ttl = AdaptiveTTL(
+    min_ttl=int(os.environ.get('STEERING_TTL_MIN', 4)),
+    max_ttl=int(os.environ.get('STEERING_TTL_MAX', 30))
+)
@@ -0,0 +1,335 @@
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque, namedtuple
+import joblib
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+from flat_forest import FlatForest
+
+MODEL_PATH = 'server_selection_model.joblib'
+SCALER_PATH = 'server_selection_scaler.joblib'
+MAPPING_PATH = 'server_mapping.joblib'
+ONLINE_MODEL_PATH = 'server_selection_online.joblib'
+BANDIT_MODEL_PATH = 'server_selection_bandit.joblib'
+
+def synthetic_qoe(latency, packet_loss, bandwidth, cpu_usage, memory_usage):
+    # Fórmula simplificada para QoE
+    qoe = 5 - (latency / 100) - (packet_loss / 2) - (cpu_usage / 100) - (memory_usage / 100)
+    qoe += bandwidth / 100000  # Benefício de maior largura de banda
+    qoe = max(min(qoe, 5), 1)
+    return qoe
+
+def synthetic_training_data():
+    """
+    Dados sintéticos representativos usados para inicializar os modelos.
+    """
+    data = []
+    targets = []
+    for latency in [50, 100, 200]:
+        for packet_loss in [0.1, 0.5, 1]:
+            for bandwidth in [5000, 10000, 20000]:
+                for cpu_usage in [20, 50, 80]:
+                    for memory_usage in [30, 60, 90]:
+                        features = [latency, packet_loss, bandwidth, cpu_usage, memory_usage]
+                        # Suposição: QoE diminui com alta latência, perda de pacotes, alto uso de CPU/memória
+                        data.append(features)
+                        targets.append(synthetic_qoe(latency, packet_loss, bandwidth, cpu_usage, memory_usage))
+    return np.array(data, dtype=np.float64), np.array(targets, dtype=np.float64)
+
+def atomic_dump(obj, path):
+    tmp_path = f"{path}.tmp"
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+# Floresta em uso: substituída por inteiro (copy-on-write), nunca alterada no lugar
+ForestState = namedtuple('ForestState', ['model', 'scaler', 'flat_forest'])
+
+class ForestBackend:
+    """
+    RandomForestRegressor retreinado do zero a cada update_threshold amostras.
+    """
+    name = 'forest'
+
+    def __init__(self, max_samples=1000, update_threshold=100, use_flat_forest=True,
+                 model_path=MODEL_PATH, scaler_path=SCALER_PATH, mapping_path=MAPPING_PATH):
+        self.max_samples = max_samples
+        self.update_threshold = update_threshold
+        self.use_flat_forest = use_flat_forest
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.mapping_path = mapping_path
+        # Buffers usados apenas pela thread de treinamento
+        self.data_buffer = deque(maxlen=max_samples)
+        self.target_buffer = deque(maxlen=max_samples)
+        self.sample_count = 0
+        self.server_mapping = {}  # Mapeamento de servidores para índices
+        self.last_training_duration = None
+        self.state = None
+
+    def load(self):
+        model, scaler = self.load_or_train_model()
+        self.state = self.build_state(model, scaler)
+
+    def build_state(self, model, scaler):
+        """
+        Monta um novo estado, incluindo o avaliador achatado da floresta
+        (com o scaler incorporado), se habilitado.
+        """
+        flat_forest = None
+        if self.use_flat_forest:
+            try:
+                flat_forest = FlatForest.from_forest(model, scaler)
+            except Exception as e:
+                logging.warning(f"Não foi possível compilar o modelo, usando predição do sklearn: {e}")
+        return ForestState(model=model, scaler=scaler, flat_forest=flat_forest)
+
+    def load_or_train_model(self):
+        try:
+            saved = joblib.load(self.model_path)
+            if isinstance(saved, tuple):
+                model, scaler = saved
+            else:
+                # Formato antigo: modelo e scaler em arquivos separados
+                model, scaler = saved, joblib.load(self.scaler_path)
+            self.server_mapping = joblib.load(self.mapping_path)
+            logging.info("Modelo de seleção de servidor carregado com sucesso.")
+            return model, scaler
+        except FileNotFoundError:
+            model = RandomForestRegressor(n_estimators=100, random_state=42)
+            scaler = StandardScaler()
+            # Inicializar com dados sintéticos representativos
+            dummy_data, dummy_targets = synthetic_training_data()
+            scaler.fit(dummy_data)
+            scaled_data = scaler.transform(dummy_data)
+            model.fit(scaled_data, dummy_targets)
+            self.server_mapping = {}
+            atomic_dump((model, scaler), self.model_path)
+            joblib.dump(self.server_mapping, self.mapping_path)
+            logging.info("Modelo de seleção de servidor treinado com dados sintéticos.")
+            return model, scaler
+
+    def predict(self, features, server_names):
+        # Uma única leitura da referência: a predição nunca espera pelo treinamento
+        state = self.state
+        if state.flat_forest is not None:
+            return state.flat_forest.predict(features)
+        return state.model.predict(state.scaler.transform(features))
+
+    def observe(self, features, target, server_name):
+        self.data_buffer.append(features)
+        self.target_buffer.append(target)
+        self.sample_count += 1
+        if self.sample_count < self.update_threshold:
+            return False
+        return self._perform_model_update()
+
+    def _perform_model_update(self):
+        # Treina sobre um snapshot dos buffers, sem tocar no modelo em uso
+        X = np.array(self.data_buffer)
+        y = np.array(self.target_buffer)
+
+        if len(X) == 0:
+            logging.warning("Nenhum dado disponível para atualização do modelo.")
+            return False
+
+        start_time = time.perf_counter()
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+        model = clone(self.state.model)
+
+        try:
+            model.fit(X_scaled, y)
+        except Exception as e:
+            logging.error(f"Erro ao treinar o modelo: {e}")
+            return False
+
+        # Troca atômica da referência: predições em andamento continuam com o estado anterior
+        self.state = self.build_state(model, scaler)
+        self.sample_count = 0
+        self.last_training_duration = time.perf_counter() - start_time
+        logging.info(f"Modelo atualizado com {len(X)} amostras.")
+        return True
+
+    def save(self):
+        # Modelo e scaler no mesmo arquivo (uma única troca): um worker que recarrega
+        # o modelo, ou um processo reiniciado após uma falha, nunca os combina fora de par
+        state = self.state
+        atomic_dump((state.model, state.scaler), self.model_path)
+
+    def info(self):
+        return {
+            "backend": self.name,
+            "samples_collected": len(self.data_buffer),
+            "last_training_duration": self.last_training_duration
+        }
+
+class RunningScaler:
+    """
+    Padronização incremental (algoritmo de Welford), O(features) por amostra.
+    """
+    def __init__(self, n_features):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+
+    def update(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def scale(self):
+        if self.count < 2:
+            return np.ones_like(self.mean)
+        std = np.sqrt(self.m2 / (self.count - 1))
+        return np.where(std > 1e-12, std, 1.0)
+
+# Modelo linear publicado para leitura (imutável)
+LinearState = namedtuple('LinearState', ['weights', 'bias', 'mean', 'scale', 'samples'])
+
+class OnlineSGDBackend:
+    """
+    Regressor linear treinado por SGD, uma amostra por vez (semântica de partial_fit),
+    com padronização incremental das features.
+    """
+    name = 'sgd'
+
+    def __init__(self, n_features=5, learning_rate=0.01, power_t=0.25, l2=1e-4,
+                 model_path=ONLINE_MODEL_PATH, **kwargs):
+        self.n_features = n_features
+        self.learning_rate = learning_rate
+        self.power_t = power_t  # Decaimento da taxa de aprendizado: eta = lr / t^power_t
+        self.l2 = l2
+        self.model_path = model_path
+        self.scaler = RunningScaler(n_features)
+        self.weights = np.zeros(n_features)
+        self.bias = 0.0
+        self.samples = 0
+        self.state = None
+
+    def load(self):
+        try:
+            self.scaler, self.weights, self.bias, self.samples = joblib.load(self.model_path)
+            logging.info("Modelo online de seleção de servidor carregado com sucesso.")
+        except FileNotFoundError:
+            # Aquecimento com os mesmos dados sintéticos da floresta
+            data, targets = synthetic_training_data()
+            for _ in range(20):
+                for features, target in zip(data, targets):
+                    self.partial_fit(features, target)
+            logging.info("Modelo online de seleção de servidor inicializado com dados sintéticos.")
+        self._publish()
+
+    def partial_fit(self, features, target):
+        x = np.asarray(features, dtype=np.float64)
+        self.scaler.update(x)
+        xs = (x - self.scaler.mean) / self.scaler.scale
+        self.samples += 1
+        eta = self.learning_rate / (self.samples ** self.power_t)
+        error = float(xs @ self.weights) + self.bias - target
+        self.weights -= eta * (error * xs + self.l2 * self.weights)
+        self.bias -= eta * error
+
+    def _publish(self):
+        self.state = LinearState(self.weights.copy(), self.bias, self.scaler.mean.copy(),
+                                 self.scaler.scale, self.samples)
+
+    def predict(self, features, server_names):
+        state = self.state
+        return ((features - state.mean) / state.scale) @ state.weights + state.bias
+
+    def observe(self, features, target, server_name):
+        self.partial_fit(features, target)
+        self._publish()
+        return True
+
+    def save(self):
+        state = self.state
+        scaler = RunningScaler(self.n_features)
+        scaler.count, scaler.mean = state.samples, state.mean
+        scaler.m2 = (state.scale ** 2) * max(state.samples - 1, 1)
+        atomic_dump((scaler, state.weights, state.bias, state.samples), self.model_path)
+
+    def info(self):
+        return {"backend": self.name, "samples_collected": self.state.samples if self.state else 0}
+
+class BanditBackend:
+    """
+    Bandit contextual (UCB1): estatísticas correntes de QoE por servidor e
+    por contexto de rede discretizado. Atualização O(1) por amostra.
+
+    Cada braço é uma tupla imutável substituída por inteiro, então a predição lê
+    sem lock e nunca vê um braço pela metade. observe, load e save (thread de
+    persistência) são serializados pelo lock.
+    """
+    name = 'bandit'
+
+    def __init__(self, exploration=0.3, prior_qoe=3.0, model_path=BANDIT_MODEL_PATH, **kwargs):
+        self.exploration = exploration
+        self.prior_qoe = prior_qoe
+        self.model_path = model_path
+        self.arms = {}  # (contexto, servidor) -> (contagem, média)
+        self.context_counts = {}
+        self.samples = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def context(features):
+        latency, packet_loss, bandwidth = features[0], features[1], features[2]
+        return (int(math.log2(latency + 1)), int(math.log2(packet_loss * 100 + 1)), int(math.log10(bandwidth + 1) * 2))
+
+    def load(self):
+        try:
+            arms, context_counts, samples = joblib.load(self.model_path)
+        except FileNotFoundError:
+            return
+        with self.lock:
+            self.arms = {key: tuple(value) for key, value in arms.items()}
+            self.context_counts = dict(context_counts)
+            self.samples = samples
+        logging.info("Modelo bandit de seleção de servidor carregado com sucesso.")
+
+    def predict(self, features, server_names):
+        scores = np.empty(len(server_names))
+        for i, server_name in enumerate(server_names):
+            context = self.context(features[i])
+            total = self.context_counts.get(context, 0)
+            count, mean = self.arms.get((context, server_name), (0, self.prior_qoe))
+            scores[i] = mean + self.exploration * math.sqrt(math.log(total + 1) / (count + 1))
+        return scores
+
+    def observe(self, features, target, server_name):
+        context = self.context(features)
+        key = (context, server_name)
+        with self.lock:
+            count, mean = self.arms.get(key, (0, 0.0))
+            count += 1
+            self.arms[key] = (count, mean + (target - mean) / count)
+            self.context_counts[context] = self.context_counts.get(context, 0) + 1
+            self.samples += 1
+        return True
+
+    def save(self):
+        with self.lock:
+            snapshot = (dict(self.arms), dict(self.context_counts), self.samples)
+        atomic_dump(snapshot, self.model_path)
+
+    def info(self):
+        return {"backend": self.name, "samples_collected": self.samples, "arms": len(self.arms)}
+
+BACKENDS = {
+    ForestBackend.name: ForestBackend,
+    OnlineSGDBackend.name: OnlineSGDBackend,
+    BanditBackend.name: BanditBackend
+}
+
+def create_backend(name, **kwargs):
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de modelo desconhecido: {name}. Opções: {sorted(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
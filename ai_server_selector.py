@@ -1,105 +1,122 @@
-import joblib
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
+import os
+import time
+import queue
 import numpy as np
-from collections import deque
 import threading
 import logging
 from monitor import monitor
+from network_control import network_control
+from ai_backends import create_backend, synthetic_qoe
+from instrumentation import instrumentation
+
+# Número de features por servidor: latência, perda de pacotes, largura de banda, CPU, memória
+FEATURE_COUNT = 5
 
 class AIServerSelector:
-    def __init__(self, max_samples=1000, update_threshold=100):
-        self.model = None
-        self.scaler = StandardScaler()
-        self.max_samples = max_samples
-        self.update_threshold = update_threshold
-        self.data_buffer = deque(maxlen=max_samples)
-        self.target_buffer = deque(maxlen=max_samples)
-        self.sample_count = 0
+    def __init__(self, max_samples=1000, update_threshold=100, use_flat_forest=True,
+                 max_pending_samples=10000, backend=None, persist_interval=5):
+        # Backend do modelo: 'forest' (padrão), 'sgd' ou 'bandit'; configurável por AI_MODEL_BACKEND
+        backend = backend or os.environ.get('AI_MODEL_BACKEND', 'forest')
+        if isinstance(backend, str):
+            backend = create_backend(backend, max_samples=max_samples, update_threshold=update_threshold,
+                                     use_flat_forest=use_flat_forest)
+        self.backend = backend
+        self.backend.load()
+        self.model_version = 1
+
+        # Matriz de features pré-alocada por thread, reutilizada entre predições
+        self.thread_local = threading.local()
         self.lock = threading.Lock()
-        self.server_mapping = {}  # Mapeamento de servidores para índices
-        self.load_or_train_model()
+        self.persist_interval = persist_interval  # Intervalo mínimo entre gravações em disco (segundos)
+
+        self.sample_queue = queue.Queue(maxsize=max_pending_samples)
+        self.persist_event = threading.Event()
+        self.training_stats = {
+            'updates_performed': 0,
+            'dropped_samples': 0,
+            'last_update_duration': None,
+            'last_persisted_version': None
+        }
+
+        # Estado compartilhado entre workers; quando definido, as amostras vão para a fila
+        # compartilhada e apenas o worker líder treina e publica novas versões do modelo
+        self.shared_state = None
+        self.sample_writer = None
+
+        self.running = False
+        self.trainer_thread = None
+        self.persist_thread = None
+        logging.info(f"Seleção por IA usando o backend de modelo '{self.backend.name}'")
+
+    def start(self):
+        """
+        Inicia as threads de treinamento e persistência (apenas em um processo).
+        """
+        if self.running:
+            return
+        self.running = True
+        self.trainer_thread = threading.Thread(target=self._training_loop, daemon=True)
+        self.trainer_thread.start()
+        self.persist_thread = threading.Thread(target=self._persist_loop, daemon=True)
+        self.persist_thread.start()
 
-    def load_or_train_model(self):
-        try:
-            self.model = joblib.load('server_selection_model.joblib')
-            self.scaler = joblib.load('server_selection_scaler.joblib')
-            self.server_mapping = joblib.load('server_mapping.joblib')
-            logging.info("Modelo de seleção de servidor carregado com sucesso.")
-        except FileNotFoundError:
-            self.model = RandomForestRegressor(n_estimators=100, random_state=42)
-            # Inicializar com dados sintéticos representativos
-            dummy_data = []
-            dummy_targets = []
-            
-            for latency in [50, 100, 200]:
-                for packet_loss in [0.1, 0.5, 1]:
-                    for bandwidth in [5000, 10000, 20000]:
-                        for cpu_usage in [20, 50, 80]:
-                            for memory_usage in [30, 60, 90]:
-                                features = [latency, packet_loss, bandwidth, cpu_usage, memory_usage]
-                                # Suposição: QoE diminui com alta latência, perda de pacotes, alto uso de CPU/memória
-                                qoe = self.calculate_qoe(latency, packet_loss, bandwidth, cpu_usage, memory_usage)
-                                dummy_data.append(features)
-                                dummy_targets.append(qoe)
-            dummy_data = np.array(dummy_data)
-            dummy_targets = np.array(dummy_targets)
-            self.scaler.fit(dummy_data)
-            scaled_data = self.scaler.transform(dummy_data)
-            self.model.fit(scaled_data, dummy_targets)
-            self.server_mapping = {}
-            joblib.dump(self.model, 'server_selection_model.joblib')
-            joblib.dump(self.scaler, 'server_selection_scaler.joblib')
-            joblib.dump(self.server_mapping, 'server_mapping.joblib')
-            logging.info("Modelo de seleção de servidor treinado com dados sintéticos.")
+    def share_state(self, shared_state, sample_writer=None):
+        # sample_writer: buffer de escrita do worker para as amostras (padrão: o próprio estado)
+        self.shared_state = shared_state
+        self.sample_writer = sample_writer or shared_state
 
     def calculate_qoe(self, latency, packet_loss, bandwidth, cpu_usage, memory_usage):
-        # Fórmula simplificada para QoE
-        qoe = 5 - (latency / 100) - (packet_loss / 2) - (cpu_usage / 100) - (memory_usage / 100)
-        qoe += bandwidth / 100000  # Benefício de maior largura de banda
-        qoe = max(min(qoe, 5), 1)
-        return qoe
-
-    def predict_best_server(self, network_conditions, available_servers):
+        return synthetic_qoe(latency, packet_loss, bandwidth, cpu_usage, memory_usage)
+
+    def build_feature_matrix(self, network_conditions, server_metrics):
+        """
+        Preenche a matriz pré-alocada com uma linha de features por servidor candidato.
+        """
+        n = len(server_metrics)
+        buffer = getattr(self.thread_local, 'feature_buffer', None)
+        if buffer is None or buffer.shape[0] < n:
+            capacity = max(n, 2 * buffer.shape[0]) if buffer is not None else max(n, 32)
+            buffer = self.thread_local.feature_buffer = np.empty((capacity, FEATURE_COUNT), dtype=np.float64)
+        features = buffer[:n]
+        features[:, 0] = network_conditions['latency']
+        features[:, 1] = network_conditions['packet_loss']
+        features[:, 2] = network_conditions['bandwidth']
+        for i, metrics in enumerate(server_metrics):
+            features[i, 3] = metrics['cpu_usage']
+            features[i, 4] = metrics['memory_usage']
+            # Condições próprias do caminho até o servidor, quando conhecidas
+            if 'latency' in metrics:
+                features[i, 0] = metrics['latency']
+                features[i, 1] = metrics['packet_loss']
+                features[i, 2] = metrics['bandwidth']
+        return features
+
+    @instrumentation.timed('predict_best_server')
+    def predict_best_server(self, network_conditions, available_servers, server_metrics=None):
         if not available_servers:
             logging.warning("Nenhum servidor disponível para seleção.")
             return None
 
-        server_metrics = self.get_server_metrics(available_servers)
-        qoe_predictions = []
-
-        for metrics in server_metrics:
-            features = [
-                network_conditions['latency'],
-                network_conditions['packet_loss'],
-                network_conditions['bandwidth'],
-                metrics['cpu_usage'],
-                metrics['memory_usage']
-            ]
-            input_data = np.array([features])
-            try:
-                input_data_scaled = self.scaler.transform(input_data)
-            except Exception as e:
-                logging.error(f"Erro ao escalar dados de entrada: {e}")
-                continue
-
-            with self.lock:
-                try:
-                    qoe_pred = self.model.predict(input_data_scaled)[0]
-                except Exception as e:
-                    logging.error(f"Erro na predição do modelo: {e}")
-                    qoe_pred = 0  # Valor padrão de QoE baixo
-
-            qoe_predictions.append((qoe_pred, metrics['server_name']))
-
-        if not qoe_predictions:
+        if server_metrics is None:
+            server_metrics = self.get_server_metrics(available_servers)
+        if not server_metrics:
             logging.warning("Nenhuma previsão de QoE disponível.")
             return None
 
+        features = self.build_feature_matrix(network_conditions, server_metrics)
+
+        try:
+            predictions = self.backend.predict(features, [metrics['server_name'] for metrics in server_metrics])
+        except Exception as e:
+            logging.error(f"Erro na predição do modelo: {e}")
+            predictions = np.zeros(len(server_metrics))  # Valor padrão de QoE baixo
+
         # Selecionar o servidor com a maior previsão de QoE
-        best_server = max(qoe_predictions, key=lambda x: x[0])[1]
-        logging.info(f"Servidores disponíveis e previsões de QoE: {qoe_predictions}")
-        logging.info(f"Servidor selecionado pelo método IA: {best_server}")
+        best_server = server_metrics[int(np.argmax(predictions))]['server_name']
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            qoe_predictions = [(predictions[i], metrics['server_name']) for i, metrics in enumerate(server_metrics)]
+            logging.info("Servidores disponíveis e previsões de QoE: %s", qoe_predictions)
+        logging.info("Servidor selecionado pelo método IA: %s", best_server)
 
         return best_server
 
@@ -107,18 +124,19 @@ class AIServerSelector:
         metrics = []
         for server in available_servers:
             server_name = server[0]
-            try:
-                cpu_usage = monitor.get_cpu_usage(server_name)
-                memory_usage = monitor.get_memory_usage(server_name)
-            except AttributeError:
-                logging.warning(f"Não foi possível obter métricas para {server_name}. Usando valores padrão.")
-                cpu_usage = 0
-                memory_usage = 0
+            # Valores suavizados já coletados em background pelo monitor (sem chamada ao Docker)
+            cpu_usage = monitor.get_cpu_usage(server_name)
+            memory_usage = monitor.get_memory_usage(server_name)
+            
+            conditions = network_control.get_conditions(server_name)
             
             metrics.append({
                 'server_name': server_name,
                 'cpu_usage': cpu_usage,
-                'memory_usage': memory_usage
+                'memory_usage': memory_usage,
+                'latency': conditions['latency'],
+                'packet_loss': conditions['packet_loss'],
+                'bandwidth': conditions['bandwidth']
             })
         return metrics
 
@@ -135,47 +153,101 @@ class AIServerSelector:
             return
 
         features = [
-            network_conditions['latency'],
-            network_conditions['packet_loss'],
-            network_conditions['bandwidth'],
+            selected_metrics.get('latency', network_conditions['latency']),
+            selected_metrics.get('packet_loss', network_conditions['packet_loss']),
+            selected_metrics.get('bandwidth', network_conditions['bandwidth']),
             selected_metrics['cpu_usage'],
             selected_metrics['memory_usage']
         ]
 
-        with self.lock:
-            self.data_buffer.append(features)
-            self.target_buffer.append(performance)  # QoE real obtida
-            self.sample_count += 1
-
-            if self.sample_count >= self.update_threshold:
-                self._perform_model_update()
-
-    def _perform_model_update(self):
-        X = np.array(self.data_buffer)
-        y = np.array(self.target_buffer)
-
-        if len(X) == 0:
-            logging.warning("Nenhum dado disponível para atualização do modelo.")
+        if self.shared_state is not None:
+            self.sample_writer.push('ai_samples', [features, performance, selected_server])
             return
 
-        self.scaler.fit(X)
-        X_scaled = self.scaler.transform(X)
-
         try:
-            self.model.fit(X_scaled, y)
-        except Exception as e:
-            logging.error(f"Erro ao treinar o modelo: {e}")
-            return
-
-        joblib.dump(self.model, 'server_selection_model.joblib')
-        joblib.dump(self.scaler, 'server_selection_scaler.joblib')
-
-        self.sample_count = 0
-        logging.info(f"Modelo atualizado com {len(X)} amostras.")
+            self.sample_queue.put_nowait((np.array(features, dtype=np.float64), performance, selected_server))  # QoE real obtida
+        except queue.Full:
+            with self.lock:
+                self.training_stats['dropped_samples'] += 1
+
+    def _training_loop(self):
+        """
+        Consome as amostras da fila e atualiza o modelo em background.
+        O backend publica cada novo modelo por troca atômica de referência.
+        """
+        while self.running:
+            for features, performance, server_name in self._next_samples():
+                start_time = time.perf_counter()
+                try:
+                    changed = self.backend.observe(features, performance, server_name)
+                except Exception as e:
+                    logging.error(f"Erro na atualização do modelo: {e}", exc_info=True)
+                    continue
+
+                if changed:
+                    self.model_version += 1
+                    with self.lock:
+                        self.training_stats['updates_performed'] += 1
+                        self.training_stats['last_update_duration'] = time.perf_counter() - start_time
+                    self.persist_event.set()
+
+    def _next_samples(self):
+        """
+        Próximas amostras a processar: da fila compartilhada entre workers ou da fila local.
+        """
+        if self.shared_state is not None:
+            samples = self.shared_state.drain('ai_samples', 256)
+            if not samples:
+                time.sleep(0.5)
+            return [(np.array(features, dtype=np.float64), performance, server_name)
+                    for features, performance, server_name in samples]
+        try:
+            return [self.sample_queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+
+    def _persist_loop(self):
+        """
+        Persiste em disco a versão mais recente do modelo, fora da thread de treinamento.
+        """
+        while self.running:
+            if not self.persist_event.wait(timeout=1):
+                continue
+            self.persist_event.clear()
+            version = self.model_version
+            try:
+                self.backend.save()
+                with self.lock:
+                    self.training_stats['last_persisted_version'] = version
+                # Os demais workers recarregam o modelo do disco ao ver a nova versão
+                if self.shared_state is not None:
+                    self.shared_state.set('model_version', version)
+            except Exception as e:
+                logging.error(f"Erro ao persistir o modelo: {e}")
+            # Backends online mudam a cada amostra; limita a frequência de gravação
+            time.sleep(self.persist_interval)
+
+    def sync_model_version(self):
+        """
+        Recarrega o modelo persistido pelo worker líder quando há uma versão mais nova.
+        """
+        version = self.shared_state.get('model_version') if self.shared_state is not None else None
+        if version is None or version <= self.model_version:
+            return False
+        self.backend.load()
+        self.model_version = version
+        logging.info(f"Modelo recarregado na versão {version} publicada pelo worker líder")
+        return True
+
+    def stop(self):
+        self.running = False
 
     def get_model_performance(self):
         with self.lock:
-            return {
-                "samples_collected": len(self.data_buffer),
-                "updates_performed": self.sample_count // self.update_threshold
-            }
+            stats = dict(self.training_stats)
+        stats.update(self.backend.info())
+        stats.update({
+            "model_version": self.model_version,
+            "pending_samples": self.sample_queue.qsize()
+        })
+        return stats
@@ -6,10 +6,13 @@ import urllib.parse
 import os
 import sys
 import time
+import signal
 import logging
+import argparse
 import threading
 import socket
-from flask import Flask, Response, request, jsonify, render_template, send_from_directory
+import json
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, send_file
 from flask_cors import CORS
 from datetime import datetime
 from werkzeug.serving import WSGIRequestHandler
@@ -20,6 +23,17 @@ from monitor import monitor
 from adaptive_throttling import adaptive_throttling
 from dash_parser import dash_parser
 from ai_server_selector import AIServerSelector
+from segment_proxy import segment_proxy
+from segment_cache import segment_cache
+from shared_state import shared_state, leader_lock, write_buffer
+from async_logging import async_logging
+from event_stream import event_stream, EVENT_LOG_PATH
+from trace_player import TracePlayer, load_trace, resolve_trace_path
+from metrics_store import metrics_store
+from instrumentation import instrumentation
+from sessions import session_table, is_valid_session_id, SESSION_PARAM, SESSION_COOKIE
+from load_balancer import load_balancer, server_load, STRATEGIES, DEFAULT_STRATEGY
+from adaptive_ttl import adaptive_ttl
 
 def clear_log_file(file_path):
     if os.path.exists(file_path):
@@ -30,9 +44,23 @@ def clear_log_file(file_path):
 APP_LOG_PATH = 'app.log'
 MONITOR_LOG_PATH = 'monitor.log'
 
-# Limpa os arquivos de log
-clear_log_file(APP_LOG_PATH)
-clear_log_file(MONITOR_LOG_PATH)
+# Intervalo de sincronização de cada worker com o estado compartilhado (segundos)
+STATE_SYNC_INTERVAL = 0.5
+
+# Intervalo (segundos) da remoção, pelo líder, das sessões expiradas do estado compartilhado
+SESSION_EXPIRE_INTERVAL = 30
+
+# Tempo máximo de espera pela aplicação das regras tc (segundos)
+NETWORK_APPLY_TIMEOUT = 10
+
+# Stream de métricas (SSE): intervalo de agrupamento das amostras, verificação
+# do estado dos servidores e keep-alive da conexão (segundos)
+METRICS_PUSH_INTERVAL = 0.5
+METRICS_STATUS_INTERVAL = 2
+METRICS_KEEPALIVE_INTERVAL = 15
+
+# Diretório dos traces de rede (CSV, HSDPA, Mbit/s, mahimahi) usados por /trace/load
+TRACE_DIR = os.environ.get('STEERING_TRACE_DIR', 'traces')
 
 def get_host_ip():
     try:
@@ -61,25 +89,31 @@ def calculate_segment_metrics(content_length, download_time):
         throughput = (content_length * 8) / (1000 * download_time)  # kbits/s
         
         
-        logger.info(f"Cálculo de métricas do segmento:")
-        logger.info(f"- Tamanho do conteúdo: {content_length} bytes")
-        logger.info(f"- Tempo de download: {download_time:.3f} segundos")
-        logger.info(f"- Throughput calculado: {throughput:.2f} kbit/s")
+        logger.info("Cálculo de métricas do segmento: tamanho=%d bytes, tempo de download=%.3f segundos, "
+                    "throughput=%.2f kbit/s", content_length, download_time, throughput)
         
         qoe = main_app.calculate_current_qoe(throughput)
         network_conditions = network_control.get_current_conditions()
-        logger.info(f"LOG 4: [CALCULTE_SEGMENT_METRICS]")
-        logger.info(f"Estatísticas: Throughput={throughput:.2f}kbit/s, "
-                  f"Latência={network_conditions['latency']}ms, "
-                  f"Perda de Pacotes={network_conditions['packet_loss']}%, "
-                  f"Largura de Banda={network_conditions['bandwidth']}kbit/s, "
-                  f"QoE={qoe:.2f}")
+        logger.info("LOG 4: [CALCULTE_SEGMENT_METRICS]")
+        record_stats('segment', throughput, network_conditions, qoe)
         
         return throughput, qoe
     else:
         logger.warning("Tempo de download é 0 ou negativo, não é possível calcular o throughput")
     return 0, 0
 
+def record_stats(source, throughput, network_conditions, qoe):
+    """
+    Registra as estatísticas no app.log (linha lida pelo generate_graphs) e no fluxo de eventos.
+    """
+    logger.info("Estatísticas: Throughput=%.2fkbit/s, Latência=%sms, Perda de Pacotes=%s%%, "
+                "Largura de Banda=%skbit/s, QoE=%.2f", throughput, network_conditions['latency'],
+                network_conditions['packet_loss'], network_conditions['bandwidth'], qoe)
+    event_stream.emit('stats', source=source, throughput=throughput, latency=network_conditions['latency'],
+                      packet_loss=network_conditions['packet_loss'], bandwidth=network_conditions['bandwidth'],
+                      qoe=qoe)
+    metrics_store.record_many({'throughput': throughput, 'qoe': qoe})
+
 def calculate_qoe_by_preset(preset):
         """
         Define pesos base de QoE para cada preset
@@ -110,12 +144,12 @@ def process_manifest(root, base_url):
             if 'initialization' in element.attrib:
                 original = element.attrib['initialization']
                 element.attrib['initialization'] = f"/proxy_segment?url={base_url}{original}"
-                logger.info(f"URL de inicialização modificada: {original} -> {element.attrib['initialization']}")
+                logger.info("URL de inicialização modificada: %s -> %s", original, element.attrib['initialization'])
             
             if 'media' in element.attrib:
                 original = element.attrib['media']
                 element.attrib['media'] = f"/proxy_segment?url={base_url}{original}"
-                logger.info(f"URL de mídia modificada: {original} -> {element.attrib['media']}")
+                logger.info("URL de mídia modificada: %s -> %s", original, element.attrib['media'])
 
         # Converte o XML modificado para string
         return ET.tostring(root, encoding='unicode')
@@ -141,16 +175,9 @@ logging.basicConfig(level=logging.WARNING)
 werkzeug_logger = logging.getLogger('werkzeug')
 werkzeug_logger.setLevel(logging.INFO)
 
-# Remove quaisquer handlers existentes do logger 'werkzeug'
-for handler in werkzeug_logger.handlers[:]:
-    werkzeug_logger.removeHandler(handler)
-
-# Adiciona um FileHandler ao logger 'werkzeug'
-werkzeug_file_handler = logging.FileHandler('app.log')
-werkzeug_file_handler.setLevel(logging.INFO)
-werkzeug_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-werkzeug_file_handler.setFormatter(werkzeug_formatter)
-werkzeug_logger.addHandler(werkzeug_file_handler)
+# Handler assíncrono: a formatação e a escrita em app.log ficam na thread do QueueListener
+formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+async_logging.attach(werkzeug_logger, APP_LOG_PATH, formatter)
 
 # Impede que o logger 'werkzeug' propague mensagens para o root logger
 werkzeug_logger.propagate = False
@@ -158,10 +185,7 @@ werkzeug_logger.propagate = False
 # Configuração do logger
 logger = logging.getLogger('app_logger')
 logger.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler = logging.FileHandler('app.log')
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+async_logging.attach(logger, APP_LOG_PATH, formatter)
 
 # Impede que o 'app_logger' propague mensagens para o root logger
 logger.propagate = False
@@ -183,28 +207,37 @@ def do_cleanup():
         is_shutting_down = True
         print("Encerrando captura de tráfego e aplicação...")
         logger.info("Encerrando captura de tráfego e aplicação...")
-        # Encerra a captura de tráfego
+        # Encerra a captura de tráfego e a reprodução de traces
         monitor.stop_collecting()
+        trace_player.stop()
         # Não gera gráficos aqui; será feito pelo script bash
         logger.info("Limpeza concluída.")
+        # Grava as escritas pendentes no estado compartilhado, os logs e os eventos ainda enfileirados
+        try:
+            write_buffer.flush()
+        except Exception as e:
+            logger.error(f"Erro ao gravar o estado compartilhado pendente: {str(e)}")
+        event_stream.close()
+        async_logging.flush()
         print("Limpeza concluída.")
 
 class Main:
     def __init__(self):
-        # Contagem de uso dos servidores
-        self.server_usage_count = {
-            'video-streaming-cache-1': True,
-            'video-streaming-cache-2': True,
-            'video-streaming-cache-3': True,
-            'cloud': True
-        }
-        self.current_server = None
+        # Estado de steering e contagem de uso dos servidores ficam no estado compartilhado,
+        # para que todos os workers vejam os mesmos valores
+        for server_name in list(monitor.known_servers) + ['cloud']:
+            shared_state.hsetdefault('server_enabled', server_name, True)
+            shared_state.hsetdefault('server_usage', server_name, 0)
+        shared_state.setdefault('use_ai_steering', False)
+        shared_state.setdefault('steering_strategy', DEFAULT_STRATEGY)
+        shared_state.setdefault('current_preset', 'good')  # Preset inicial
+        # Estado global: usado sem sessão de steering (ex.: seleção forçada) e no dashboard
         self.last_throughput = 0
+        self.last_qoe = None
+        self.default_server_index = 0
         self.session_start_time = None
         self.performance_update_interval = 5  # segundos
         self.last_performance_update = time.time()
-        self.use_ai_steering = False
-        self.current_preset = 'good'  # Preset inicial
         self.qoe_data = []
 
         # Definição dos presets de rede
@@ -262,7 +295,66 @@ class Main:
         
         self.ai_server_selector = AIServerSelector()
 
-    def select_server(self, network_conditions, active_nodes):
+    @property
+    def server_enabled(self):
+        return shared_state.hgetall('server_enabled')
+
+    def set_server_enabled(self, server_name, enabled):
+        shared_state.hset('server_enabled', server_name, enabled)
+
+    @property
+    def server_usage_count(self):
+        """
+        Quantidade de decisões de steering por servidor.
+        """
+        return shared_state.hgetall('server_usage')
+
+    def increment_server_usage(self, server_name):
+        # Escritas do caminho do manifesto: acumuladas e gravadas juntas pelo laço de sincronização
+        write_buffer.hincr('server_usage', server_name)
+
+    @property
+    def current_server(self):
+        return write_buffer.get('current_server')
+
+    @current_server.setter
+    def current_server(self, server_name):
+        write_buffer.set('current_server', server_name)
+
+    @property
+    def use_ai_steering(self):
+        return shared_state.get('use_ai_steering', False)
+
+    @use_ai_steering.setter
+    def use_ai_steering(self, enabled):
+        shared_state.set('use_ai_steering', enabled)
+
+    @property
+    def steering_strategy(self):
+        return shared_state.get('steering_strategy', DEFAULT_STRATEGY)
+
+    @steering_strategy.setter
+    def steering_strategy(self, strategy):
+        shared_state.set('steering_strategy', strategy)
+
+    @property
+    def current_preset(self):
+        return shared_state.get('current_preset', 'good')
+
+    @current_preset.setter
+    def current_preset(self, preset_name):
+        shared_state.set('current_preset', preset_name)
+
+    def get_active_nodes(self):
+        """
+        Retorna os nós saudáveis do snapshot do monitor que estão habilitados pelo usuário.
+        """
+        nodes = monitor.getNodes('ip_address')
+        enabled = self.server_enabled
+        return [node for node in nodes if enabled.get(node[0])]
+
+    @instrumentation.timed('select_server')
+    def select_server(self, network_conditions, active_nodes, session=None, content_key=None):
         if not active_nodes:
             logger.warning("Nenhum servidor ativo disponível. Usando fallback para 'cloud'.")
             return 'cloud'
@@ -271,26 +363,34 @@ class Main:
             if self.use_ai_steering:
                 selected_server = self.ai_server_selector.predict_best_server(network_conditions, active_nodes)
             else:
-                selected_server = self.select_default_server(active_nodes)
+                selected_server = self.select_default_server(active_nodes, session, content_key)
 
             if selected_server:
-                logger.info(f"Servidor selecionado: {selected_server}")
+                logger.info("Servidor selecionado: %s", selected_server)
                 return selected_server
             else:
                 logger.warning("Nenhum servidor selecionado pelo método de steering. Usando primeiro servidor ativo.")
                 return active_nodes[0][0]
         except Exception as e:
-            logger.error(f"Erro ao selecionar servidor: {str(e)}")
+            logger.error("Erro ao selecionar servidor: %s", e)
             return active_nodes[0][0] if active_nodes else 'cloud'
 
-    def select_default_server(self, active_nodes):
-        if not hasattr(self, 'default_server_index'):
-            self.default_server_index = 0
+    def select_default_server(self, active_nodes, session=None, content_key=None):
         if not active_nodes:
             return None  # Nenhum servidor disponível
-        selected_server = active_nodes[self.default_server_index % len(active_nodes)][0]
-        self.default_server_index += 1
-        logger.info(f"Método padrão selecionou o servidor: {selected_server}")
+        strategy = self.steering_strategy
+        if strategy == 'round_robin':
+            # Round-robin por sessão de steering (ou global, sem sessão)
+            state = session or self
+            selected_server = active_nodes[state.default_server_index % len(active_nodes)][0]
+            state.default_server_index += 1
+        else:
+            # Sem conteúdo identificado, o hash consistente mantém a sessão no mesmo cache
+            selected_server = load_balancer.select(
+                strategy, active_nodes,
+                current_server=server_load.server_of(session.session_id) if session else None,
+                content_key=content_key or (session.session_id if session else None))
+        logger.info("Método padrão (%s) selecionou o servidor: %s", strategy, selected_server)
         return selected_server
 
     def calculate_stats(self):
@@ -305,27 +405,16 @@ class Main:
         }
         return stats
 
-    def update_performance_metrics(self, throughput):
+    def update_performance_metrics(self, throughput, session=None):
         """
         Atualiza as métricas de desempenho com base no throughput medido.
         """
         network_conditions = network_control.get_current_conditions()
-        qoe = self.calculate_current_qoe()
+        qoe = self.calculate_current_qoe(session=session)
         
-        # Log de condições de rede atuais
-        logger.info(f"LOG 1: [UPDATE_METRICS]")
-        logger.info(f"Condições de Rede Atuais: Throughput={throughput:.2f}kbit/s, "
-                    f"Latência={network_conditions['latency']}ms, "
-                    f"Perda de Pacotes={network_conditions['packet_loss']}%, "
-                    f"Largura de Banda={network_conditions['bandwidth']}kbit/s")
-
         # Log de estatísticas para o generate_graphs com throughput real
-        logger.info(f"LOG 2: [UPDATE_METRICS]")
-        logger.info(f"Estatísticas: Throughput={throughput:.2f}kbit/s, "
-                    f"Latência={network_conditions['latency']}ms, "
-                    f"Perda de Pacotes={network_conditions['packet_loss']}%, "
-                    f"Largura de Banda={network_conditions['bandwidth']}kbit/s, "
-                    f"QoE={qoe:.2f}")
+        logger.info("LOG 2: [UPDATE_METRICS]")
+        record_stats('performance', throughput, network_conditions, qoe)
 
         return qoe
 
@@ -334,13 +423,13 @@ class Main:
         Registra as estatísticas da requisição DASH.
         """
         # Formato padronizado para o generate_graphs.py
-        logger.info(f"Estatísticas: Throughput={throughput}kbit/s, Latência={network_conditions['latency']}ms, "
-                    f"Perda de Pacotes={network_conditions['packet_loss']}%, "
-                    f"Largura de Banda={network_conditions['bandwidth']}kbit/s, QoE={qoe:.2f}")
+        record_stats('manifest', throughput, network_conditions, qoe)
+        event_stream.emit('manifest', target=target, selected_server=steering_info['selected_server'],
+                          pathway_priority=steering_info['all_servers'])
         
         # Logs adicionais para debug
-        logger.debug(f"Requisição DASH: Caminho={target}")
-        logger.debug(f"Steering Info: {steering_info}")
+        logger.debug("Requisição DASH: Caminho=%s", target)
+        logger.debug("Steering Info: %s", steering_info)
     
     
     def maintain_preset(self):
@@ -373,16 +462,20 @@ class Main:
         """
         if preset_name in self.presets:
             preset_data = self.presets[preset_name]
-            logger.info(f"NETWORK_PRESET: {preset_data['name']}")
+            logger.info("NETWORK_PRESET: %s", preset_data['name'])
+            event_stream.emit('preset', preset=preset_name, name=preset_data['name'])
         else:
-            logger.info(f"NETWORK_PRESET: {preset_name}")
+            logger.info("NETWORK_PRESET: %s", preset_name)
+            event_stream.emit('preset', preset=preset_name, name=preset_name)
 
-    def calculate_current_qoe(self, current_throughput=None):
+    def calculate_current_qoe(self, current_throughput=None, session=None):
         """
         Calcula a QoE de forma linear baseada nas condições de rede atuais.
+        A suavização usa o histórico da sessão de steering, quando informada.
         """
+        state = session or self
         network_conditions = network_control.get_current_conditions()
-        throughput = current_throughput if current_throughput is not None else self.last_throughput
+        throughput = current_throughput if current_throughput is not None else state.last_throughput
         
         latency = network_conditions['latency']
         packet_loss = network_conditions['packet_loss']
@@ -415,13 +508,13 @@ class Main:
         qoe = max(min(qoe, 5.0), 1.0)
 
         # Suavização temporal para evitar mudanças muito bruscas
-        if not hasattr(self, 'last_qoe'):
-            self.last_qoe = qoe
+        if state.last_qoe is None:
+            state.last_qoe = qoe
         else:
             # Fator de suavização: 0.3 significa que 30% do novo valor é considerado
             alpha = 0.3
-            qoe = alpha * qoe + (1 - alpha) * self.last_qoe
-            self.last_qoe = qoe
+            qoe = alpha * qoe + (1 - alpha) * state.last_qoe
+            state.last_qoe = qoe
 
         return qoe
 
@@ -431,14 +524,18 @@ class Main:
         """
         self.ai_server_selector.update_model(network_conditions, selected_server, qoe, available_servers)
 
-    def run(self):
+    def run(self, production=False, workers=None, threads=None, host='0.0.0.0', port=30500):
         """
-        Inicia a aplicação Flask.
+        Inicia a aplicação Flask: servidor de desenvolvimento ou modo de produção.
         """
         try:
-            print(" * Running on http://localhost:30500/ (Press CTRL+C to quit)")
+            if production:
+                run_production(host, port, workers, threads)
+                return
+            print(f" * Running on http://{host}:{port}/ (Press CTRL+C to quit)")
             logger.info("Servidor iniciado.")
-            app.run(host='localhost', port=30500, use_reloader=False, debug=True)
+            start_background_services()
+            app.run(host=host, port=port, use_reloader=False, debug=True)
         except Exception as e:
             logger.error(f"Erro no servidor Flask: {str(e)}", exc_info=True)
             do_cleanup()
@@ -478,11 +575,13 @@ def update_network():
             
 
         
+        # Aguarda a aplicação das regras tc (pedidos simultâneos são coalescidos)
         network_control.update_conditions(
             latency=latency,
             packet_loss=packet_loss,
             bandwidth=bandwidth
-        )
+        ).result(timeout=NETWORK_APPLY_TIMEOUT)
+        publish_network_conditions()
         
         adaptive_throttling.manual_update()
         updated_values = network_control.get_current_conditions()
@@ -504,7 +603,176 @@ def update_network():
         logger.error(f"Erro ao atualizar a rede: {str(e)}", exc_info=True)
         return jsonify({"status": "erro", "mensagem": str(e)}), 500
 
+@app.route('/update_server_network', methods=['POST'])
+def update_server_network():
+    """
+    Define (ou remove, com "clear") condições de rede próprias para um servidor de cache.
+    """
+    data = request.json
+    server_name = data.get('server')
+    logger.info("Solicitação de condições por servidor recebida: %s", data)
+    if server_name not in monitor.known_servers:
+        return jsonify({"status": "erro", "mensagem": "Nome de servidor inválido"}), 400
+    try:
+        if data.get('clear'):
+            future = network_control.clear_server_conditions(server_name)
+        else:
+            future = network_control.set_server_conditions(
+                server_name,
+                latency=int(data['latency']) if 'latency' in data else None,
+                packet_loss=float(data['packetLoss']) if 'packetLoss' in data else None,
+                bandwidth=int(data['bandwidth']) if 'bandwidth' in data else None
+            )
+        future.result(timeout=NETWORK_APPLY_TIMEOUT)
+        publish_network_conditions()
+        return jsonify({"status": "sucesso", "server": server_name,
+                        "conditions": network_control.get_conditions(server_name)})
+    except Exception as e:
+        logger.error(f"Erro ao atualizar condições do servidor {server_name}: {str(e)}", exc_info=True)
+        return jsonify({"status": "erro", "mensagem": str(e)}), 500
+
+@app.route('/network_conditions')
+def get_network_conditions():
+    """
+    Perfil global e condições efetivas de cada servidor de cache.
+    """
+    return jsonify({
+        "global": network_control.get_current_conditions(),
+        "servers": {server_name: network_control.get_conditions(server_name) for server_name in monitor.known_servers}
+    })
+
+@app.route('/trace/load', methods=['POST'])
+def trace_load():
+    """
+    Carrega um trace de rede de TRACE_DIR ("path") ou do próprio corpo ("content").
+    Opcionais: "format", "tolerance" (variação relativa ignorada na compressão)
+    e "minInterval" (s de trace entre pontos aplicados).
+    """
+    data = request.json or {}
+    logger.info("Solicitação de carga de trace recebida: %s", {k: v for k, v in data.items() if k != 'content'})
+    try:
+        if data.get('content') is not None:
+            name = data.get('name', 'inline')
+            points, trace_format = load_trace(content=data['content'], trace_format=data.get('format'))
+        else:
+            name = data['path']
+            points, trace_format = load_trace(path=resolve_trace_path(TRACE_DIR, name),
+                                              trace_format=data.get('format'))
+        if trace_playback_owner() is not None:
+            raise RuntimeError("Trace em reprodução; pare-o antes de carregar outro")
+        summary = trace_player.load(points, name, trace_format,
+                                    tolerance=float(data.get('tolerance', 0.05)),
+                                    min_interval=float(data.get('minInterval', 0.0)))
+        # Qualquer worker pode receber o /trace/start seguinte
+        shared_state.set('trace_loaded', trace_player.export())
+        return jsonify({"status": "sucesso", "trace": summary})
+    except (KeyError, ValueError, OSError, RuntimeError) as e:
+        logger.error(f"Erro ao carregar trace: {str(e)}")
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+
+@app.route('/trace/start', methods=['POST'])
+def trace_start():
+    """
+    Inicia a reprodução do trace carregado. Opcionais: "speed" (fator de aceleração) e "loop".
+    """
+    data = request.json or {}
+    try:
+        loaded = shared_state.get('trace_loaded')
+        if loaded is not None:
+            trace_player.adopt(loaded)
+        if not claim_trace_playback():
+            raise RuntimeError("Trace já em reprodução")
+    except RuntimeError as e:
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+    try:
+        trace_player.start(speed=float(data.get('speed', 1.0)), loop=bool(data.get('loop', False)))
+    except (ValueError, RuntimeError) as e:
+        release_trace_playback()
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+    main_app.log_network_preset(f"trace:{trace_player.name}")
+    event_stream.emit('trace', action='start', name=trace_player.name,
+                      speed=trace_player.status['speed'], loop=trace_player.status['loop'])
+    return jsonify({"status": "sucesso", "trace": trace_player.get_status()})
+
+@app.route('/trace/stop', methods=['POST'])
+def trace_stop():
+    # O trace pode estar rodando em outro worker: a parada também é publicada no estado compartilhado
+    shared_state.set('trace_stop_requested', time.time())
+    trace_player.stop()
+    event_stream.emit('trace', action='stop', name=trace_player.name)
+    return jsonify({"status": "sucesso", "trace": trace_player.get_status()})
+
+@app.route('/trace/status')
+def trace_status():
+    """
+    Progresso da reprodução: pontos aplicados e pulados, atraso em relação ao
+    agendamento e tempo até a confirmação das regras tc.
+    """
+    if trace_player.status['running'] or not shared_state.is_shared:
+        return jsonify(trace_player.get_status())
+    return jsonify(shared_state.get('trace_status') or trace_player.get_status())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Métricas no formato de exposição do Prometheus, somadas entre todos os workers.
+    """
+    text = instrumentation.expose()
+    if text is None:
+        return "Instrumentação desativada (STEERING_METRICS=off)", 404
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+instrumentation.register_gauge('steering_active_nodes', 'Nós saudáveis e habilitados no último snapshot',
+                               lambda: len(main_app.get_active_nodes()))
+
+@app.route('/metrics/series')
+def metrics_series():
+    """
+    Séries do dashboard (throughput, QoE, servidor escolhido, pontuação por nó e
+    latência das sondas) posteriores à sequência "since".
+    """
+    return jsonify(metrics_store.series(request.args.get('since', default=0, type=int)))
+
+def dashboard_status():
+    return {'servers': main_app.server_enabled, 'current_server': main_app.current_server,
+            'strategy': main_app.steering_strategy}
+
+@app.route('/metrics/stream')
+def metrics_stream():
+    """
+    Server-Sent Events: envia apenas as amostras novas ("series") e o estado dos
+    servidores quando ele muda ("status"). O EventSource reconecta com o
+    Last-Event-ID e recebe só o que perdeu.
+    """
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', default=0, type=int)
+
+    def generate(seq):
+        last_status = None
+        last_sent = time.monotonic()
+        while not shutdown_event.is_set():
+            if metrics_store.wait_for_update(seq, METRICS_STATUS_INTERVAL):
+                # Agrupa amostras próximas em uma única mensagem
+                time.sleep(METRICS_PUSH_INTERVAL)
+                payload = metrics_store.series(seq)
+                seq = payload['seq']
+                last_sent = time.monotonic()
+                yield f"id: {seq}\nevent: series\ndata: {json.dumps(payload)}\n\n"
+            status = dashboard_status()
+            if status != last_status:
+                last_status = status
+                last_sent = time.monotonic()
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+            elif time.monotonic() - last_sent >= METRICS_KEEPALIVE_INTERVAL:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+
+    return Response(generate(since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/manifest.json')
+@instrumentation.timed('get_manifest')
 def get_manifest():
     """
     Rota para fornecer o manifesto DASH com base nas condições de rede e seleção de servidor.
@@ -512,7 +780,15 @@ def get_manifest():
     try:
         if not main_app.session_start_time:
             main_app.session_start_time = datetime.now()
-            logger.info(f"Nova sessão de streaming iniciada em {main_app.session_start_time}")
+            logger.info("Nova sessão de streaming iniciada em %s", main_app.session_start_time)
+
+        # Cada player tem o próprio histórico de throughput/QoE e a própria decisão de pathway
+        session_id = request.args.get(SESSION_PARAM) or request.cookies.get(SESSION_COOKIE)
+        content_key = request.args.get('content')
+        session, created = session_table.get_or_create(session_id if is_valid_session_id(session_id) else None)
+        session.requests += 1
+        if created:
+            logger.info("Nova sessão de steering: %s", session.session_id)
 
         target = request.args.get('_DASH_pathway', default='', type=str)
         throughput = request.args.get('_DASH_throughput', default=0.0, type=float)
@@ -521,47 +797,65 @@ def get_manifest():
         if throughput > 0:
             throughput = min(throughput / 1000, network_conditions['bandwidth'])
         else:
-            throughput = main_app.last_throughput
+            throughput = session.last_throughput
 
+        session.last_throughput = throughput
         main_app.last_throughput = throughput
 
-        logger.info(f"Requisição DASH: Caminho={target}, Throughput={throughput:.2f}kbit/s")
+        logger.info("Requisição DASH: Caminho=%s, Throughput=%.2fkbit/s", target, throughput)
 
-        nodes = monitor.getNodes('ip_address')
-        active_nodes = [node for node in nodes if node[0] in main_app.server_usage_count and main_app.server_usage_count[node[0]]]
-        logger.info(f"Nós ativos: {active_nodes}")
+        active_nodes = main_app.get_active_nodes()
+        logger.info("Nós ativos: %s", active_nodes)
         
+        # A versão é lida antes das condições: um ranking em cache nunca fica associado a condições antigas
+        conditions_version = network_control.version
         network_conditions = network_control.get_current_conditions()
-        logger.info(f"Condições de rede atuais: {network_conditions}")
+        logger.info("Condições de rede atuais: %s", network_conditions)
         
         current_time = time.time()
-        if current_time - main_app.last_performance_update >= main_app.performance_update_interval:
-            qoe = main_app.update_performance_metrics(throughput)
-            main_app.last_performance_update = current_time
+        if current_time - session.last_performance_update >= main_app.performance_update_interval:
+            qoe = main_app.update_performance_metrics(throughput, session)
+            session.last_performance_update = current_time
         else:
-            qoe = main_app.calculate_current_qoe()
+            qoe = main_app.calculate_current_qoe(session=session)
 
-        selected_server = main_app.select_server(network_conditions, active_nodes)
-        logger.info(f"Servidor selecionado: {selected_server}")
+        selected_server = main_app.select_server(network_conditions, active_nodes, session, content_key)
+        logger.info("Servidor selecionado: %s", selected_server)
 
         if not selected_server:
             logger.error("Nenhum servidor disponível para seleção.")
             return jsonify({"erro": "Nenhum servidor disponível para seleção."}), 500
 
+        # TTL menor quando a rede ou os nós mudam, maior quando estão estáveis
+        adaptive_ttl.observe_network(active_nodes, conditions_version, network_conditions)
+        ttl = adaptive_ttl.compute(session, throughput, qoe)
+
         data, steering_info = dash_parser.build(
             target=target,
             nodes=active_nodes,
             uri=BASE_URI,
             request=request,
             network_conditions=network_conditions,
-            selected_server=selected_server
+            selected_server=selected_server,
+            node_conditions=network_control.get_conditions,
+            conditions_version=conditions_version,
+            reload_params={SESSION_PARAM: session.session_id, 'content': content_key},
+            ttl=ttl
         )
 
-        main_app.current_server = steering_info['selected_server']
-        logger.info(f"Servidor atual definido como: {main_app.current_server}")
+        current_server = steering_info['selected_server']
+        server_load.assign(session.session_id, current_server)
+        session.current_server = current_server
+        main_app.current_server = current_server
+        metrics = {f'score.{name}': score for name, score in steering_info['sorted_nodes']}
+        metrics['server'] = current_server
+        metrics['ttl'] = ttl
+        metrics_store.record_many(metrics)
+        instrumentation.count_decision(current_server, 'ia' if main_app.use_ai_steering else 'padrao')
+        logger.info("Servidor atual definido como: %s", current_server)
 
         # Informar o monitor sobre o servidor selecionado
-        monitor.set_selected_server(main_app.current_server)
+        monitor.set_selected_server(current_server)
 
         main_app.log_request_stats(target, throughput, network_conditions, steering_info, qoe)
 
@@ -569,12 +863,16 @@ def get_manifest():
         if main_app.use_ai_steering:
             main_app.after_request_processing(network_conditions, selected_server, qoe, active_nodes)
 
-        if selected_server in main_app.server_usage_count:
-            main_app.server_usage_count[selected_server] += 1
+        main_app.increment_server_usage(current_server)
+        # Com vários workers, o próximo pedido da sessão pode chegar a outro processo
+        session_table.save(session)
 
-        return jsonify(data)
+        response = jsonify(data)
+        if created:
+            response.set_cookie(SESSION_COOKIE, session.session_id, max_age=int(session_table.ttl), samesite='Lax')
+        return response
     except Exception as e:
-        logger.error(f"Erro ao gerar manifesto: {str(e)}", exc_info=True)
+        logger.error("Erro ao gerar manifesto: %s", e, exc_info=True)
         return jsonify({"erro": str(e)}), 500
 
 @app.route('/dataset/<path:filename>')
@@ -601,6 +899,18 @@ def get_stats():
     """
     stats = main_app.calculate_stats()
     stats["server_usage"] = main_app.server_usage_count
+    stats["server_load"] = server_load.get_stats()
+    stats["steering_strategy"] = main_app.steering_strategy
+    stats["health_probes"] = monitor.get_probe_metrics()
+    stats["segment_cache"] = segment_cache.get_stats()
+    stats["event_stream"] = event_stream.get_stats()
+    stats["network_control"] = network_control.get_apply_stats()
+    stats["metrics_store"] = metrics_store.get_stats()
+    stats["steering_cache"] = dict(dash_parser.cache_stats)
+    stats["sessions"] = session_table.get_stats()
+    stats["steering_ttl"] = adaptive_ttl.get_stats()
+    stats["ai_model"] = main_app.ai_server_selector.get_model_performance()
+    stats["resources"] = {server_name: monitor.get_resource_stats(server_name) for server_name in monitor.known_servers}
     logger.info(f"Estatísticas solicitadas: {stats}")
     return jsonify(stats)
 
@@ -613,8 +923,7 @@ def get_current_server():
 def force_server_selection():
     try:
         network_conditions = network_control.get_current_conditions()
-        nodes = monitor.getNodes('ip_address')
-        active_nodes = [node for node in nodes if node[0] in main_app.server_usage_count and main_app.server_usage_count[node[0]]]
+        active_nodes = main_app.get_active_nodes()
         
         selected_server = main_app.select_server(network_conditions, active_nodes)
         main_app.current_server = selected_server
@@ -631,10 +940,11 @@ def toggle_server():
     server_name = data.get('server')
     logger.info(f"Solicitação de alternância de servidor recebida: {server_name}")
     
-    if server_name in main_app.server_usage_count:
-        current_state = main_app.server_usage_count[server_name]
+    server_enabled = main_app.server_enabled
+    if server_name in server_enabled:
+        current_state = server_enabled[server_name]
         new_state = not current_state
-        main_app.server_usage_count[server_name] = new_state
+        main_app.set_server_enabled(server_name, new_state)
         
         threading.Thread(target=monitor.update_server_state, args=(server_name, new_state)).start()
         
@@ -653,18 +963,20 @@ def server_status():
     """
     Rota para obter o status atual de todos os servidores.
     """
-    logger.info(f"Status dos servidores solicitado: {main_app.server_usage_count}")
-    return jsonify(main_app.server_usage_count)
+    logger.info(f"Status dos servidores solicitado: {main_app.server_enabled}")
+    return jsonify(main_app.server_enabled)
 
 @app.route('/toggle_steering_method', methods=['POST'])
 def toggle_steering_method():
     """
     Rota para alternar o método de steering entre IA e padrão.
     """
-    main_app.use_ai_steering = not main_app.use_ai_steering
-    method = "IA" if main_app.use_ai_steering else "Padrão"
-    logger.info(f"Método de steering alterado para: {method}")
-    return jsonify({"use_ai_steering": main_app.use_ai_steering})
+    use_ai_steering = not main_app.use_ai_steering
+    main_app.use_ai_steering = use_ai_steering
+    method = "IA" if use_ai_steering else "Padrão"
+    logger.info("Método de steering alterado para: %s", method)
+    event_stream.emit('steering', method=method, use_ai_steering=use_ai_steering)
+    return jsonify({"use_ai_steering": use_ai_steering})
 
 @app.route('/get_steering_method', methods=['GET'])
 def get_steering_method():
@@ -675,6 +987,27 @@ def get_steering_method():
     logger.info(f"Método de steering atual solicitado: {method}")
     return jsonify({"use_ai_steering": main_app.use_ai_steering})
 
+@app.route('/set_steering_strategy', methods=['POST'])
+def set_steering_strategy():
+    """
+    Rota para escolher a estratégia de balanceamento do método padrão.
+    """
+    strategy = (request.json or {}).get('strategy')
+    if strategy not in STRATEGIES:
+        logger.warning(f"Estratégia de balanceamento inválida recebida: {strategy}")
+        return jsonify({"status": "erro", "mensagem": "Estratégia inválida", "strategies": STRATEGIES}), 400
+    main_app.steering_strategy = strategy
+    logger.info("Estratégia de balanceamento alterada para: %s", strategy)
+    event_stream.emit('strategy', strategy=strategy)
+    return jsonify({"strategy": strategy})
+
+@app.route('/get_steering_strategy', methods=['GET'])
+def get_steering_strategy():
+    """
+    Rota para obter a estratégia de balanceamento atual e as disponíveis.
+    """
+    return jsonify({"strategy": main_app.steering_strategy, "strategies": STRATEGIES})
+
 @app.route('/load_external_manifest', methods=['POST'])
 def load_external_manifest():
     data = request.json
@@ -704,27 +1037,28 @@ def load_external_manifest():
 
         # Manter o preset atual ao invés de redefinir
         network_conditions = network_control.get_current_conditions()
-        nodes = monitor.getNodes('ip_address')
-        active_nodes = [node for node in nodes if node[0] in main_app.server_usage_count and main_app.server_usage_count[node[0]]]
+        active_nodes = main_app.get_active_nodes()
         
         selected_server = main_app.select_server(network_conditions, active_nodes)
         main_app.current_server = selected_server
 
-        preset_data = main_app.presets[main_app.current_preset]
-        logger.info(f"NETWORK_PRESET: {preset_data['name']}")
+        current_preset = main_app.current_preset
+        preset_data = main_app.presets[current_preset]
+        main_app.log_network_preset(current_preset)
 
         # Atualizar as condições de rede mantendo o preset atual
         network_control.update_conditions(
             latency=preset_data['latency'],
             packet_loss=preset_data['packet_loss'],
             bandwidth=preset_data['bandwidth']
-        )
+        ).result(timeout=NETWORK_APPLY_TIMEOUT)
+        publish_network_conditions()
 
         return jsonify({
             "success": True, 
             "local_manifest_url": f"/dataset/external_manifest.mpd",
             "selected_server": selected_server,
-            "current_preset": main_app.current_preset,  # Adicionar o preset atual na resposta
+            "current_preset": current_preset,  # Adicionar o preset atual na resposta
             "preset_data": preset_data  # Incluir os dados do preset
         })
     except Exception as e:
@@ -732,13 +1066,12 @@ def load_external_manifest():
         return jsonify({"success": False, "error": str(e)})
 
 @app.route('/proxy_segment')
+@instrumentation.timed('proxy_segment')
 def proxy_segment():
     url = request.args.get('url')
     segment_path = request.url.split('?')[0].split('/proxy_segment')[1]
     
-    logger.info(f"Processando segmento:")
-    logger.info(f"- URL: {url}")
-    logger.info(f"- Segment Path: {segment_path}")
+    logger.info("Processando segmento: URL=%s, Segment Path=%s", url, segment_path)
     
     if not url:
         logger.error("URL não fornecida")
@@ -746,43 +1079,106 @@ def proxy_segment():
 
     if not segment_path and '?' in request.url:
         segment_path = request.url.split('?')[1].split('&')[0].split('=')[1]
-        logger.info(f"- Segment Path extraído da query string: {segment_path}")
+        logger.info("- Segment Path extraído da query string: %s", segment_path)
 
     if not segment_path:
         logger.error("Caminho do segmento não fornecido")
         return "Caminho do segmento não fornecido", 400
 
     full_url = urllib.parse.urljoin(url, segment_path)
-    logger.info(f"- URL completa: {full_url}")
+    logger.info("- URL completa: %s", full_url)
     
+    cache_key = full_url
+    hit = segment_cache.lookup(cache_key)
+    if hit:
+        return serve_cached_segment(hit)
+
+    # Requisições parciais (Range) não passam pelo cache
+    is_leader = False
+    if 'Range' not in request.headers:
+        is_leader, event = segment_cache.begin(cache_key)
+        if not is_leader:
+            logger.info("- Aguardando busca em andamento para o mesmo segmento")
+            segment_cache.wait(event)
+            hit = segment_cache.lookup(cache_key)
+            if hit:
+                return serve_cached_segment(hit)
+
+    upstream = None
     try:
-        start_time = time.time()
-        response = requests.get(full_url)
-        response.raise_for_status()
-        
-        download_time = time.time() - start_time
-        content_length = float(response.headers.get('Content-Length', 0))
-        
-        logger.info(f"Download do segmento:")
-        logger.info(f"- Tempo de download: {download_time:.3f} segundos")
-        logger.info(f"- Tamanho do conteúdo: {content_length} bytes")
-        
-        throughput, _ = calculate_segment_metrics(content_length, download_time)
-        
-        logger.info(f"- Throughput calculado: {throughput:.2f} kbit/s")
-        
-        content_type = response.headers.get('Content-Type', 'application/octet-stream')
-        return Response(response.content, content_type=content_type)
+        upstream = segment_proxy.open(full_url, request.headers)
+        upstream.response.raise_for_status()
     except Exception as e:
-        logger.error(f"Erro ao buscar segmento: {str(e)}")
+        if upstream is not None:
+            upstream.response.close()
+        if is_leader:
+            segment_cache.finish(cache_key)
+        logger.error("Erro ao buscar segmento: %s", e)
         return str(e), 500
 
+    logger.info("- Tempo até o primeiro byte: %.3f segundos", upstream.ttfb)
+
+    serving_server = session_server()
+
+    def on_complete(content_length, ttfb, download_time):
+        try:
+            server_load.add_bytes(serving_server, content_length)
+            throughput, _ = calculate_segment_metrics(content_length, download_time)
+            event_stream.emit('segment', url=full_url, bytes=content_length, ttfb=ttfb,
+                              download_time=download_time, throughput=throughput)
+        except Exception as e:
+            logger.error("Erro ao calcular métricas do segmento: %s", e)
+
+    headers = segment_proxy.response_headers(upstream)
+    body = segment_proxy.iter_body(upstream, on_complete)
+    if is_leader:
+        if upstream.status_code == segment_cache.CACHEABLE_STATUS:
+            body = segment_cache.tee(cache_key, body, headers)
+        else:
+            segment_cache.finish(cache_key)
+
+    return Response(body, status=upstream.status_code, headers=headers, direct_passthrough=True)
+
+def session_server():
+    """
+    Servidor atribuído à sessão de steering do player (cookie), usado na contagem de bytes servidos.
+    """
+    return server_load.server_of(request.cookies.get(SESSION_COOKIE))
+
+def serve_cached_segment(hit):
+    """
+    Serve um segmento a partir do cache local (memória ou disco), com suporte a Range.
+    """
+    tier, entry = hit
+    logger.info("- Segmento servido do cache (%s)", tier)
+    server_load.add_bytes(session_server(), len(entry.data) if tier == 'memory' else entry.size)
+    content_type = entry.headers.get('Content-Type', 'application/octet-stream')
+
+    if tier == 'memory':
+        response = Response(entry.data, content_type=content_type)
+        for name in ('Content-Encoding', 'ETag', 'Last-Modified', 'Cache-Control'):
+            if name in entry.headers:
+                response.headers[name] = entry.headers[name]
+        return response.make_conditional(request, accept_ranges=True)
+
+    response = send_file(entry.path, mimetype=content_type, conditional=True,
+                         etag=entry.headers.get('ETag', '').strip('"') or True)
+    for name in ('Content-Encoding', 'Cache-Control'):
+        if name in entry.headers:
+            response.headers[name] = entry.headers[name]
+    return response
+
 @app.route('/shutdown', methods=['POST'])
 def shutdown():
     def delayed_shutdown():
         logger.info("Iniciando processo de encerramento...")
         do_cleanup()
         shutdown_event.set()
+        async_logging.flush()
+        # No modo de produção, encerra o processo mestre (e com ele todos os workers)
+        master_pid = os.environ.get('STEERING_MASTER_PID')
+        if master_pid:
+            os.kill(int(master_pid), signal.SIGTERM)
         os._exit(0)
 
     threading.Thread(target=delayed_shutdown).start()
@@ -797,16 +1193,75 @@ def status():
 def favicon():
     return '', 204
 
-if __name__ == '__main__':
-    # Log das informações iniciais
-    logger.info(f"Versão do Python: {sys.version}")
-    logger.info(f"Diretório de trabalho atual: {os.getcwd()}")
-    logger.info(f"DATASET_PATH: {DATASET_PATH}")
+def publish_network_conditions(initial=False):
+    """
+    Publica as condições de rede aplicadas para que os demais workers as adotem.
+    """
+    network_control.set_revision(shared_state.hincr('network', 'revision'))
+    conditions = network_control.get_state()
+    shared_state.set('network_conditions', conditions)
+    event_stream.emit('network', initial=initial,
+                      **{name: value for name, value in conditions.items() if name not in ('server_indexes', 'revision')})
 
-    # Inicia a captura de tráfego
-    monitor.start_collecting()
+def apply_trace_point(latency, packet_loss, bandwidth):
+    """
+    Aplica um ponto do trace sem bloquear o escalonador: a publicação das
+    condições acontece quando as regras tc são confirmadas.
+    """
+    future = network_control.update_conditions(latency=latency, packet_loss=packet_loss, bandwidth=bandwidth)
+
+    def on_applied(done):
+        if done.exception() is not None:
+            logger.error("Erro ao aplicar ponto do trace: %s", done.exception())
+            return
+        publish_network_conditions()
+        monitor.update_network_conditions(network_control.get_current_conditions())
+        if bandwidth is not None:
+            dash_parser.update_bandwidth_threshold(bandwidth)
+    future.add_done_callback(on_applied)
+    return future
+
+def trace_playback_owner():
+    """
+    Processo que reproduz o trace ({'pid', 'claimed_at'}) ou None. Um dono encerrado
+    sem liberar a reprodução (ex.: worker reiniciado) é descartado.
+    """
+    owner = shared_state.hget('trace_playback', 'owner')
+    if owner is None:
+        return None
+    try:
+        os.kill(owner['pid'], 0)
+    except ProcessLookupError:
+        shared_state.hdelete_if('trace_playback', 'owner', owner)
+        return None
+    except PermissionError:
+        pass
+    return owner
 
-    # Configurar condições iniciais de rede com base no preset inicial
+def claim_trace_playback():
+    """
+    Reserva a reprodução para este processo: apenas um worker aplica o trace no network_control.
+    """
+    trace_playback_owner()
+    owner = {'pid': os.getpid(), 'claimed_at': time.time()}
+    return shared_state.hsetdefault('trace_playback', 'owner', owner) == owner
+
+def release_trace_playback():
+    owner = shared_state.hget('trace_playback', 'owner')
+    if owner is not None and owner['pid'] == os.getpid():
+        shared_state.hdelete_if('trace_playback', 'owner', owner)
+
+trace_player = TracePlayer(
+    apply_trace_point,
+    stop_requested=lambda started_at: (shared_state.get('trace_stop_requested') or 0) > started_at,
+    status_listener=lambda status: shared_state.set('trace_status', status) if shared_state.is_shared else None,
+    finished_listener=release_trace_playback
+)
+
+def apply_initial_network_preset():
+    """
+    Configura as condições iniciais de rede com base no preset inicial.
+    """
     initial_preset = main_app.current_preset
     preset_data = main_app.presets.get(initial_preset)
 
@@ -819,13 +1274,159 @@ if __name__ == '__main__':
         packet_loss = 2
         bandwidth = 5000
 
-    network_control.update_conditions(latency=latency, packet_loss=packet_loss, bandwidth=bandwidth)
+    try:
+        network_control.update_conditions(latency=latency, packet_loss=packet_loss,
+                                          bandwidth=bandwidth).result(timeout=NETWORK_APPLY_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Erro ao aplicar condições iniciais de rede: {str(e)}")
+    publish_network_conditions(initial=True)
     dash_parser.update_bandwidth_threshold(bandwidth)
-    preset_name = main_app.presets.get(initial_preset, {}).get('name', 'Custom')
 
-    logger.info(f"NETWORK_PRESET: {preset_name}")
+    main_app.log_network_preset(initial_preset)
     logger.info(f"Condições iniciais de rede configuradas: Latência={latency}ms, Perda de Pacotes={packet_loss}%, Largura de Banda={bandwidth}kbit/s")
 
-    # Iniciar o servidor Flask
-    app.run(host='0.0.0.0', port=30500, use_reloader=False, debug=True)
+def become_leader():
+    """
+    Tarefas executadas por um único processo: coleta do monitor, treinamento
+    do modelo de IA e configuração inicial da rede.
+    """
+    logger.info(f"Processo {os.getpid()} executando as tarefas de background")
+    monitor.start_collecting()
+    main_app.ai_server_selector.start()
+    if shared_state.get('network_conditions') is None:
+        apply_initial_network_preset()
 
+def sync_shared_state(published_version):
+    """
+    Uma rodada de sincronização do worker com o estado compartilhado.
+    O líder publica o snapshot de nós e os recursos; os demais workers os adotam.
+    Retorna a versão do snapshot publicada por este processo.
+    """
+    if leader_lock.is_leader:
+        snapshot = monitor.get_snapshot()
+        if snapshot.version != published_version:
+            shared_state.set('node_snapshot', {
+                'version': snapshot.version,
+                'timestamp': snapshot.timestamp,
+                'nodes': [list(node) for node in snapshot.nodes]
+            })
+            published_version = snapshot.version
+        samples = {server_name: monitor.resource_stats.latest(server_name) for server_name in monitor.known_servers}
+        shared_state.set('resource_samples', {name: list(sample) for name, sample in samples.items() if sample})
+    else:
+        data = shared_state.get('node_snapshot')
+        if data and data['version'] != monitor.get_snapshot().version:
+            monitor.adopt_snapshot(data['version'], data['timestamp'], data['nodes'])
+        monitor.adopt_resource_samples(shared_state.get('resource_samples', {}))
+        main_app.ai_server_selector.sync_model_version()
+
+    enabled = {name for name, state in main_app.server_enabled.items() if state and name != 'cloud'}
+    if enabled != monitor.user_active_servers:
+        monitor.set_user_active_servers(enabled)
+
+    conditions = shared_state.get('network_conditions')
+    if conditions and conditions != network_control.get_state():
+        network_control.adopt_state(conditions)
+        dash_parser.update_bandwidth_threshold(conditions['bandwidth'])
+    return published_version
+
+def shared_state_sync_loop():
+    """
+    Mantém o worker coerente com o estado compartilhado e assume as tarefas
+    de background se o worker líder sair.
+    """
+    published_version = None
+    last_session_expire = 0.0
+    while not shutdown_event.is_set():
+        try:
+            if not leader_lock.is_leader and leader_lock.acquire():
+                become_leader()
+            instrumentation.publish()
+            write_buffer.flush()
+            published_version = sync_shared_state(published_version)
+            metrics_store.sync()
+            session_table.expire()
+            if leader_lock.is_leader and time.time() - last_session_expire >= SESSION_EXPIRE_INTERVAL:
+                last_session_expire = time.time()
+                server_load.expire(session_table.ttl)
+                session_table.expire_shared()
+                metrics_store.trim_shared()
+        except Exception as e:
+            logger.error(f"Erro ao sincronizar estado compartilhado: {str(e)}", exc_info=True)
+        shutdown_event.wait(STATE_SYNC_INTERVAL)
+
+def start_background_services():
+    """
+    Inicia as tarefas de background. Com vários workers, apenas o detentor do
+    lock de liderança coleta e treina; os demais sincronizam o estado compartilhado.
+    """
+    if shared_state.is_shared:
+        main_app.ai_server_selector.share_state(shared_state, write_buffer)
+        metrics_store.share_state(shared_state, write_buffer)
+        threading.Thread(target=shared_state_sync_loop, daemon=True).start()
+    elif leader_lock.acquire():
+        become_leader()
+
+def run_production(host, port, workers=None, threads=None):
+    """
+    Modo de produção: gunicorn com vários workers (gthread) e estado compartilhado
+    em SQLite. Sem gunicorn instalado, usa o servidor WSGI multithread do Werkzeug.
+    """
+    workers = workers or int(os.environ.get('STEERING_WORKERS', os.cpu_count() or 1))
+    threads = threads or int(os.environ.get('STEERING_THREADS', 32))
+
+    if not _gunicorn_available():
+        logger.warning("gunicorn não instalado; usando servidor Werkzeug multithread em um único processo")
+        print(f" * Running on http://{host}:{port}/ (threaded, Press CTRL+C to quit)")
+        start_background_services()
+        from werkzeug.serving import run_simple
+        run_simple(host, port, app, threaded=True, use_reloader=False, use_debugger=False)
+        return
+
+    # Estado compartilhado novo a cada execução; o exec substitui este processo pelo mestre do gunicorn
+    state_path = os.path.abspath(os.environ.get('STEERING_SHARED_STATE', 'shared_state.db'))
+    for suffix in ('', '-wal', '-shm', '.lock'):
+        if os.path.exists(state_path + suffix):
+            os.remove(state_path + suffix)
+    os.environ['STEERING_SHARED_STATE'] = state_path
+    os.environ['STEERING_MASTER_PID'] = str(os.getpid())
+    print(f" * Running on http://{host}:{port}/ ({workers} workers x {threads} threads)")
+    logger.info(f"Iniciando modo de produção: {workers} workers x {threads} threads")
+    os.execvp(sys.executable, [
+        sys.executable, '-m', 'gunicorn',
+        '--worker-class', 'gthread',
+        '--workers', str(workers),
+        '--threads', str(threads),
+        '--bind', f'{host}:{port}',
+        '--timeout', '120',
+        'wsgi:application'
+    ])
+
+def _gunicorn_available():
+    try:
+        import gunicorn  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor de content steering')
+    parser.add_argument('--production', action='store_true',
+                        default=os.environ.get('STEERING_SERVING_MODE') == 'production',
+                        help='Vários workers (gunicorn) com estado compartilhado, sem modo debug')
+    parser.add_argument('--workers', type=int, help='Número de processos (padrão: número de CPUs)')
+    parser.add_argument('--threads', type=int, help='Threads por processo (padrão: 32)')
+    args = parser.parse_args()
+
+    # Limpa os arquivos de log
+    clear_log_file(APP_LOG_PATH)
+    clear_log_file(MONITOR_LOG_PATH)
+    clear_log_file(EVENT_LOG_PATH)
+
+    # Log das informações iniciais
+    logger.info(f"Versão do Python: {sys.version}")
+    logger.info(f"Diretório de trabalho atual: {os.getcwd()}")
+    logger.info(f"DATASET_PATH: {DATASET_PATH}")
+
+    # Iniciar o servidor Flask
+    main_app.run(production=args.production, workers=args.workers, threads=args.threads)
@@ -0,0 +1,71 @@
+import atexit
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Enfileira o registro com a mensagem já interpolada (os argumentos podem ser
+    objetos mutáveis, alterados pela requisição depois da chamada ao logger); a
+    formatação final, inclusive do traceback, e o arquivo ficam com a thread do
+    QueueListener.
+    """
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Com o disco lento, descarta em vez de bloquear a requisição
+            pass
+
+class AsyncFileLogging:
+    """
+    Um QueueListener (e um FileHandler) por arquivo de log, compartilhado pelos
+    loggers que escrevem no mesmo arquivo.
+    """
+    def __init__(self, max_queue=100000):
+        self.max_queue = max_queue
+        self.listeners = {}
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def attach(self, logger, path, formatter, level=logging.NOTSET):
+        """
+        Substitui os handlers do logger por um handler assíncrono para o arquivo informado.
+        """
+        with self.lock:
+            if path not in self.listeners:
+                file_handler = logging.FileHandler(path)
+                file_handler.setFormatter(formatter)
+                file_handler.setLevel(level)
+                self.queues[path] = queue.Queue(self.max_queue)
+                listener = QueueListener(self.queues[path], file_handler, respect_handler_level=True)
+                listener.start()
+                self.listeners[path] = listener
+            log_queue = self.queues[path]
+
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+        logger.addHandler(DeferredQueueHandler(log_queue))
+
+    def flush(self):
+        """
+        Esvazia as filas e encerra as threads de escrita (chamado no encerramento).
+        """
+        with self.lock:
+            listeners = list(self.listeners.values())
+            self.listeners.clear()
+            self.queues.clear()
+        for listener in listeners:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+# Criar uma única instância para ser usada em toda a aplicação
+async_logging = AsyncFileLogging()
+atexit.register(async_logging.flush)
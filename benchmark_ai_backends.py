@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+import numpy as np
+from ai_backends import create_backend, synthetic_qoe, BACKENDS
+
+def load_trace(path):
+    """
+    Carrega um trace de requisições em JSON lines. Cada linha:
+    {"latency": ..., "packet_loss": ..., "bandwidth": ...,
+     "servers": [{"server_name": ..., "cpu_usage": ..., "memory_usage": ...}, ...]}
+    """
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def synthetic_trace(requests, servers, rng):
+    """
+    Gera requisições com condições de rede variando por fases e carga dos
+    servidores derivando lentamente em torno de uma base própria de cada servidor.
+    """
+    presets = [(250, 2, 500), (100, 1, 1000), (35, 0.5, 25000), (10, 0.1, 100000), (1, 0.001, 1000000)]
+    base_load = rng.uniform(10, 80, size=(servers, 2))
+    trace = []
+    for i in range(requests):
+        latency, packet_loss, bandwidth = presets[(i // 500) % len(presets)]
+        load = np.clip(base_load + rng.normal(0, 5, size=base_load.shape), 0, 100)
+        base_load = np.clip(base_load + rng.normal(0, 0.5, size=base_load.shape), 0, 100)
+        trace.append({
+            'latency': latency,
+            'packet_loss': packet_loss,
+            'bandwidth': bandwidth,
+            'servers': [{
+                'server_name': f'video-streaming-cache-{j + 1}',
+                'cpu_usage': float(load[j, 0]),
+                'memory_usage': float(load[j, 1])
+            } for j in range(servers)]
+        })
+    return trace
+
+def realized_qoe(request, metrics, noise, rng):
+    """
+    QoE "real" obtida ao servir a requisição pelo servidor (oráculo com ruído).
+    """
+    return synthetic_qoe(request['latency'], request['packet_loss'], request['bandwidth'],
+                         metrics['cpu_usage'], metrics['memory_usage']) + rng.normal(0, noise)
+
+def replay(backend, trace, noise, seed):
+    rng = np.random.default_rng(seed)
+    decision_times = []
+    update_times = []
+    regrets = []
+    best_picks = 0
+
+    for request in trace:
+        servers = request['servers']
+        features = np.empty((len(servers), 5))
+        features[:, 0] = request['latency']
+        features[:, 1] = request['packet_loss']
+        features[:, 2] = request['bandwidth']
+        features[:, 3] = [metrics['cpu_usage'] for metrics in servers]
+        features[:, 4] = [metrics['memory_usage'] for metrics in servers]
+        names = [metrics['server_name'] for metrics in servers]
+
+        start = time.perf_counter()
+        chosen = int(np.argmax(backend.predict(features, names)))
+        decision_times.append(time.perf_counter() - start)
+
+        expected = [synthetic_qoe(request['latency'], request['packet_loss'], request['bandwidth'],
+                                  metrics['cpu_usage'], metrics['memory_usage']) for metrics in servers]
+        best = int(np.argmax(expected))
+        regrets.append(expected[best] - expected[chosen])
+        best_picks += expected[chosen] >= expected[best]
+
+        qoe = realized_qoe(request, servers[chosen], noise, rng)
+        start = time.perf_counter()
+        backend.observe(features[chosen].copy(), qoe, names[chosen])
+        update_times.append(time.perf_counter() - start)
+
+    decision_times = np.array(decision_times) * 1e6
+    update_times = np.array(update_times) * 1e6
+    return {
+        'update_p50_us': np.percentile(update_times, 50),
+        'update_p99_us': np.percentile(update_times, 99),
+        'update_mean_us': update_times.mean(),
+        'decision_p50_us': np.percentile(decision_times, 50),
+        'mean_regret': float(np.mean(regrets)),
+        'best_pick_ratio': best_picks / len(trace)
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compara custo de atualização e qualidade de decisão dos backends de IA')
+    parser.add_argument('--trace', help='Arquivo JSON lines com as requisições a reproduzir')
+    parser.add_argument('--requests', type=int, default=3000, help='Requisições sintéticas (sem --trace)')
+    parser.add_argument('--servers', type=int, default=3, help='Servidores por requisição sintética')
+    parser.add_argument('--noise', type=float, default=0.1, help='Desvio padrão do ruído na QoE observada')
+    parser.add_argument('--backends', nargs='+', default=sorted(BACKENDS))
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    trace = load_trace(args.trace) if args.trace else synthetic_trace(args.requests, args.servers,
+                                                                        np.random.default_rng(args.seed))
+
+    print(f"Reproduzindo {len(trace)} requisições")
+    print(f"{'backend':<8} | {'upd p50 us':>10} | {'upd p99 us':>10} | {'upd média us':>12} | "
+          f"{'decisão p50 us':>14} | {'regret médio':>12} | {'% melhor':>8}")
+    print('-' * 95)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.backends:
+            # Modelos gravados em diretório temporário para não tocar nos arquivos da aplicação
+            paths = {
+                'forest': {'model_path': os.path.join(tmp, 'model.joblib'),
+                           'scaler_path': os.path.join(tmp, 'scaler.joblib'),
+                           'mapping_path': os.path.join(tmp, 'mapping.joblib')},
+                'sgd': {'model_path': os.path.join(tmp, 'online.joblib')},
+                'bandit': {'model_path': os.path.join(tmp, 'bandit.joblib')}
+            }.get(name, {})
+            backend = create_backend(name, **paths)
+            backend.load()
+            result = replay(backend, trace, args.noise, args.seed)
+            print(f"{name:<8} | {result['update_p50_us']:>10.1f} | {result['update_p99_us']:>10.1f} | "
+                  f"{result['update_mean_us']:>12.1f} | {result['decision_p50_us']:>14.1f} | "
+                  f"{result['mean_regret']:>12.4f} | {result['best_pick_ratio'] * 100:>7.1f}%")
@@ -0,0 +1,76 @@
+import time
+import logging
+import argparse
+import numpy as np
+from ai_server_selector import AIServerSelector
+
+def legacy_predict(selector, network_conditions, server_metrics):
+    """
+    Reproduz o caminho antigo: um transform e um predict por servidor candidato.
+    """
+    predictions = []
+    for metrics in server_metrics:
+        features = [
+            network_conditions['latency'],
+            network_conditions['packet_loss'],
+            network_conditions['bandwidth'],
+            metrics['cpu_usage'],
+            metrics['memory_usage']
+        ]
+        state = selector.backend.state
+        input_data_scaled = state.scaler.transform(np.array([features]))
+        predictions.append((state.model.predict(input_data_scaled)[0], metrics['server_name']))
+    return max(predictions, key=lambda x: x[0])[1]
+
+def make_candidates(n, rng):
+    servers = [(f'video-streaming-cache-{i + 1}', f'172.18.0.{(i % 250) + 2}') for i in range(n)]
+    metrics = [{
+        'server_name': name,
+        'cpu_usage': float(rng.uniform(0, 100)),
+        'memory_usage': float(rng.uniform(0, 100))
+    } for name, _ in servers]
+    return servers, metrics
+
+def measure(fn, repetitions):
+    timings = np.empty(repetitions)
+    for i in range(repetitions):
+        start = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - start
+    return np.percentile(timings, 50) * 1e6, np.percentile(timings, 99) * 1e6
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Microbenchmark da latência de decisão do AIServerSelector')
+    parser.add_argument('--candidates', type=int, nargs='+', default=[3, 30, 300])
+    parser.add_argument('--repetitions', type=int, default=200)
+    args = parser.parse_args()
+
+    # O log por decisão distorceria a medição
+    logging.disable(logging.WARNING)
+
+    rng = np.random.default_rng(42)
+    network_conditions = {'latency': 35, 'packet_loss': 0.5, 'bandwidth': 25000}
+
+    sklearn_selector = AIServerSelector(use_flat_forest=False, backend='forest')
+    flat_selector = AIServerSelector(use_flat_forest=True, backend='forest')
+
+    print(f"{'candidatos':>10} | {'caminho':<18} | {'p50 (us)':>10} | {'p99 (us)':>10}")
+    print('-' * 58)
+    for n in args.candidates:
+        servers, metrics = make_candidates(n, rng)
+
+        # As três implementações devem escolher o mesmo servidor
+        expected = legacy_predict(sklearn_selector, network_conditions, metrics)
+        assert sklearn_selector.predict_best_server(network_conditions, servers, metrics) == expected
+        assert flat_selector.predict_best_server(network_conditions, servers, metrics) == expected
+
+        paths = [
+            ('por candidato', lambda: legacy_predict(sklearn_selector, network_conditions, metrics)),
+            ('lote sklearn', lambda: sklearn_selector.predict_best_server(network_conditions, servers, metrics)),
+            ('lote achatado', lambda: flat_selector.predict_best_server(network_conditions, servers, metrics)),
+        ]
+        # O caminho antigo é muito lento com muitos candidatos; reduz as repetições
+        for name, fn in paths:
+            repetitions = max(5, args.repetitions // n) if name == 'por candidato' else args.repetitions
+            p50, p99 = measure(fn, repetitions)
+            print(f"{n:>10} | {name:<18} | {p50:>10.1f} | {p99:>10.1f}")
@@ -0,0 +1,82 @@
+import time
+import itertools
+import logging
+import argparse
+import subprocess
+import numpy as np
+from network_control import NetworkControl, TC_BACKENDS
+
+# Presets usados pela interface, alternados a cada atualização
+PRESETS = [(250, 2, 500), (100, 1, 1000), (35, 0.5, 25000), (10, 0.1, 100000), (1, 0.001, 1000000)]
+
+def legacy_apply(interface, latency, packet_loss, bandwidth, burst='32kbit', tc_latency='400ms'):
+    """
+    Reproduz o caminho antigo: derruba a árvore e executa um processo tc por comando, mais o show.
+    """
+    subprocess.run(["sudo", "tc", "qdisc", "del", "dev", interface, "root"], check=False, stderr=subprocess.PIPE)
+    subprocess.run(["sudo", "tc", "qdisc", "add", "dev", interface, "root", "handle", "1:", "netem"], check=True)
+    subprocess.run(["sudo", "tc", "qdisc", "add", "dev", interface, "parent", "1:", "handle", "2:", "tbf",
+                    "rate", f"{bandwidth}kbit", "burst", burst, "latency", tc_latency], check=True)
+    subprocess.run(["sudo", "tc", "qdisc", "add", "dev", interface, "parent", "2:", "handle", "3:", "netem",
+                    "delay", f"{latency}ms", "loss", f"{packet_loss}%"], check=True)
+    subprocess.check_output(["sudo", "tc", "qdisc", "show", "dev", interface], universal_newlines=True)
+
+def measure(fn, updates):
+    timings = np.empty(updates)
+    for i in range(updates):
+        latency, packet_loss, bandwidth = PRESETS[i % len(PRESETS)]
+        start = time.perf_counter()
+        fn(latency, packet_loss, bandwidth)
+        timings[i] = time.perf_counter() - start
+    return np.percentile(timings, 50) * 1e3, np.percentile(timings, 99) * 1e3
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Custo por atualização das regras tc: caminho antigo vs motor por diferença')
+    parser.add_argument('--backend', choices=sorted(TC_BACKENDS), default='dry-run',
+                        help="'tc' exige root e altera a interface informada")
+    parser.add_argument('--interface', default='lo')
+    parser.add_argument('--updates', type=int, default=200)
+    parser.add_argument('--servers', type=int, default=50, help='Servidores de cache com condições próprias')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    control = NetworkControl(interface=args.interface, backend=args.backend)
+    # IPs fictícios: não depende do Docker
+    control.ip_resolver = lambda server_name: f"10.200.{int(server_name.rsplit('-', 1)[1]) // 250}.{int(server_name.rsplit('-', 1)[1]) % 250 + 2}"
+    servers = [f'video-streaming-cache-{i + 1}' for i in range(args.servers)]
+    for server_name in servers:
+        control.set_server_conditions(server_name, latency=20, packet_loss=0.1, bandwidth=50000).result()
+
+    def engine_apply(latency, packet_loss, bandwidth):
+        control.update_conditions(latency=latency, packet_loss=packet_loss, bandwidth=bandwidth).result()
+
+    calls = itertools.count()
+
+    def server_apply(latency, packet_loss, bandwidth):
+        # Cada servidor recebe presets consecutivos (sempre diferentes) antes de passar ao próximo
+        server_name = servers[(next(calls) // len(PRESETS)) % len(servers)]
+        control.set_server_conditions(server_name, latency=latency, packet_loss=packet_loss, bandwidth=bandwidth).result()
+
+    stats = control.tc_engine.stats
+    print(f"{'caminho':<28} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'comandos/atualização':>20}")
+    print('-' * 77)
+    commands = stats['commands']
+    p50, p99 = measure(engine_apply, args.updates)
+    print(f"{'diferença (perfil global)':<28} | {p50:>9.3f} | {p99:>9.3f} | "
+          f"{(stats['commands'] - commands) / args.updates:>20.1f}")
+    if servers:
+        commands = stats['commands']
+        p50, p99 = measure(server_apply, args.updates)
+        print(f"{'diferença (um servidor)':<28} | {p50:>9.3f} | {p99:>9.3f} | "
+              f"{(stats['commands'] - commands) / args.updates:>20.1f}")
+    if args.backend == 'tc':
+        p50, p99 = measure(lambda *conditions: legacy_apply(args.interface, *conditions), args.updates)
+        print(f"{'antigo (processos separados)':<28} | {p50:>9.3f} | {p99:>9.3f} | {5:>20.1f}")
+        subprocess.run(["sudo", "tc", "qdisc", "del", "dev", args.interface, "root"], check=False, stderr=subprocess.PIPE)
+
+    print(f"\nAplicações: {stats['applies']} (recriações: {stats['rebuilds']}, alterações: {stats['changes']}, "
+          f"falhas: {stats['failures']})")
+    if args.backend == 'dry-run':
+        print("Árvore final simulada (início):")
+        print('\n'.join(control.get_tc_rules().splitlines()[:9]))
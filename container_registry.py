@@ -0,0 +1,205 @@
+import docker
+from docker.errors import NotFound as DockerNotFound
+import threading
+import logging
+import time
+from collections import namedtuple
+
+# Estado conhecido de um contêiner
+ContainerInfo = namedtuple('ContainerInfo', ['name', 'id', 'status', 'ip', 'updated_at'])
+
+class ContainerRegistry:
+    """
+    Registro compartilhado de endereços dos contêineres.
+
+    Usa um único cliente Docker, é alimentado pelo stream de eventos do Docker
+    (start/stop/die/destroy e connect/disconnect de rede) e faz um refresh
+    completo periódico (TTL) como fallback caso algum evento seja perdido.
+    """
+
+    CONTAINER_ACTIONS = {'create', 'start', 'restart', 'unpause', 'pause', 'stop', 'kill', 'die', 'rename', 'destroy'}
+    NETWORK_ACTIONS = {'connect', 'disconnect'}
+
+    def __init__(self, network_name='streaming-service_default', ttl=30):
+        self.network_name = network_name
+        self.ttl = ttl  # Segundos até uma entrada ser considerada desatualizada
+        self.containers = {}  # nome -> ContainerInfo
+        self.names_by_id = {}  # id -> nome
+        self.version = 0  # Incrementada quando um IP muda ou um contêiner some (invalida caches)
+        self._client = None
+        self.client_lock = threading.Lock()
+        self.running = False
+        self.events_stream = None
+        self.events_thread = None
+        self.refresh_thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def client(self):
+        """
+        Cliente Docker compartilhado, criado sob demanda.
+        """
+        if self._client is None:
+            with self.client_lock:
+                if self._client is None:
+                    self._client = docker.from_env()
+        return self._client
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.stop_event.clear()
+        try:
+            self.refresh_all()
+        except Exception as e:
+            logging.error(f"Erro no refresh inicial do registro de contêineres: {str(e)}")
+        self.events_thread = threading.Thread(target=self._events_loop, daemon=True)
+        self.events_thread.start()
+        self.refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self.refresh_thread.start()
+        logging.info("Registro de contêineres iniciado")
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        if self.events_stream is not None:
+            try:
+                self.events_stream.close()
+            except Exception:
+                pass
+        logging.info("Registro de contêineres encerrado")
+
+    def resolve(self, name):
+        """
+        Retorna o IP do contêiner a partir do cache.
+        Só consulta o Docker se o contêiner for desconhecido ou se o registro
+        não estiver sendo mantido em background e a entrada tiver expirado.
+        """
+        info = self.containers.get(name)
+        if info is None or (not self.running and time.time() - info.updated_at > self.ttl):
+            info = self.refresh(name)
+        return info.ip if info else None
+
+    def get_status(self, name):
+        info = self.containers.get(name)
+        if info is None:
+            info = self.refresh(name)
+        return info.status if info else None
+
+    def get_container(self, name):
+        """
+        Retorna o objeto Container do Docker (para operações como start/stop).
+        """
+        return self.client.containers.get(name)
+
+    def names(self, prefix=''):
+        return sorted(name for name in self.containers if name.startswith(prefix))
+
+    def refresh(self, name_or_id):
+        """
+        Atualiza uma única entrada via inspect. Retorna o ContainerInfo ou None.
+        """
+        try:
+            container = self.client.containers.get(name_or_id)
+        except DockerNotFound:
+            self._remove(name_or_id)
+            return None
+        except Exception as e:
+            logging.error(f"Erro ao consultar contêiner {name_or_id}: {str(e)}")
+            return self.containers.get(name_or_id)
+        return self._store(self._info_from_attrs(container.attrs))
+
+    def refresh_all(self):
+        """
+        Atualiza todas as entradas com uma única chamada de listagem.
+        """
+        containers = self.client.containers.list(all=True, sparse=True)
+        seen = set()
+        for container in containers:
+            info = self._store(self._info_from_attrs(container.attrs))
+            seen.add(info.name)
+        for name in list(self.containers):
+            if name not in seen:
+                self._remove(name)
+
+    def _info_from_attrs(self, attrs):
+        # Aceita tanto o formato do inspect quanto o da listagem (sparse)
+        name = attrs.get('Name') or (attrs.get('Names') or [''])[0]
+        name = name.lstrip('/')
+        state = attrs.get('State')
+        status = state.get('Status') if isinstance(state, dict) else state
+        networks = (attrs.get('NetworkSettings') or {}).get('Networks') or {}
+        ip = None
+        if self.network_name in networks:
+            ip = networks[self.network_name].get('IPAddress') or None
+        if not ip:
+            # Fallback para qualquer rede se a rede padrão não for encontrada
+            for network in networks.values():
+                if network.get('IPAddress'):
+                    ip = network['IPAddress']
+                    break
+        return ContainerInfo(name=name, id=attrs.get('Id'), status=status, ip=ip, updated_at=time.time())
+
+    def _store(self, info):
+        previous = self.containers.get(info.name)
+        if previous is None or previous.ip != info.ip:
+            self.version += 1
+        self.containers[info.name] = info
+        if info.id:
+            self.names_by_id[info.id] = info.name
+        return info
+
+    def _remove(self, name_or_id):
+        name = self.names_by_id.pop(name_or_id, name_or_id)
+        info = self.containers.pop(name, None)
+        if info:
+            self.version += 1
+        if info and info.id:
+            self.names_by_id.pop(info.id, None)
+
+    def _events_loop(self):
+        backoff = 1
+        while self.running:
+            try:
+                self.events_stream = self.client.events(decode=True, filters={'type': ['container', 'network']})
+                backoff = 1
+                for event in self.events_stream:
+                    if not self.running:
+                        break
+                    self._handle_event(event)
+            except Exception as e:
+                if not self.running:
+                    break
+                logging.warning(f"Stream de eventos do Docker interrompido: {str(e)}. Reconectando em {backoff}s")
+                self.stop_event.wait(backoff)
+                backoff = min(backoff * 2, 30)
+                try:
+                    # Eventos podem ter sido perdidos durante a desconexão
+                    self.refresh_all()
+                except Exception as e:
+                    logging.error(f"Erro ao atualizar registro de contêineres: {str(e)}")
+
+    def _handle_event(self, event):
+        action = (event.get('Action') or event.get('status') or '').split(':')[0]
+        actor = event.get('Actor') or {}
+        attributes = actor.get('Attributes') or {}
+
+        if event.get('Type') == 'network':
+            if action in self.NETWORK_ACTIONS and attributes.get('container'):
+                self.refresh(attributes['container'])
+        elif action in self.CONTAINER_ACTIONS:
+            if action == 'destroy':
+                self._remove(actor.get('ID') or attributes.get('name'))
+            else:
+                self.refresh(actor.get('ID') or attributes.get('name'))
+
+    def _refresh_loop(self):
+        while not self.stop_event.wait(self.ttl):
+            try:
+                self.refresh_all()
+            except Exception as e:
+                logging.error(f"Erro ao atualizar registro de contêineres: {str(e)}")
+
+# Criar uma única instância para ser usada em toda a aplicação
+container_registry = ContainerRegistry()
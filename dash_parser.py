@@ -1,6 +1,16 @@
 import math
 import logging
-from network_control import resolve_server_ip
+from urllib.parse import urlencode
+import numpy as np
+from container_registry import container_registry
+from instrumentation import instrumentation
+from adaptive_ttl import DEFAULT_TTL
+
+# A partir deste número de nós a pontuação é calculada de forma vetorizada (NumPy)
+VECTORIZE_MIN_NODES = 64
+
+# Entradas mantidas no cache de rankings (cada mudança de condições/nós/pesos gera uma nova)
+RANKING_CACHE_SIZE = 64
 
 class DashParser:
     def __init__(self):
@@ -10,16 +20,35 @@ class DashParser:
             'bandwidth': 0.4
         }
         self.bandwidth_threshold = 1000000  # 1 Gbps
-
-    def build(self, target, nodes, uri, request, network_conditions, selected_server=None):
+        # Versão dos pesos/limite: invalida os rankings em cache
+        self.version = 0
+        self.ranking_cache = {}
+        self.cache_stats = {'hits': 0, 'misses': 0}
+
+    @instrumentation.timed('dash_parser.build')
+    def build(self, target, nodes, uri, request, network_conditions, selected_server=None, node_conditions=None,
+              conditions_version=None, reload_params=None, ttl=None):
+        """
+        Monta a mensagem de steering. O ranking (PATHWAY-PRIORITY e PATHWAY-CLONES)
+        fica em cache pela chave (versão das condições, nós, versão dos pesos,
+        versão do registro de contêineres); sem conditions_version, as próprias
+        condições entram na chave. node_conditions pode ser um dicionário ou uma
+        função nome -> condições, chamada apenas quando o ranking é recalculado.
+        reload_params (ex.: sessão de steering e conteúdo) vão na query da RELOAD-URI.
+        ttl (s) substitui o TTL padrão (ex.: TTL adaptativo por sessão).
+        """
         message = {}
         message['VERSION'] = 1
-        message['TTL'] = 10
+        message['TTL'] = ttl or DEFAULT_TTL
         message['RELOAD-URI'] = f'{uri}{request.path}'
+        reload_query = urlencode({name: value for name, value in (reload_params or {}).items() if value})
+        if reload_query:
+            message['RELOAD-URI'] += f'?{reload_query}'
 
-        sorted_nodes = self.sort_nodes_by_conditions(nodes, self.dict_to_tuple(network_conditions))
+        ranking = self.ranking(nodes, network_conditions, node_conditions, conditions_version)
+        priority, clones, scored = ranking
 
-        message["PATHWAY-PRIORITY"] = [node[0] for node, _ in sorted_nodes] + ['cloud']
+        message["PATHWAY-PRIORITY"] = list(priority)
 
         if selected_server:
             if selected_server in message["PATHWAY-PRIORITY"]:
@@ -27,32 +56,81 @@ class DashParser:
             message["PATHWAY-PRIORITY"].insert(0, selected_server)
 
         if nodes:
-            message['PATHWAY-CLONES'] = self.pathway_clones(sorted_nodes)
+            message['PATHWAY-CLONES'] = clones
 
         steering_info = {
             "selected_server": message["PATHWAY-PRIORITY"][0] if message["PATHWAY-PRIORITY"] else 'cloud',
             "all_servers": message["PATHWAY-PRIORITY"],
             "network_conditions": network_conditions,
-            "sorted_nodes": [(node[0], score) for node, score in sorted_nodes]
+            "sorted_nodes": scored
         }
 
-        logging.info(f"Manifesto construído: Prioridade={message['PATHWAY-PRIORITY']}")
+        logging.info("Manifesto construído: Prioridade=%s", message['PATHWAY-PRIORITY'])
 
         return message, steering_info
 
+    def ranking(self, nodes, network_conditions, node_conditions=None, conditions_version=None):
+        """
+        Retorna (prioridade, clones, [(nome, pontuação)]) do cache ou recalcula.
+        """
+        if conditions_version is None:
+            if callable(node_conditions):
+                node_conditions = {node[0]: node_conditions(node[0]) for node in nodes}
+            conditions_key = (self.dict_to_tuple(network_conditions),
+                              tuple(sorted((name, self.dict_to_tuple(conditions))
+                                           for name, conditions in (node_conditions or {}).items())))
+        else:
+            conditions_key = conditions_version
+        key = (conditions_key, tuple(nodes), self.version, container_registry.version)
+
+        ranking = self.ranking_cache.get(key)
+        if ranking is not None:
+            self.cache_stats['hits'] += 1
+            return ranking
+
+        self.cache_stats['misses'] += 1
+        sorted_nodes = self.sort_nodes_by_conditions(nodes, self.dict_to_tuple(network_conditions), node_conditions)
+        ranking = (
+            tuple(node[0] for node, _ in sorted_nodes) + ('cloud',),
+            self.pathway_clones(sorted_nodes) if nodes else [],
+            [(node[0], score) for node, score in sorted_nodes]
+        )
+        if len(self.ranking_cache) >= RANKING_CACHE_SIZE:
+            self.ranking_cache.clear()
+        self.ranking_cache[key] = ranking
+        return ranking
+
     def pathway_clones(self, nodes):
         return [
             {
                 'BASE-ID': 'cloud',
                 'ID': node[0],
                 'URI-REPLACEMENT': {
-                    'HOST': f'http://{node[1]}'
+                    'HOST': f'http://{container_registry.resolve(node[0]) or node[1]}'
                 }
             } for node, _ in nodes if node[0].startswith('video-streaming-cache-')
         ]
 
-    def sort_nodes_by_conditions(self, nodes, network_conditions):
-        scored_nodes = [(node, self.calculate_node_score(node, network_conditions)) for node in nodes]
+    def sort_nodes_by_conditions(self, nodes, network_conditions, node_conditions=None):
+        """
+        Ordena os nós pela pontuação. node_conditions (dicionário ou função
+        nome -> condições) permite pontuar cada nó com as condições do seu próprio caminho.
+        """
+        node_conditions = node_conditions or {}
+        if callable(node_conditions):
+            conditions = [self.dict_to_tuple(node_conditions(node[0])) for node in nodes]
+        else:
+            conditions = [self.dict_to_tuple(node_conditions[node[0]]) if node[0] in node_conditions
+                          else network_conditions for node in nodes]
+
+        if len(nodes) >= VECTORIZE_MIN_NODES:
+            scores = self.calculate_node_scores(np.array(conditions, dtype=np.float64))
+            # argsort estável sobre -score: mesma ordem de sorted(..., reverse=True) em empates
+            order = np.argsort(-scores, kind='stable')
+            return [(nodes[i], float(scores[i])) for i in order]
+
+        scored_nodes = [(node, self.calculate_node_score(node, node_condition))
+                        for node, node_condition in zip(nodes, conditions)]
         sorted_nodes = sorted(scored_nodes, key=lambda x: x[1], reverse=True)
         return sorted_nodes
 
@@ -75,6 +153,21 @@ class DashParser:
 
         return total_score
 
+    def calculate_node_scores(self, conditions):
+        """
+        Versão vetorizada de calculate_node_score: conditions é uma matriz (n, 3)
+        com latência, perda e largura de banda de cada nó.
+        """
+        with np.errstate(over='ignore'):
+            latency_score = 1 / (1 + np.exp(-0.05 * (conditions[:, 0] - 100)))
+            packet_loss_score = 1 / (1 + np.exp(-2 * (conditions[:, 1] - 2)))
+            bandwidth_score = 1 / (1 + np.exp(-0.00001 * (conditions[:, 2] - self.bandwidth_threshold)))
+        return (
+            self.weights['latency'] * (1 - latency_score) +
+            self.weights['packet_loss'] * (1 - packet_loss_score) +
+            self.weights['bandwidth'] * bandwidth_score
+        )
+
     @staticmethod
     def sigmoid(x, midpoint, steepness):
         try:
@@ -88,10 +181,13 @@ class DashParser:
 
     def update_weights(self, new_weights):
         self.weights.update(new_weights)
+        self.version += 1
         logging.info(f"Pesos atualizados: {self.weights}")
 
     def update_bandwidth_threshold(self, new_threshold):
-        self.bandwidth_threshold = new_threshold
+        if new_threshold != self.bandwidth_threshold:
+            self.bandwidth_threshold = new_threshold
+            self.version += 1
         logging.info(f"Limite de largura de banda atualizado: {self.bandwidth_threshold}")
 
 # Criar uma única instância para ser usada em toda a aplicação
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import queue
+import atexit
+import itertools
+import threading
+import logging
+
+EVENT_LOG_PATH = 'events.jsonl'
+
+# Amostragem padrão por tipo de evento: registra 1 a cada N eventos (0 desabilita)
+DEFAULT_SAMPLING = {
+    'stats': 1,
+    'manifest': 1,
+    'segment': 1,
+    'network': 1,
+    'preset': 1,
+    'steering': 1,
+    'trace': 1,
+    'strategy': 1
+}
+
+def parse_sampling(spec):
+    """
+    Converte "segment=10,manifest=1" em {'segment': 10, 'manifest': 1}.
+    """
+    sampling = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, every = item.partition('=')
+        sampling[name.strip()] = int(every)
+    return sampling
+
+class EventStream:
+    """
+    Fluxo de eventos estruturados (JSON lines) para análise: throughput,
+    condições de rede, QoE e decisões de steering.
+
+    emit() apenas enfileira um dicionário; a serialização e a escrita em disco
+    ficam em uma thread dedicada, em lotes.
+    """
+    def __init__(self, path=EVENT_LOG_PATH, sampling=None, max_queue=100000, batch_size=512):
+        self.path = path
+        self.sampling = dict(DEFAULT_SAMPLING)
+        self.sampling.update(sampling or {})
+        self.counters = {}
+        self.batch_size = batch_size
+        self.queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.fd = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def should_sample(self, event_type):
+        every = self.sampling.get(event_type, 1)
+        if every <= 0:
+            return False
+        if every == 1:
+            return True
+        counter = self.counters.get(event_type)
+        if counter is None:
+            counter = self.counters.setdefault(event_type, itertools.count())
+        return next(counter) % every == 0
+
+    def emit(self, event_type, **fields):
+        """
+        Registra um evento sem bloquear: descarta (e contabiliza) se a fila estiver cheia.
+        """
+        if not self.should_sample(event_type):
+            return
+        fields['ts'] = time.time()
+        fields['type'] = event_type
+        self._ensure_writer()
+        try:
+            self.queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_writer(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                # O_APPEND: escritas de vários workers no mesmo arquivo não se sobrepõem
+                self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+                thread = threading.Thread(target=self._writer_loop, daemon=True)
+                thread.start()
+                self.thread = thread
+
+    def _writer_loop(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                break
+            batch = [event]
+            while len(batch) < self.batch_size:
+                try:
+                    event = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    self._write(batch)
+                    return
+                batch.append(event)
+            self._write(batch)
+
+    def _write(self, batch):
+        data = ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in batch)
+        try:
+            os.write(self.fd, data.encode('utf-8'))
+            self.written += len(batch)
+        except OSError as e:
+            logging.error(f"Erro ao gravar eventos em {self.path}: {e}")
+
+    def close(self):
+        """
+        Grava os eventos pendentes e encerra a thread de escrita.
+        """
+        thread = self.thread
+        if thread is None:
+            return
+        self.queue.put(None)
+        thread.join(timeout=5)
+        self.thread = None
+        os.close(self.fd)
+
+    def get_stats(self):
+        return {
+            'written': self.written,
+            'dropped': self.dropped,
+            'pending': self.queue.qsize(),
+            'sampling': dict(self.sampling)
+        }
+
+# Criar uma única instância para ser usada em toda a aplicação
+event_stream = EventStream(
+    path=os.environ.get('STEERING_EVENT_LOG', EVENT_LOG_PATH),
+    sampling=parse_sampling(os.environ.get('STEERING_EVENT_SAMPLING', ''))
+)
+atexit.register(event_stream.close)
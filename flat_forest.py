@@ -0,0 +1,85 @@
+import numpy as np
+
+class FlatForest:
+    """
+    Representação achatada de um RandomForestRegressor treinado.
+
+    Os nós de todas as árvores são concatenados em vetores NumPy e a travessia
+    é feita nível a nível para todas as árvores e amostras ao mesmo tempo,
+    evitando a validação e o despacho por árvore do sklearn. Opcionalmente
+    incorpora o StandardScaler (média/escala) para receber as features brutas.
+    """
+
+    def __init__(self, left, right, feature, threshold, value, roots, depth, mean=None, scale=None):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+        self.mean = mean
+        self.scale = scale
+
+    @classmethod
+    def from_forest(cls, model, scaler=None):
+        lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            node_count = tree.node_count
+            node_ids = np.arange(node_count)
+            is_leaf = tree.children_left == -1
+
+            # Folhas apontam para si mesmas, então percorrer além da profundidade não muda o resultado
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            depth = max(depth, tree.max_depth)
+            offset += node_count
+
+        mean = scale = None
+        if scaler is not None:
+            mean = np.asarray(scaler.mean_, dtype=np.float64)
+            scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+        return cls(
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.intp),
+            depth=depth,
+            mean=mean,
+            scale=scale
+        )
+
+    def predict(self, X):
+        """
+        Prediz para a matriz de features X (n_amostras, n_features) sem escalar.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if self.mean is not None:
+            X = (X - self.mean) / self.scale
+        # O sklearn compara as features em float32 durante a travessia
+        X = X.astype(np.float32)
+
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_samples) * n_features)[np.newaxis, :]
+        nodes = np.repeat(self.roots[:, np.newaxis], n_samples, axis=1)
+
+        for _ in range(self.depth):
+            go_left = flat_X.take(row_offsets + self.feature.take(nodes)) <= self.threshold.take(nodes)
+            next_nodes = np.where(go_left, self.left.take(nodes), self.right.take(nodes))
+            # Todas as amostras já chegaram às folhas
+            if np.array_equal(next_nodes, nodes):
+                break
+            nodes = next_nodes
+
+        return self.value.take(nodes).mean(axis=0)
@@ -1,136 +1,151 @@
-import matplotlib.pyplot as plt
-import re
-from collections import defaultdict
-import matplotlib.dates as mdates
-from datetime import datetime
 import os
+import time
 import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # Renderização sem interface gráfica, inclusive nos processos do pool
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from log_analytics import LogAnalytics, default_source
 
-def create_graphs_folder():
-    graphs_folder = 'graphs'
+# Sem subdivisão, o Agg falha (OverflowError) em séries longas e ruidosas sem redução de pontos
+matplotlib.rcParams['agg.path.chunksize'] = 10000
+
+FIGSIZE = (12, 6)
+DEFAULT_DPI = 300
+DEFAULT_FORMATS = ['png']
+
+def create_graphs_folder(graphs_folder='graphs'):
     if os.path.exists(graphs_folder):
         shutil.rmtree(graphs_folder)
     os.makedirs(graphs_folder)
     return graphs_folder
 
-def parse_log_file(file_path):
-    network_conditions = []
-    steering_changes = []
-    qoe_data = []
-    preset_changes = []
-    first_stats = None
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                match = re.match(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (\w+) - (.+)', line)
-                if match:
-                    timestamp_str, log_level, message = match.groups()
-                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S,%f')
-
-                    # Capturar informações de rede iniciais
-                    if 'Condições iniciais de rede configuradas:' in message:
-                        match_initial = re.search(r'Latência=(\d+)ms, Perda de Pacotes=([\d.]+)%, Largura de Banda=(\d+)kbit/s', message)
-                        if match_initial:
-                            latency, packet_loss, bandwidth = map(float, match_initial.groups())
-                            first_stats = {
-                                'timestamp': timestamp,
-                                'latency': latency,
-                                'packet_loss': packet_loss,
-                                'bandwidth': bandwidth
-                            }
-
-                    if 'Estatísticas:' in message:
-                        match = re.search(r'Throughput=([\d.]+)kbit/s, Latência=([\d.]+)ms, Perda de Pacotes=([\d.]+)%, Largura de Banda=([\d.]+)kbit/s(?:, QoE=([\d.]+))?', message)
-                        if match:
-                            throughput, latency, packet_loss, bandwidth, qoe = match.groups()
-                            throughput = float(throughput)
-                            latency = float(latency)
-                            packet_loss = float(packet_loss)
-                            bandwidth = float(bandwidth)
-                            
-                            # Adicionar condições de rede
-                            network_conditions.append((timestamp, latency, packet_loss, bandwidth))
-                            
-                            if qoe is not None:
-                                qoe = float(qoe)
-                                qoe_data.append((timestamp, qoe))
-                                
-                    elif 'Método de steering alterado para:' in message:
-                        method = 'IA' if 'IA' in message else 'Padrão'
-                        steering_changes.append((timestamp, f"Steering: {method}"))
-                    elif 'NETWORK_PRESET:' in message:
-                        preset = message.split(':', 1)[1].strip()
-                        preset_changes.append((timestamp, f"Preset: {preset}"))
-
-            except Exception as e:
-                print(f"Erro ao analisar linha: {line.strip()}")
-                print(f"Detalhes do erro: {str(e)}")
-                continue
-
-    # Adicionar as condições iniciais se disponíveis
-    if first_stats:
-        # Inserir as condições iniciais no início das listas
-        network_conditions.insert(0, (first_stats['timestamp'], 
-                                    first_stats['latency'], 
-                                    first_stats['packet_loss'], 
-                                    first_stats['bandwidth']))
-
-        # Calcular QoE inicial baseado nas condições iniciais
-        initial_qoe = 3.0  # QoE padrão para condições iniciais
-        qoe_data.insert(0, (first_stats['timestamp'], initial_qoe))
-
-    return network_conditions, steering_changes, qoe_data, preset_changes
-
-def plot_qoe(times, values, steering_changes, preset_changes, filename, graphs_folder):
-    fig, ax = plt.subplots(figsize=(12, 6))
-
-    # Plotar linha de QoE
-    ax.plot(times, values, linewidth=1)
-    
-    ax.set_xlabel('Tempo')
-    ax.set_ylabel('QoE')
-    ax.set_title('Qualidade de Experiência (QoE)')
-    ax.grid(True, linestyle='--', alpha=0.7)
-
-    ax.set_ylim(bottom=1, top=5)
-
-    # Combinar mudanças de steering e preset
-    all_changes = steering_changes + preset_changes
-    all_changes.sort(key=lambda x: x[0])
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: índices de até threshold pontos que preservam
+    a forma da série (picos e vales), escolhendo em cada bucket o ponto que forma
+    o maior triângulo com o ponto anterior escolhido e a média do próximo bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    bounds = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    # Somas acumuladas: média de qualquer bucket em O(1)
+    cumulative_x = np.concatenate(([0.0], np.cumsum(x)))
+    cumulative_y = np.concatenate(([0.0], np.cumsum(y)))
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        next_start, next_end = (bounds[i + 1], bounds[i + 2]) if i + 2 < threshold - 1 else (n - 1, n)
+        avg_x = (cumulative_x[next_end] - cumulative_x[next_start]) / (next_end - next_start)
+        avg_y = (cumulative_y[next_end] - cumulative_y[next_start]) / (next_end - next_start)
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+def minmax_decimate(x, y, buckets):
+    """
+    Mantém o mínimo e o máximo de cada bucket (totalmente vetorizado).
+    """
+    n = len(y)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    size = n // buckets
+    used = size * buckets
+    blocks = y[:used].reshape(buckets, size)
+    base = np.arange(buckets) * size
+    return np.unique(np.concatenate(([0, n - 1], base + blocks.argmin(axis=1), base + blocks.argmax(axis=1),
+                                     np.arange(used, n))))
+
+DOWNSAMPLERS = {
+    'lttb': lttb,
+    'minmax': lambda x, y, points: minmax_decimate(x, y, max(points // 2, 1)),
+    'none': None
+}
+
+def downsample(times, values, points, method='lttb'):
+    """
+    Reduz a série para a largura em pixels do gráfico: mais pontos que isso não
+    mudam a imagem, só o tempo de renderização.
+    """
+    downsampler = DOWNSAMPLERS[method]
+    if downsampler is None or len(values) <= points:
+        return times, values
+    x = times.astype('datetime64[ms]').astype(np.int64).astype(np.float64)
+    indices = downsampler(x, np.asarray(values, dtype=np.float64), points)
+    return times[indices], values[indices]
+
+def draw_changes(ax, steering_changes, preset_changes):
+    """
+    Marca as mudanças de steering e de preset: uma única chamada vlines por tipo
+    (em vez de um axvline por mudança) e os rótulos escalonados quando próximos.
+    """
+    all_changes = sorted(steering_changes + preset_changes, key=lambda x: x[0])
+    lines = {'steering': [], 'preset': []}
 
     last_x = None
     y_offset = 0
-    max_y = ax.get_ylim()[1]
-    
     for time, label in all_changes:
         if last_x and (time - last_x).total_seconds() < 5:
             y_offset += 0.05
         else:
             y_offset = 0
-            
-        color = 'r' if 'Steering' in label else 'g'
-        linestyle = '--' if 'Steering' in label else ':'
-        alpha = 0.3
-        
-        ax.axvline(x=time, color=color, linestyle=linestyle, alpha=alpha)
-        text_y = max_y * (1 - y_offset)
-        ax.text(time, text_y, label, rotation=90,
+
+        is_steering = 'Steering' in label
+        lines['steering' if is_steering else 'preset'].append(time)
+        ax.text(time, 1 - y_offset, label, rotation=90, transform=ax.get_xaxis_transform(),
                 verticalalignment='top', horizontalalignment='right',
-                color=color, alpha=0.8)
-        
+                color='r' if is_steering else 'g', alpha=0.8)
+
         last_x = time
 
-    plt.gcf().autofmt_xdate()
+    # Coordenadas y em fração do eixo: as linhas atravessam o gráfico em qualquer escala
+    for kind, color, linestyle in (('steering', 'r', '--'), ('preset', 'g', ':')):
+        if lines[kind]:
+            ax.vlines(lines[kind], 0, 1, transform=ax.get_xaxis_transform(),
+                      colors=color, linestyles=linestyle, alpha=0.3)
+
+def save_figure(fig, ax, filename, graphs_folder, formats, dpi):
+    fig.autofmt_xdate()
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+    fig.tight_layout()
+
+    name = os.path.splitext(filename)[0]
+    for output_format in formats:
+        output = f"{name}.{output_format}"
+        fig.savefig(os.path.join(graphs_folder, output), dpi=dpi, bbox_inches='tight')
+        print(f"Gerado {output}")
+    plt.close(fig)
+
+def plot_qoe(times, values, steering_changes, preset_changes, filename, graphs_folder,
+             formats=DEFAULT_FORMATS, dpi=DEFAULT_DPI):
+    fig, ax = plt.subplots(figsize=FIGSIZE)
+
+    # Plotar linha de QoE
+    ax.plot(times, values, linewidth=1)
+
+    ax.set_xlabel('Tempo')
+    ax.set_ylabel('QoE')
+    ax.set_title('Qualidade de Experiência (QoE)')
+    ax.grid(True, linestyle='--', alpha=0.7)
 
-    plt.tight_layout()
-    plt.savefig(os.path.join(graphs_folder, filename), dpi=300, bbox_inches='tight')
-    plt.close()
-    print(f"Gerado {filename}")
+    ax.set_ylim(bottom=1, top=5)
 
-def plot_network_metric(times, values, ylabel, title, steering_changes, preset_changes, filename, graphs_folder):
-    fig, ax = plt.subplots(figsize=(12, 6))
+    draw_changes(ax, steering_changes, preset_changes)
+    save_figure(fig, ax, filename, graphs_folder, formats, dpi)
+
+def plot_network_metric(times, values, ylabel, title, steering_changes, preset_changes, filename, graphs_folder,
+                        formats=DEFAULT_FORMATS, dpi=DEFAULT_DPI):
+    fig, ax = plt.subplots(figsize=FIGSIZE)
 
     ax.plot(times, values, linewidth=1)
     ax.set_xlabel('Tempo')
@@ -140,72 +155,82 @@ def plot_network_metric(times, values, ylabel, title, steering_changes, preset_c
 
     # Configurar escalas específicas
     if 'Latência' in title:
-        ax.set_ylim(bottom=0, top=max(values) * 1.1)
+        ax.set_ylim(bottom=0, top=values.max() * 1.1)
     elif 'Perda de Pacotes' in title:
         ax.set_yscale('log')
-        ax.set_ylim(bottom=max(0.001, min(values) / 2), top=max(10, max(values) * 2))
+        ax.set_ylim(bottom=max(0.001, values.min() / 2), top=max(10, values.max() * 2))
     elif 'Largura de Banda' in title:
         ax.set_yscale('log')
-        ax.set_ylim(bottom=max(1e2, min(values) / 2), top=min(1e9, max(values) * 2))
-
-    # Combinar mudanças
-    all_changes = steering_changes + preset_changes
-    all_changes.sort(key=lambda x: x[0])
-
-    last_x = None
-    y_offset = 0
-    for time, label in all_changes:
-        if last_x and (time - last_x).total_seconds() < 5:
-            y_offset += 0.05
-        else:
-            y_offset = 0
-
-        color = 'r' if 'Steering' in label else 'g'
-        linestyle = '--' if 'Steering' in label else ':'
-        alpha = 0.3
-        
-        ax.axvline(x=time, color=color, linestyle=linestyle, alpha=alpha)
-        ax.text(time, ax.get_ylim()[1] * (1 - y_offset), label, rotation=90,
-                verticalalignment='top', horizontalalignment='right', color=color)
-
-        last_x = time
-
-    plt.gcf().autofmt_xdate()
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-
-    plt.tight_layout()
-    plt.savefig(os.path.join(graphs_folder, filename), dpi=300, bbox_inches='tight')
-    plt.close()
-    print(f"Gerado {filename}")
+        ax.set_ylim(bottom=max(1e2, values.min() / 2), top=min(1e9, values.max() * 2))
+
+    draw_changes(ax, steering_changes, preset_changes)
+    save_figure(fig, ax, filename, graphs_folder, formats, dpi)
+
+def render_chart(job):
+    """
+    Ponto de entrada de cada processo do pool.
+    """
+    plot, args, kwargs = job
+    plot(*args, **kwargs)
+
+def build_jobs(series, graphs_folder, formats, dpi, method):
+    # Pontos suficientes para a largura do gráfico em pixels
+    points = int(FIGSIZE[0] * dpi)
+    changes = (series['steering_changes'], series['preset_changes'])
+    options = {'formats': formats, 'dpi': dpi}
+    jobs = []
+
+    if len(series['times']):
+        for key, ylabel, title, filename in (
+                ('latency', 'Latência (ms)', 'Latência', 'latencia.png'),
+                ('packet_loss', 'Perda de Pacotes (%)', 'Perda de Pacotes', 'perda_pacotes.png'),
+                ('bandwidth', 'Largura de Banda (kbit/s)', 'Largura de Banda', 'largura_banda.png')):
+            times, values = downsample(series['times'], series[key], points, method)
+            jobs.append((plot_network_metric, (times, values, ylabel, title, *changes, filename, graphs_folder), options))
+    else:
+        print("Sem dados suficientes para gerar os gráficos de condições de rede.")
+
+    if len(series['qoe_times']):
+        times, values = downsample(series['qoe_times'], series['qoe'], points, method)
+        jobs.append((plot_qoe, (times, values, *changes, 'qoe.png', graphs_folder), options))
+    else:
+        print("Sem dados suficientes para gerar o gráfico de QoE.")
+    return jobs
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera os gráficos de condições de rede e QoE da execução')
+    parser.add_argument('source', nargs='?', help='app.log ou events.jsonl (padrão: events.jsonl, se existir)')
+    parser.add_argument('--output', default='graphs', help='Pasta dos gráficos (recriada a cada execução)')
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS), help='Ex.: png,svg,pdf')
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Processos de renderização')
+    parser.add_argument('--downsample', choices=sorted(DOWNSAMPLERS), default='lttb')
+    args = parser.parse_args()
+
     log_file = 'app.log'
     try:
-        print(f"Iniciando análise do arquivo de log: {log_file}")
-        network_conditions, steering_changes, qoe_data, preset_changes = parse_log_file(log_file)
-
-        graphs_folder = create_graphs_folder()
-
-        if network_conditions:
-            times, latencies, packet_losses, bandwidths = zip(*network_conditions)
-
-            plot_network_metric(times, latencies, 'Latência (ms)', 'Latência',
-                                steering_changes, preset_changes, 'latencia.png', graphs_folder)
-            plot_network_metric(times, packet_losses, 'Perda de Pacotes (%)', 'Perda de Pacotes',
-                                steering_changes, preset_changes, 'perda_pacotes.png', graphs_folder)
-            plot_network_metric(times, bandwidths, 'Largura de Banda (kbit/s)', 'Largura de Banda',
-                                steering_changes, preset_changes, 'largura_banda.png', graphs_folder)
-        else:
-            print("Sem dados suficientes para gerar os gráficos de condições de rede.")
-
-        if qoe_data:
-            qoe_times, qoe_values = zip(*qoe_data)
-            plot_qoe(qoe_times, qoe_values, steering_changes, preset_changes, 'qoe.png', graphs_folder)
+        start = time.perf_counter()
+        # Prefere o fluxo de eventos estruturados; o app.log fica como alternativa.
+        # Só as linhas acrescentadas desde a última execução são lidas.
+        source = args.source or default_source(log_file)
+        print(f"Iniciando análise de: {source}")
+        analytics = LogAnalytics()
+        analytics.update(source)
+        series = analytics.series()
+
+        graphs_folder = create_graphs_folder(args.output)
+        formats = [output_format.strip() for output_format in args.formats.split(',') if output_format.strip()]
+        jobs = build_jobs(series, graphs_folder, formats, args.dpi, args.downsample)
+
+        if args.jobs > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(args.jobs, len(jobs))) as executor:
+                list(executor.map(render_chart, jobs))
         else:
-            print("Sem dados suficientes para gerar o gráfico de QoE.")
+            for job in jobs:
+                render_chart(job)
 
-        print("Geração de gráficos concluída.")
+        print(f"Geração de gráficos concluída em {time.perf_counter() - start:.1f}s.")
     except Exception as e:
         print(f"Ocorreu um erro durante a geração dos gráficos: {str(e)}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
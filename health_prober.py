@@ -0,0 +1,202 @@
+import random
+import threading
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from network_control import resolve_server_ip
+
+prober_logger = logging.getLogger('monitor_logger')
+
+# Resultado de uma sonda de saúde
+ProbeResult = namedtuple('ProbeResult', ['name', 'healthy', 'ip', 'latency', 'timestamp', 'error'])
+
+class ServerProbeState:
+    """
+    Estado de agendamento de um servidor: intervalo adaptativo e histórico recente.
+    """
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval
+        self.next_probe = 0
+        self.consecutive_successes = 0
+        self.consecutive_failures = 0
+        self.last_result = None
+        self.last_success = None
+        self.in_flight = None
+
+class HealthProber:
+    """
+    Sonda a saúde dos servidores de cache em paralelo.
+
+    - Pool de threads limitado e uma Session HTTP compartilhada (keep-alive).
+    - Prazo por sonda (probe_timeout, dividido entre conexão e leitura) e prazo
+      global por varredura, que não pode ser menor que o da sonda.
+    - Intervalo por servidor que cresce enquanto o servidor está estável e volta
+      ao mínimo quando ele falha, com jitter para espalhar as sondas no tempo.
+    """
+
+    def __init__(self, max_workers=32, probe_timeout=2.0, sweep_deadline=3.0,
+                 min_interval=1.0, max_interval=30.0, backoff_factor=1.5,
+                 jitter=0.1, failure_threshold=2, port=80):
+        if sweep_deadline < probe_timeout:
+            raise ValueError(f"Prazo da varredura ({sweep_deadline}s) menor que o da sonda ({probe_timeout}s)")
+        self.max_workers = max_workers
+        self.probe_timeout = probe_timeout
+        self.sweep_deadline = sweep_deadline
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.failure_threshold = failure_threshold  # Falhas consecutivas até marcar como não saudável
+        self.port = port
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='health-probe')
+
+        self.states = {}
+        self.lock = threading.Lock()
+        self.metrics = {
+            'sweeps': 0,
+            'probes': 0,
+            'probe_failures': 0,
+            'probe_timeouts': 0,
+            'last_sweep_duration': 0.0,
+            'avg_sweep_duration': 0.0,
+            'max_sweep_duration': 0.0,
+            'last_sweep_probes': 0
+        }
+
+    def probe(self, server_name):
+        """
+        Executa uma única sonda HEAD no servidor.
+        """
+        ip = resolve_server_ip(server_name)
+        if not ip:
+            return ProbeResult(server_name, False, None, None, time.time(), 'IP não resolvido')
+
+        start_time = time.perf_counter()
+        try:
+            # Conexão + leitura dentro de probe_timeout: um servidor lento, mas saudável,
+            # responde antes do prazo da varredura
+            response = self.session.head(f"http://{ip}:{self.port}/",
+                                         timeout=(self.probe_timeout / 2, self.probe_timeout / 2))
+            latency = time.perf_counter() - start_time
+            healthy = response.status_code == 200
+            return ProbeResult(server_name, healthy, ip, latency, time.time(),
+                               None if healthy else f"status {response.status_code}")
+        except RequestException as e:
+            return ProbeResult(server_name, False, ip, None, time.time(), str(e))
+
+    def sweep(self, servers):
+        """
+        Sonda em paralelo os servidores cujo próximo horário de sonda já chegou.
+        Retorna a lista de resultados obtidos nesta varredura.
+        """
+        start_time = time.perf_counter()
+        now = time.monotonic()
+
+        with self.lock:
+            for name in list(self.states):
+                if name not in servers:
+                    del self.states[name]
+            due = []
+            for name in servers:
+                state = self.states.get(name)
+                if state is None:
+                    state = self.states[name] = ServerProbeState(name, self.min_interval)
+                if state.in_flight is None and state.next_probe <= now:
+                    state.in_flight = self.executor.submit(self.probe, name)
+                    due.append(state)
+
+        if not due:
+            return []
+
+        done, _ = wait([state.in_flight for state in due], timeout=self.sweep_deadline)
+
+        results = []
+        timeouts = []
+        now = time.monotonic()
+        with self.lock:
+            for state in due:
+                future = state.in_flight
+                if future in done:
+                    state.in_flight = None
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = ProbeResult(state.name, False, None, None, time.time(), str(e))
+                else:
+                    # A sonda continua em execução (não pode ser cancelada) e o resultado é
+                    # descartado; o servidor segue em in_flight até ela terminar
+                    timeouts.append(state)
+                    result = ProbeResult(state.name, False, None, None, time.time(), 'prazo da varredura excedido')
+                self._record(state, result, now)
+                results.append(result)
+
+            duration = time.perf_counter() - start_time
+            self.metrics['sweeps'] += 1
+            self.metrics['probes'] += len(due)
+            self.metrics['probe_failures'] += sum(1 for result in results if not result.healthy)
+            self.metrics['probe_timeouts'] += len(timeouts)
+            self.metrics['last_sweep_duration'] = duration
+            self.metrics['last_sweep_probes'] = len(due)
+            self.metrics['max_sweep_duration'] = max(self.metrics['max_sweep_duration'], duration)
+            # Média móvel exponencial da duração das varreduras
+            self.metrics['avg_sweep_duration'] = 0.2 * duration + 0.8 * self.metrics['avg_sweep_duration']
+
+        # Fora do lock: o callback roda na hora se a sonda já tiver terminado
+        for state in timeouts:
+            state.in_flight.add_done_callback(lambda future, state=state: self._release(state, future))
+
+        prober_logger.debug(f"Varredura de saúde: {len(due)} sondas em {duration:.3f}s ({len(timeouts)} timeouts)")
+        return results
+
+    def _release(self, state, future):
+        # Sonda atrasada terminou: o servidor volta a poder ser sondado
+        with self.lock:
+            if state.in_flight is future:
+                state.in_flight = None
+
+    def _record(self, state, result, now):
+        state.last_result = result
+        if result.healthy:
+            state.consecutive_successes += 1
+            state.consecutive_failures = 0
+            state.last_success = result
+            # Servidor estável: aumenta o intervalo até o máximo
+            if state.consecutive_successes > 1:
+                state.interval = min(state.interval * self.backoff_factor, self.max_interval)
+        else:
+            state.consecutive_successes = 0
+            state.consecutive_failures += 1
+            state.interval = self.min_interval
+            prober_logger.warning(f"Sonda falhou para {state.name}: {result.error}")
+        state.next_probe = now + state.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def is_healthy(self, server_name):
+        """
+        Um servidor é saudável se já respondeu e não acumulou falhas consecutivas demais.
+        """
+        state = self.states.get(server_name)
+        return (state is not None and state.last_success is not None
+                and state.consecutive_failures < self.failure_threshold)
+
+    def get_last_success(self, server_name):
+        state = self.states.get(server_name)
+        return state.last_success if state else None
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics['intervals'] = {name: round(state.interval, 2) for name, state in self.states.items()}
+        return metrics
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
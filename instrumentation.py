@@ -0,0 +1,244 @@
+import os
+import time
+import bisect
+import functools
+import threading
+from shared_state import shared_state, write_buffer
+
+# Limites (segundos) dos buckets dos histogramas de latência
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(labels), value] for labels, value in self.values.items()]
+
+    @staticmethod
+    def merge(snapshots):
+        values = {}
+        for snapshot in snapshots:
+            for labels, value in snapshot:
+                values[tuple(labels)] = values.get(tuple(labels), 0) + value
+        return values
+
+    def expose(self, values=None):
+        """
+        values: contagens somadas de vários processos (padrão: as deste processo).
+        """
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        if values is None:
+            with self.lock:
+                values = dict(self.values)
+        lines.extend(f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}"
+                     for labels, value in values.items())
+        return lines
+
+class Gauge:
+    """
+    Gauge calculado no momento da coleta (callback), sem custo no caminho das requisições.
+    """
+    def __init__(self, name, help_text, callback):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        try:
+            lines.append(f"{self.name} {format_value(self.callback())}")
+        except Exception:
+            pass  # Valor indisponível nesta coleta
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                # Contagens por bucket (a última é o +Inf), soma e total
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(labels), list(counts), total, count] for labels, (counts, total, count) in self.series.items()]
+
+    @staticmethod
+    def merge(snapshots):
+        series = {}
+        for snapshot in snapshots:
+            for labels, counts, total, count in snapshot:
+                merged = series.get(tuple(labels))
+                if merged is None:
+                    series[tuple(labels)] = [list(counts), total, count]
+                else:
+                    merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                    merged[1] += total
+                    merged[2] += count
+        return series
+
+    def expose(self, series=None):
+        """
+        series: séries somadas de vários processos (padrão: as deste processo).
+        """
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        if series is None:
+            series = self.merge([self.snapshot()])
+        for labels, (counts, total, count) in series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket"
+                             f"{format_labels(self.label_names, labels, [('le', format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {count}")
+        return lines
+
+class Instrumentation:
+    """
+    Métricas no formato de exposição do Prometheus (/metrics).
+
+    Modos (STEERING_METRICS): 'on', 'off' ou 'auto' (padrão), que só começa a
+    medir na primeira coleta. Desligada, cada ponto instrumentado custa apenas
+    a leitura de um atributo.
+
+    Com vários workers, cada um publica periodicamente (publish) as próprias
+    contagens em 'metrics_workers' no estado compartilhado, e a coleta soma as
+    de todos os processos: qualquer worker responde com os mesmos totais. As
+    contagens de um worker encerrado continuam somadas (contadores não diminuem).
+    """
+    def __init__(self, mode='auto', state=None, buffer=None):
+        self.mode = mode
+        self.enabled = mode == 'on'
+        self.state = state if state is not None and state.is_shared else None
+        self.buffer = buffer
+        self.worker = str(os.getpid())
+        self.last_published = None
+        self.stage_duration = Histogram('steering_stage_duration_seconds',
+                                        'Duração de cada etapa do caminho de steering', ['stage'])
+        self.steering_decisions = Counter('steering_decisions_total',
+                                          'Servidores escolhidos pelo steering', ['server', 'method'])
+        self.probe_failures = Counter('steering_health_probe_failures_total',
+                                      'Sondas de saúde que falharam', ['server'])
+        self.gauges = []
+
+    def timed(self, stage):
+        """
+        Decorador: registra a duração da função no histograma da etapa.
+        """
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.stage_duration.observe(time.perf_counter() - start, stage)
+            return wrapper
+        return decorator
+
+    def count_decision(self, server, method):
+        if self.enabled:
+            self.steering_decisions.inc(server, method)
+
+    def count_probe_failure(self, server):
+        if self.enabled:
+            self.probe_failures.inc(server)
+
+    def register_gauge(self, name, help_text, callback):
+        self.gauges.append(Gauge(name, help_text, callback))
+
+    def snapshot(self):
+        return {
+            'stage_duration': self.stage_duration.snapshot(),
+            'steering_decisions': self.steering_decisions.snapshot(),
+            'probe_failures': self.probe_failures.snapshot()
+        }
+
+    def publish(self):
+        """
+        Publica as contagens deste worker (chamado pelo laço de sincronização). No modo
+        'auto', liga a medição quando qualquer worker já recebeu uma coleta.
+        """
+        if self.state is None:
+            return
+        if self.mode == 'auto' and not self.enabled and self.state.get('metrics_enabled'):
+            self.enabled = True
+        if not self.enabled:
+            return
+        worker = os.getpid()
+        if str(worker) != self.worker:
+            # Processo criado por fork (worker do gunicorn): contagens próprias a partir de agora
+            self.worker = str(worker)
+        snapshot = self.snapshot()
+        if snapshot != self.last_published:
+            self.last_published = snapshot
+            self.buffer.hset('metrics_workers', self.worker, snapshot)
+
+    def expose(self):
+        """
+        Texto no formato de exposição do Prometheus. No modo 'auto', a primeira coleta liga a medição.
+        """
+        if self.mode == 'auto' and not self.enabled:
+            self.enabled = True
+            if self.state is not None:
+                self.state.set('metrics_enabled', True)
+        if not self.enabled:
+            return None
+        lines = []
+        if self.state is None:
+            for metric in [self.stage_duration, self.steering_decisions, self.probe_failures]:
+                lines.extend(metric.expose())
+        else:
+            # Contagens de todos os workers; as deste processo, sempre atualizadas
+            workers = self.state.hgetall('metrics_workers')
+            workers[str(os.getpid())] = self.snapshot()
+            snapshots = list(workers.values())
+            lines.extend(self.stage_duration.expose(
+                Histogram.merge(snapshot['stage_duration'] for snapshot in snapshots)))
+            lines.extend(self.steering_decisions.expose(
+                Counter.merge(snapshot['steering_decisions'] for snapshot in snapshots)))
+            lines.extend(self.probe_failures.expose(
+                Counter.merge(snapshot['probe_failures'] for snapshot in snapshots)))
+        for gauge in self.gauges:
+            lines.extend(gauge.expose())
+        return '\n'.join(lines) + '\n'
+
+# Criar uma única instância para ser usada em toda a aplicação
+instrumentation = Instrumentation(os.environ.get('STEERING_METRICS', 'auto'), state=shared_state, buffer=write_buffer)
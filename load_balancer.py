@@ -0,0 +1,185 @@
+import os
+import time
+import bisect
+import random
+import hashlib
+import threading
+from shared_state import shared_state, write_buffer
+
+# Estratégias do método padrão (sem IA); 'round_robin' é o comportamento original
+STRATEGIES = {
+    'round_robin': 'Round-robin',
+    'least_sessions': 'Menos sessões',
+    'power_of_two': 'Duas escolhas aleatórias',
+    'weighted': 'Ponderada pela capacidade',
+    'consistent_hash': 'Hash consistente por conteúdo'
+}
+DEFAULT_STRATEGY = 'round_robin'
+
+# Pontos de cada servidor no anel do hash consistente (multiplicados pela capacidade)
+VIRTUAL_NODES = 100
+
+def parse_capacities(spec):
+    """
+    "video-streaming-cache-1=2,video-streaming-cache-2=1" -> {nome: capacidade}.
+    Servidores ausentes têm capacidade 1.
+    """
+    capacities = {}
+    for item in (spec or '').split(','):
+        name, _, value = item.partition('=')
+        if name.strip() and value.strip():
+            capacities[name.strip()] = max(float(value), 0.01)
+    return capacities
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+class ServerLoad:
+    """
+    Contadores reais por servidor no estado compartilhado (visíveis a todos os
+    workers): sessões de steering ativas e bytes servidos.
+
+    O servidor de cada sessão também fica no estado compartilhado ('session_server',
+    sessão -> [servidor, último acesso]): a tabela de sessões é de cada worker, e
+    uma sessão atendida por vários workers ainda conta uma única vez. Os contadores
+    só mudam quando essa atribuição compartilhada muda.
+
+    As atribuições e os bytes servidos passam pelo buffer de escrita do worker e
+    são gravados no flush (com vários workers, os contadores ficam até um
+    intervalo de sincronização atrasados).
+    """
+    def __init__(self, state, buffer):
+        self.state = state
+        self.buffer = buffer
+        self.pending = {}  # sessão -> [servidor, último acesso], ainda não gravadas
+        self.pending_sessions = {}  # Variação das sessões por servidor ainda não gravada (vista por este worker)
+        self.lock = threading.Lock()
+        buffer.flush_hooks.append(self._flush)
+
+    def assign(self, session_id, server_name, now=None):
+        """
+        Registra o servidor escolhido para a sessão (e renova o último acesso).
+        """
+        previous = self.server_of(session_id)
+        with self.lock:
+            self.pending[session_id] = [server_name, now or time.time()]
+            if previous != server_name:
+                if previous:
+                    self.pending_sessions[previous] = self.pending_sessions.get(previous, 0) - 1
+                self.pending_sessions[server_name] = self.pending_sessions.get(server_name, 0) + 1
+        self.buffer.changed()
+
+    def _flush(self, state):
+        # Dentro da transação do flush: troca e ajuste dos contadores são atômicos entre workers
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.pending_sessions = {}
+        for session_id, assignment in pending.items():
+            previous = state.hswap('session_server', session_id, assignment)
+            self.session_moved(previous[0] if previous else None, assignment[0])
+
+    def server_of(self, session_id):
+        if not session_id:
+            return None
+        assignment = self.pending.get(session_id) or self.state.hget('session_server', session_id)
+        return assignment[0] if assignment else None
+
+    def expire(self, ttl, now=None):
+        """
+        Remove as atribuições sem acesso há mais de ttl segundos. A remoção só vale se
+        a atribuição não mudou desde a leitura: um acesso concorrente mantém a sessão.
+        """
+        expire_before = (now or time.time()) - ttl
+        expired = 0
+        for session_id, assignment in self.state.hgetall('session_server').items():
+            server_name, last_seen = assignment
+            if last_seen < expire_before and self.state.hdelete_if('session_server', session_id, assignment):
+                self.session_moved(server_name, None)
+                expired += 1
+        return expired
+
+    def session_moved(self, old_server, new_server):
+        """
+        Sessão trocou de servidor (old_server=None: sessão nova; new_server=None: sessão expirou).
+        """
+        if old_server == new_server:
+            return
+        if old_server:
+            self.state.hincr('server_sessions', old_server, -1)
+        if new_server:
+            self.state.hincr('server_sessions', new_server)
+
+    def add_bytes(self, server_name, amount):
+        if server_name and amount:
+            self.buffer.hincr('server_bytes', server_name, amount)
+
+    def sessions(self):
+        sessions = self.state.hgetall('server_sessions')
+        for server_name, delta in list(self.pending_sessions.items()):
+            sessions[server_name] = sessions.get(server_name, 0) + delta
+        return sessions
+
+    def get_stats(self):
+        sessions = self.sessions()
+        bytes_served = self.state.hgetall('server_bytes')
+        return {name: {'sessions': sessions.get(name, 0), 'bytes': bytes_served.get(name, 0)}
+                for name in sorted(set(sessions) | set(bytes_served))}
+
+class LoadBalancer:
+    """
+    Estratégias de seleção baseadas na carga de cada cache. A sessão que pede a
+    decisão não conta na carga do servidor em que já está: sem isso, least-sessions
+    faria a sessão alternar entre dois servidores com a mesma carga.
+    """
+    def __init__(self, load, capacities=None, virtual_nodes=VIRTUAL_NODES):
+        self.load = load
+        self.capacities = capacities or {}
+        self.virtual_nodes = virtual_nodes
+        self.rng = random.Random()
+        self.ring = None  # (servidores, pontos, donos), refeito quando o conjunto de servidores muda
+        self.ring_lock = threading.Lock()
+
+    def capacity(self, server_name):
+        return self.capacities.get(server_name, 1.0)
+
+    def select(self, strategy, active_nodes, current_server=None, content_key=None):
+        names = [name for name, _ in active_nodes]
+        if not names:
+            return None
+        if len(names) == 1:
+            return names[0]
+        if strategy == 'consistent_hash':
+            return self.consistent_hash(names, content_key or '')
+
+        sessions = self.load.sessions()
+        if current_server in sessions:
+            sessions[current_server] -= 1
+
+        if strategy == 'least_sessions':
+            return min(names, key=lambda name: sessions.get(name, 0))
+        if strategy == 'power_of_two':
+            first, second = self.rng.sample(names, 2)
+            return first if sessions.get(first, 0) <= sessions.get(second, 0) else second
+        if strategy == 'weighted':
+            return min(names, key=lambda name: sessions.get(name, 0) / self.capacity(name))
+        raise ValueError(f"Estratégia desconhecida: {strategy}")
+
+    def consistent_hash(self, names, content_key):
+        """
+        Cada conteúdo fica sempre no mesmo cache (cache quente); quando um servidor
+        sai, só os conteúdos dele são redistribuídos.
+        """
+        servers = tuple(sorted(names))
+        ring = self.ring
+        if ring is None or ring[0] != servers:
+            with self.ring_lock:
+                points = sorted((ring_hash(f'{name}#{replica}'), name) for name in servers
+                                for replica in range(max(int(self.virtual_nodes * self.capacity(name)), 1)))
+                ring = self.ring = (servers, [point for point, _ in points], [name for _, name in points])
+        _, points, owners = ring
+        index = bisect.bisect(points, ring_hash(content_key)) % len(points)
+        return owners[index]
+
+# Criar uma única instância para ser usada em toda a aplicação
+server_load = ServerLoad(shared_state, write_buffer)
+load_balancer = LoadBalancer(server_load, parse_capacities(os.environ.get('STEERING_SERVER_CAPACITY')))
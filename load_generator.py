@@ -0,0 +1,410 @@
+"""
+Gerador de carga que emula milhares de players DASH com content steering.
+
+Cada cliente se comporta como o dash.js: consulta /manifest.json no intervalo
+do TTL da resposta, com _DASH_pathway e _DASH_throughput, segue a RELOAD-URI e,
+opcionalmente, baixa segmentos pelo /proxy_segment (de uma origem local
+simulada, sem acesso à rede) ou pelo /dataset/. O número de clientes sobe em
+estágios (--ramp 100,500,1000) e cada estágio tem o próprio relatório:
+histograma de latência, taxa de erros, consultas atingidas x esperadas e a
+distribuição das decisões de steering.
+
+Usa apenas asyncio (HTTP/1.1 com keep-alive, uma conexão por cliente).
+
+Exemplo (aplicação em outro terminal, ex.: NETWORK_CONTROL_BACKEND=dry-run):
+    python load_generator.py --target http://127.0.0.1:30500 --ramp 100,500,1000 --segments proxy
+"""
+import time
+import json
+import random
+import asyncio
+import argparse
+import urllib.parse
+from collections import Counter
+
+# Limites (ms) dos buckets dos histogramas de latência
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Segmentos de 4 s, como no dataset
+SEGMENT_DURATION = 4.0
+
+class HttpError(Exception):
+    pass
+
+class HttpConnection:
+    """
+    Conexão HTTP/1.1 persistente mínima (GET, Content-Length, chunked ou até o fechamento).
+    """
+    def __init__(self, host, port, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def get(self, path, keep_body=True):
+        """
+        Retorna (status, corpo ou None, bytes recebidos).
+        """
+        for attempt in range(2):
+            reused = self.writer is not None
+            try:
+                if not reused:
+                    self.reader, self.writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), self.timeout)
+                return await asyncio.wait_for(self._get(path, keep_body), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                self.close()
+                # Conexão ociosa fechada pelo servidor: tenta de novo uma única vez
+                if not reused or attempt:
+                    raise HttpError(str(e)) from e
+            except Exception:
+                self.close()
+                raise
+
+    async def _get(self, path, keep_body):
+        self.writer.write(f'GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n'
+                          f'Connection: keep-alive\r\nAccept-Encoding: identity\r\n\r\n'.encode())
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b'\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        chunks = [] if keep_body else None
+        received = 0
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size:
+                    data = await self.reader.readexactly(size)
+                    received += size
+                    if keep_body:
+                        chunks.append(data)
+                await self.reader.readexactly(2)
+                if not size:
+                    break
+        elif 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining:
+                data = await self.reader.read(min(remaining, 65536))
+                if not data:
+                    raise asyncio.IncompleteReadError(b'', remaining)
+                remaining -= len(data)
+                received += len(data)
+                if keep_body:
+                    chunks.append(data)
+        else:
+            while True:
+                data = await self.reader.read(65536)
+                if not data:
+                    break
+                received += len(data)
+                if keep_body:
+                    chunks.append(data)
+            headers['connection'] = 'close'
+
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, b''.join(chunks) if keep_body else None, received
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+class StandInOrigin:
+    """
+    Origem local de segmentos: responde a qualquer GET com um corpo do tamanho
+    configurado, para exercitar o /proxy_segment sem acesso à rede.
+    """
+    def __init__(self, segment_bytes=250000, host='127.0.0.1', port=0):
+        self.segment_bytes = segment_bytes
+        self.host = host
+        self.port = port
+        self.server = None
+        self.payload = bytes(segment_bytes)
+        self.requests = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/video/'
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                self.requests += 1
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: video/iso.segment\r\n'
+                             b'Content-Length: ' + str(self.segment_bytes).encode() + b'\r\n'
+                             b'Cache-Control: max-age=3600\r\n\r\n')
+                writer.write(self.payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # Cliente desconectado ou gerador encerrado
+        finally:
+            writer.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+
+class StageStats:
+    """
+    Métricas de um estágio do ramp.
+    """
+    def __init__(self, clients):
+        self.clients = clients
+        self.started = time.monotonic()
+        self.finished = None
+        self.latencies = {'manifest': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                          'segment': [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+        self.samples = {'manifest': [], 'segment': []}
+        self.errors = Counter()
+        self.requests = Counter()
+        self.decisions = Counter()
+        self.segment_bytes = 0
+        self.expected_polls = 0.0
+
+    def observe(self, kind, elapsed_ms):
+        histogram = self.latencies[kind]
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                histogram[index] += 1
+                break
+        else:
+            histogram[-1] += 1
+        self.samples[kind].append(elapsed_ms)
+
+    def report(self):
+        duration = (self.finished or time.monotonic()) - self.started
+        report = {'clients': self.clients, 'duration_s': round(duration, 1), 'requests': {}}
+        for kind, samples in self.samples.items():
+            requests = self.requests[kind]
+            if not requests:
+                continue
+            samples = sorted(samples)
+            percentile = lambda p: round(samples[min(int(len(samples) * p), len(samples) - 1)], 2) if samples else None
+            report['requests'][kind] = {
+                'count': requests,
+                'per_second': round(requests / duration, 1),
+                'errors': self.errors[kind],
+                'error_rate': round(self.errors[kind] / requests, 4),
+                'p50_ms': percentile(0.5),
+                'p90_ms': percentile(0.9),
+                'p99_ms': percentile(0.99),
+                'histogram_ms': dict(zip([f'<={bound}' for bound in LATENCY_BUCKETS_MS] + ['>5000'],
+                                         self.latencies[kind]))
+            }
+        # Consultas atingidas x esperadas pelo TTL: abaixo de 1, o servidor não acompanha os players
+        if self.expected_polls:
+            report['poll_ratio'] = round(self.requests['manifest'] / self.expected_polls, 3)
+        report['decisions'] = dict(self.decisions.most_common())
+        if self.segment_bytes:
+            report['segment_mbit_s'] = round(self.segment_bytes * 8 / duration / 1e6, 2)
+        return report
+
+class SteeringClient:
+    """
+    Um player: laço de consultas de steering e, opcionalmente, laço de segmentos.
+    """
+    def __init__(self, generator, index):
+        self.generator = generator
+        self.index = index
+        self.connection = HttpConnection(generator.host, generator.port, generator.timeout)
+        self.segment_connection = HttpConnection(generator.host, generator.port, generator.timeout)
+        self.reload_path = generator.steering_path
+        self.pathway = ''
+        self.throughput = 0.0  # bit/s medido nos segmentos (ou sintético)
+        self.ttl = 10
+        self.running = True
+        self.first_poll = None  # Início (monotônico) das consultas, após a chegada espalhada
+
+    async def run(self):
+        generator = self.generator
+        # Players chegam espalhados pelo primeiro TTL
+        await asyncio.sleep(generator.rng.uniform(0, self.ttl))
+        self.first_poll = time.monotonic()
+        tasks = [asyncio.ensure_future(self.steering_loop())]
+        if generator.segments != 'none':
+            tasks.append(asyncio.ensure_future(self.segment_loop()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.connection.close()
+            self.segment_connection.close()
+
+    async def steering_loop(self):
+        generator = self.generator
+        while self.running:
+            if generator.segments == 'none':
+                self.throughput = generator.rng.uniform(0.5, 1.0) * generator.throughput * 1000
+            params = urllib.parse.urlencode({'_DASH_pathway': self.pathway, '_DASH_throughput': round(self.throughput)})
+            separator = '&' if '?' in self.reload_path else '?'
+            stats = generator.stage
+            start = time.perf_counter()
+            try:
+                status, body, _ = await self.connection.get(f'{self.reload_path}{separator}{params}')
+                stats.requests['manifest'] += 1
+                stats.observe('manifest', (time.perf_counter() - start) * 1000)
+                if status != 200:
+                    stats.errors['manifest'] += 1
+                else:
+                    message = json.loads(body)
+                    self.pathway = message['PATHWAY-PRIORITY'][0]
+                    stats.decisions[self.pathway] += 1
+                    self.ttl = message.get('TTL', self.ttl)
+                    reload_uri = urllib.parse.urlsplit(message.get('RELOAD-URI', ''))
+                    if reload_uri.path:
+                        self.reload_path = f'{reload_uri.path}?{reload_uri.query}' if reload_uri.query else reload_uri.path
+            except Exception:
+                stats.requests['manifest'] += 1
+                stats.errors['manifest'] += 1
+            await asyncio.sleep(self.ttl)
+
+    async def segment_loop(self):
+        generator = self.generator
+        number = generator.rng.randrange(generator.segment_count)
+        while self.running:
+            if generator.segments == 'proxy':
+                # Mesmo formato das URLs reescritas por process_manifest
+                path = f'/proxy_segment?url={urllib.parse.quote(f"{generator.origin.url}seg-{number}.m4s", safe=":/")}'
+            else:
+                path = f'/dataset/{generator.dataset_file}'
+            stats = generator.stage
+            start = time.perf_counter()
+            try:
+                status, _, received = await self.segment_connection.get(path, keep_body=False)
+                elapsed = time.perf_counter() - start
+                stats.requests['segment'] += 1
+                stats.observe('segment', elapsed * 1000)
+                if status != 200:
+                    stats.errors['segment'] += 1
+                else:
+                    stats.segment_bytes += received
+                    self.throughput = received * 8 / max(elapsed, 1e-6)
+            except Exception:
+                stats.requests['segment'] += 1
+                stats.errors['segment'] += 1
+            number = (number + 1) % generator.segment_count
+            await asyncio.sleep(max(SEGMENT_DURATION - (time.perf_counter() - start), 0))
+
+class LoadGenerator:
+    def __init__(self, target, steering_path='/manifest.json', segments='none', dataset_file=None,
+                 segment_bytes=250000, segment_count=300, throughput=5000, timeout=10, seed=0):
+        parsed = urllib.parse.urlsplit(target)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 80
+        self.steering_path = steering_path
+        self.segments = segments
+        self.dataset_file = dataset_file
+        self.segment_bytes = segment_bytes
+        self.segment_count = segment_count
+        self.throughput = throughput  # kbit/s informado quando não há segmentos
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.origin = None
+        self.clients = []
+        self.stage = None
+
+    @staticmethod
+    def expected_polls(client, stage):
+        """
+        Consultas esperadas do cliente no estágio: uma a cada TTL. Os clientes novos
+        chegam espalhados pelo primeiro TTL e só contam a partir da primeira consulta.
+        """
+        if client.first_poll is None:
+            return 0.0
+        if client.first_poll < stage.started:
+            return (stage.finished - stage.started) / client.ttl
+        return (stage.finished - client.first_poll) // client.ttl + 1
+
+    async def run(self, ramp, stage_duration, on_stage=None):
+        if self.segments == 'proxy':
+            self.origin = await StandInOrigin(self.segment_bytes).start()
+        tasks = []
+        reports = []
+        try:
+            for clients in ramp:
+                self.stage = StageStats(clients)
+                while len(self.clients) < clients:
+                    client = SteeringClient(self, len(self.clients))
+                    self.clients.append(client)
+                    tasks.append(asyncio.ensure_future(client.run()))
+                await asyncio.sleep(stage_duration)
+                self.stage.finished = time.monotonic()
+                stage = self.stage
+                stage.expected_polls = sum(self.expected_polls(client, stage) for client in self.clients)
+                report = self.stage.report()
+                reports.append(report)
+                if on_stage:
+                    on_stage(report)
+        finally:
+            for client in self.clients:
+                client.running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.origin:
+                self.origin.close()
+        return reports
+
+def print_stage(report):
+    print(f"\n== {report['clients']} clientes ({report['duration_s']}s) ==")
+    for kind, values in report['requests'].items():
+        print(f"{kind}: {values['count']} req ({values['per_second']}/s), erros {values['error_rate']:.2%}, "
+              f"p50={values['p50_ms']}ms p90={values['p90_ms']}ms p99={values['p99_ms']}ms")
+        print('  ' + ' '.join(f"{bucket}:{count}" for bucket, count in values['histogram_ms'].items() if count))
+    if 'poll_ratio' in report:
+        print(f"Consultas atingidas/esperadas: {report['poll_ratio']}")
+    if 'segment_mbit_s' in report:
+        print(f"Segmentos: {report['segment_mbit_s']} Mbit/s")
+    print(f"Decisões: {report['decisions']}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gerador de carga de players DASH com content steering')
+    parser.add_argument('--target', default='http://127.0.0.1:30500', help='Endereço da aplicação')
+    parser.add_argument('--ramp', default='100,500,1000', help='Clientes em cada estágio (ex.: 100,500,1000)')
+    parser.add_argument('--stage-duration', type=float, default=60, help='Duração de cada estágio (s)')
+    parser.add_argument('--steering-path', default='/manifest.json')
+    parser.add_argument('--segments', choices=['none', 'proxy', 'dataset'], default='none',
+                        help="'proxy': /proxy_segment com origem local; 'dataset': /dataset/<--dataset-file>")
+    parser.add_argument('--dataset-file', help='Arquivo do dataset baixado em loop no modo dataset')
+    parser.add_argument('--segment-bytes', type=int, default=250000, help='Tamanho dos segmentos da origem local')
+    parser.add_argument('--segment-count', type=int, default=300, help='Segmentos distintos por conteúdo')
+    parser.add_argument('--throughput', type=float, default=5000,
+                        help='Throughput informado (kbit/s) quando os segmentos não são baixados')
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Grava os relatórios dos estágios neste arquivo')
+    args = parser.parse_args()
+
+    if args.segments == 'dataset' and not args.dataset_file:
+        parser.error('--segments dataset requer --dataset-file')
+
+    generator = LoadGenerator(args.target, steering_path=args.steering_path, segments=args.segments,
+                              dataset_file=args.dataset_file, segment_bytes=args.segment_bytes,
+                              segment_count=args.segment_count, throughput=args.throughput,
+                              timeout=args.timeout, seed=args.seed)
+    ramp = [int(clients) for clients in args.ramp.split(',') if clients.strip()]
+    reports = asyncio.run(generator.run(ramp, args.stage_duration, on_stage=print_stage))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
@@ -0,0 +1,272 @@
+import os
+import re
+import json
+import time
+import hashlib
+import calendar
+import argparse
+import numpy as np
+from datetime import datetime, timedelta
+from event_stream import EVENT_LOG_PATH
+
+# Diretório com as colunas já extraídas dos logs (reutilizadas entre execuções)
+ANALYTICS_DIR = 'analytics'
+
+# Uma linha de estatística por registro; QoE ausente fica como NaN
+STATS_DTYPE = np.dtype([
+    ('ts', 'f8'),
+    ('throughput', 'f8'),
+    ('latency', 'f8'),
+    ('packet_loss', 'f8'),
+    ('bandwidth', 'f8'),
+    ('qoe', 'f8')
+])
+
+# Quantidade de bytes lida por vez: limita a memória independentemente do tamanho do log
+READ_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Bytes iniciais usados para reconhecer se o arquivo foi recriado (o app limpa os logs ao iniciar)
+FINGERPRINT_BYTES = 256
+
+# Padrões do app.log, pré-compilados e em bytes (as linhas não são decodificadas)
+STATS_MARK = 'Estatísticas:'.encode()
+STEERING_MARK = 'Método de steering alterado para:'.encode()
+PRESET_MARK = b'NETWORK_PRESET:'
+INITIAL_MARK = 'Condições iniciais de rede configuradas:'.encode()
+STATS_PATTERN = re.compile(
+    r'Throughput=([\d.]+)kbit/s, Latência=([\d.]+)ms, Perda de Pacotes=([\d.]+)%, '
+    r'Largura de Banda=([\d.]+)kbit/s(?:, QoE=([\d.]+))?'.encode())
+INITIAL_PATTERN = re.compile(
+    r'Latência=(\d+)ms, Perda de Pacotes=([\d.]+)%, Largura de Banda=(\d+)kbit/s'.encode())
+
+# Referência para converter os segundos (horário local) de volta em datetime
+EPOCH = datetime(1970, 1, 1)
+
+_day_cache = {}
+
+def parse_timestamp(line):
+    """
+    Converte o prefixo "AAAA-MM-DD HH:MM:SS,mmm" em segundos (horário local, sem fuso),
+    sem strptime: a data é convertida uma vez por dia e o horário por fatiamento.
+    """
+    day = line[:10]
+    base = _day_cache.get(day)
+    if base is None:
+        base = _day_cache[day] = calendar.timegm((int(day[:4]), int(day[5:7]), int(day[8:10]), 0, 0, 0))
+    return base + int(line[11:13]) * 3600 + int(line[14:16]) * 60 + int(line[17:19]) + int(line[20:23]) / 1000
+
+def local_seconds(epoch):
+    """
+    Segundos desde a época (UTC) -> mesma escala de parse_timestamp (horário local).
+    """
+    return epoch + time.localtime(epoch).tm_gmtoff
+
+def to_datetimes(seconds):
+    """
+    Coluna de segundos (horário local) -> datetime64, aceito diretamente pelo matplotlib.
+    """
+    return (np.asarray(seconds) * 1000).astype('datetime64[ms]')
+
+class LogAnalytics:
+    """
+    Extrai de uma passada as séries usadas nos gráficos (condições de rede, QoE,
+    mudanças de steering e de preset) do app.log ou do events.jsonl.
+
+    As estatísticas ficam em um arquivo binário colunar lido via np.memmap e as
+    anotações (poucas) em JSON lines. O deslocamento já processado é salvo, então
+    update() só lê o que foi acrescentado ao log desde a última chamada.
+    """
+    def __init__(self, store_dir=ANALYTICS_DIR):
+        self.store_dir = store_dir
+        self.stats_path = os.path.join(store_dir, 'stats.f8')
+        self.annotations_path = os.path.join(store_dir, 'annotations.jsonl')
+        self.state_path = os.path.join(store_dir, 'state.json')
+        os.makedirs(store_dir, exist_ok=True)
+        self.state = self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def reset(self):
+        for path in (self.stats_path, self.annotations_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.state = {}
+
+    @staticmethod
+    def _fingerprint(path, length):
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read(length)).hexdigest()
+
+    def update(self, log_path):
+        """
+        Processa as linhas novas do log e retorna quantas foram lidas. Se o arquivo
+        mudou (outro caminho, truncado ou recriado), o armazenamento é refeito.
+        """
+        size = os.path.getsize(log_path)
+        offset = self.state.get('offset', 0)
+        same_file = (self.state.get('source') == os.path.abspath(log_path) and offset <= size and
+                     self.state.get('fingerprint') == self._fingerprint(log_path, min(offset, FINGERPRINT_BYTES)))
+        if not same_file:
+            self.reset()
+            self.state = {'source': os.path.abspath(log_path), 'offset': 0, 'initial': None}
+            offset = 0
+
+        parse_line = self._parse_event_line if log_path.endswith('.jsonl') else self._parse_log_line
+        lines_read = 0
+        with open(log_path, 'rb') as f, open(self.stats_path, 'ab') as stats_file, \
+                open(self.annotations_path, 'a', encoding='utf-8') as annotations_file:
+            f.seek(offset)
+            while True:
+                lines = f.readlines(READ_CHUNK_BYTES)
+                # Linha ainda sendo escrita: fica para a próxima chamada
+                partial = bool(lines) and not lines[-1].endswith(b'\n')
+                if partial:
+                    lines.pop()
+                if not lines:
+                    break
+                records = []
+                annotations = []
+                for line in lines:
+                    parse_line(line, records, annotations)
+                if records:
+                    np.array(records, dtype=STATS_DTYPE).tofile(stats_file)
+                for annotation in annotations:
+                    annotations_file.write(json.dumps(annotation) + '\n')
+                offset += sum(map(len, lines))
+                lines_read += len(lines)
+                if partial:
+                    break
+
+        self.state['offset'] = offset
+        self.state['fingerprint'] = self._fingerprint(log_path, min(offset, FINGERPRINT_BYTES))
+        self._save_state()
+        return lines_read
+
+    def _parse_log_line(self, line, records, annotations):
+        # Filtra por substring antes de qualquer regex: a maioria das linhas não interessa
+        if STATS_MARK in line:
+            match = STATS_PATTERN.search(line)
+            if match:
+                throughput, latency, packet_loss, bandwidth, qoe = match.groups()
+                records.append((parse_timestamp(line), float(throughput), float(latency), float(packet_loss),
+                                float(bandwidth), float(qoe) if qoe is not None else np.nan))
+        elif STEERING_MARK in line:
+            annotations.append({'ts': parse_timestamp(line), 'kind': 'steering',
+                                'label': f"Steering: {'IA' if b'IA' in line.split(STEERING_MARK, 1)[1] else 'Padrão'}"})
+        elif PRESET_MARK in line:
+            preset = line.split(PRESET_MARK, 1)[1].strip().decode('utf-8', 'replace')
+            annotations.append({'ts': parse_timestamp(line), 'kind': 'preset', 'label': f"Preset: {preset}"})
+        elif INITIAL_MARK in line and self.state.get('initial') is None:
+            match = INITIAL_PATTERN.search(line)
+            if match:
+                self.state['initial'] = [parse_timestamp(line)] + [float(value) for value in match.groups()]
+
+    def _parse_event_line(self, line, records, annotations):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return
+        event_type = event.get('type')
+        if event_type == 'stats':
+            qoe = event.get('qoe')
+            records.append((local_seconds(event['ts']), float(event.get('throughput', np.nan)), float(event['latency']),
+                            float(event['packet_loss']), float(event['bandwidth']),
+                            float(qoe) if qoe is not None else np.nan))
+        elif event_type == 'steering':
+            annotations.append({'ts': local_seconds(event['ts']), 'kind': 'steering',
+                                'label': f"Steering: {event['method']}"})
+        elif event_type == 'preset':
+            annotations.append({'ts': local_seconds(event['ts']), 'kind': 'preset',
+                                'label': f"Preset: {event['name']}"})
+        elif event_type == 'network' and event.get('initial') and self.state.get('initial') is None:
+            self.state['initial'] = [local_seconds(event['ts']), float(event['latency']),
+                                     float(event['packet_loss']), float(event['bandwidth'])]
+
+    def stats(self):
+        """
+        Estatísticas como array estruturado mapeado em memória (não carrega o arquivo).
+        """
+        if not os.path.exists(self.stats_path) or os.path.getsize(self.stats_path) == 0:
+            return np.zeros(0, dtype=STATS_DTYPE)
+        return np.memmap(self.stats_path, dtype=STATS_DTYPE, mode='r')
+
+    def annotations(self):
+        changes = {'steering': [], 'preset': []}
+        if os.path.exists(self.annotations_path):
+            with open(self.annotations_path, encoding='utf-8') as f:
+                for line in f:
+                    annotation = json.loads(line)
+                    changes[annotation['kind']].append(
+                        (EPOCH + timedelta(seconds=annotation['ts']), annotation['label']))
+        return changes['steering'], changes['preset']
+
+    def series(self):
+        """
+        Colunas prontas para os gráficos: condições de rede e QoE (com as condições
+        iniciais à frente, QoE inicial 3.0) e as mudanças de steering e de preset.
+        """
+        stats = self.stats()
+        ts, latency, packet_loss, bandwidth = stats['ts'], stats['latency'], stats['packet_loss'], stats['bandwidth']
+        has_qoe = ~np.isnan(stats['qoe'])
+        qoe_ts, qoe = ts[has_qoe], stats['qoe'][has_qoe]
+
+        initial = self.state.get('initial')
+        if initial:
+            initial_ts, initial_latency, initial_loss, initial_bandwidth = initial
+            ts = np.concatenate(([initial_ts], ts))
+            latency = np.concatenate(([initial_latency], latency))
+            packet_loss = np.concatenate(([initial_loss], packet_loss))
+            bandwidth = np.concatenate(([initial_bandwidth], bandwidth))
+            qoe_ts = np.concatenate(([initial_ts], qoe_ts))
+            qoe = np.concatenate(([3.0], qoe))  # QoE padrão para condições iniciais
+
+        steering_changes, preset_changes = self.annotations()
+        return {
+            'times': to_datetimes(ts),
+            'latency': np.asarray(latency),
+            'packet_loss': np.asarray(packet_loss),
+            'bandwidth': np.asarray(bandwidth),
+            'qoe_times': to_datetimes(qoe_ts),
+            'qoe': np.asarray(qoe),
+            'steering_changes': steering_changes,
+            'preset_changes': preset_changes
+        }
+
+def default_source(log_path='app.log'):
+    """
+    Prefere o fluxo de eventos estruturados; o app.log fica como alternativa.
+    """
+    if os.path.exists(EVENT_LOG_PATH) and os.path.getsize(EVENT_LOG_PATH) > 0:
+        return EVENT_LOG_PATH
+    return log_path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extrai as séries dos logs para o armazenamento colunar')
+    parser.add_argument('source', nargs='?', help='app.log ou events.jsonl (padrão: events.jsonl, se existir)')
+    parser.add_argument('--store', default=ANALYTICS_DIR)
+    parser.add_argument('--reset', action='store_true', help='Descarta o que já foi processado')
+    args = parser.parse_args()
+
+    analytics = LogAnalytics(args.store)
+    if args.reset:
+        analytics.reset()
+    source = args.source or default_source()
+    start = time.perf_counter()
+    lines = analytics.update(source)
+    elapsed = time.perf_counter() - start
+    print(f"{source}: {lines} linhas novas em {elapsed:.2f}s ({lines / max(elapsed, 1e-9):,.0f} linhas/s)")
+    stats = analytics.stats()
+    steering_changes, preset_changes = analytics.annotations()
+    print(f"Estatísticas: {len(stats)} | mudanças de steering: {len(steering_changes)} | "
+          f"mudanças de preset: {len(preset_changes)} | armazenamento: {args.store}")
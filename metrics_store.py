@@ -0,0 +1,155 @@
+import time
+import threading
+import numpy as np
+
+class MetricRing:
+    """
+    Ring buffer de tamanho fixo (NumPy) para uma métrica: instante, valor e o
+    número de sequência global de cada amostra.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.seqs = np.full(capacity, -1, dtype=np.int64)
+        self.index = -1
+
+    def append(self, seq, timestamp, value):
+        index = (self.index + 1) % self.capacity
+        self.timestamps[index] = timestamp
+        self.values[index] = value
+        self.seqs[index] = seq
+        self.index = index
+
+    def since(self, seq):
+        """
+        Amostras com sequência maior que seq, em ordem cronológica.
+        """
+        positions = np.flatnonzero(self.seqs > seq)
+        if len(positions) == 0:
+            return None
+        positions = positions[np.argsort(self.seqs[positions], kind='stable')]
+        return self.timestamps[positions], self.values[positions]
+
+class MetricsStore:
+    """
+    Séries temporais em memória para o dashboard (throughput, QoE, servidor
+    escolhido, pontuação por nó, latência das sondas).
+
+    Cada amostra recebe um número de sequência global: o cliente guarda o último
+    que recebeu e pede apenas o que veio depois (/metrics/series?since= ou o
+    Last-Event-ID do stream SSE). Métricas categóricas (ex.: servidor escolhido)
+    guardam o código do rótulo no ring e são devolvidas como texto.
+
+    Com vários workers (share_state), as amostras de cada um vão para um registro
+    no estado compartilhado e todos os workers as copiam para os próprios rings
+    (sync), então qualquer worker serve as séries completas. A sequência passa a
+    ser o id da amostra no registro, a mesma em todos os workers: um cliente SSE
+    pode reconectar em outro worker com o mesmo Last-Event-ID.
+    """
+    def __init__(self, capacity=3600):
+        self.capacity = capacity
+        self.rings = {}
+        self.categories = {}
+        self.labels = {}
+        self.seq = 0
+        self.changed = threading.Condition()
+        self.shared_state = None
+        self.sample_writer = None
+        self.log_position = 0
+
+    def share_state(self, shared_state, sample_writer=None):
+        # sample_writer: buffer de escrita do worker para as amostras (padrão: o próprio estado)
+        self.shared_state = shared_state
+        self.sample_writer = sample_writer or shared_state
+
+    def record(self, metric, value, timestamp=None):
+        self.record_many({metric: value}, timestamp)
+
+    def record_many(self, metrics, timestamp=None):
+        """
+        Registra várias métricas com o mesmo instante, notificando os leitores uma única vez.
+        """
+        timestamp = timestamp or time.time()
+        if self.shared_state is not None:
+            # Entra nos rings de todos os workers (inclusive este) no próximo sync
+            self.sample_writer.append('metrics_samples', [timestamp, metrics])
+            return
+        self._store(metrics, timestamp)
+
+    def sync(self):
+        """
+        Copia para os rings as amostras publicadas pelos workers desde a última leitura.
+        """
+        while True:
+            entries = self.shared_state.read_since('metrics_samples', self.log_position)
+            for entry_id, (timestamp, metrics) in entries:
+                self._store(metrics, timestamp, entry_id)
+                self.log_position = entry_id
+            if len(entries) < 1000:
+                return
+
+    def trim_shared(self):
+        """
+        Descarta do registro compartilhado as amostras que já não caberiam nos rings (apenas o líder).
+        """
+        self.shared_state.trim('metrics_samples', self.capacity)
+
+    def _store(self, metrics, timestamp, seq=None):
+        """
+        seq: número de sequência comum às métricas da amostra (o id no registro
+        compartilhado, igual em todos os workers); sem ele, um número por métrica.
+        """
+        with self.changed:
+            for metric, value in metrics.items():
+                ring = self.rings.get(metric)
+                if ring is None:
+                    ring = self.rings[metric] = MetricRing(self.capacity)
+                if isinstance(value, str):
+                    # Métrica categórica: guarda o código do rótulo
+                    codes = self.categories.setdefault(metric, {})
+                    labels = self.labels.setdefault(metric, [])
+                    if value not in codes:
+                        codes[value] = len(labels)
+                        labels.append(value)
+                    value = codes[value]
+                self.seq = seq if seq is not None else self.seq + 1
+                ring.append(self.seq, timestamp, value)
+            self.changed.notify_all()
+
+    def series(self, since=0):
+        """
+        Amostras posteriores a since, agrupadas por métrica: {'seq', 'series': {nome: {'t', 'v'}}}.
+        'reset' indica que parte do intervalo pedido já foi sobrescrita nos rings.
+        """
+        with self.changed:
+            seq = self.seq
+            payload = {}
+            reset = False
+            for metric, ring in self.rings.items():
+                samples = ring.since(since)
+                if samples is None:
+                    continue
+                timestamps, values = samples
+                if ring.index >= 0 and ring.seqs[(ring.index + 1) % ring.capacity] > since > 0:
+                    reset = True
+                labels = self.labels.get(metric)
+                payload[metric] = {
+                    't': np.round(timestamps, 3).tolist(),
+                    'v': [labels[int(code)] for code in values] if labels else values.tolist()
+                }
+        return {'seq': seq, 'reset': reset, 'series': payload}
+
+    def wait_for_update(self, seq, timeout):
+        """
+        Bloqueia até existir uma amostra com sequência maior que seq (ou até o timeout).
+        """
+        with self.changed:
+            return self.changed.wait_for(lambda: self.seq > seq, timeout)
+
+    def get_stats(self):
+        return {'metrics': len(self.rings), 'seq': self.seq, 'capacity': self.capacity,
+                'shared': self.shared_state is not None}
+
+# Criar uma única instância para ser usada em toda a aplicação
+metrics_store = MetricsStore()
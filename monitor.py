@@ -1,37 +1,223 @@
-import docker
 from docker.errors import NotFound as DockerNotFound
+import os
 import threading
 import logging
 import time
-import requests
-from requests.exceptions import RequestException
-from network_control import resolve_server_ip
+from collections import namedtuple
+from container_registry import container_registry
+from health_prober import HealthProber
+from async_logging import async_logging
+from metrics_store import metrics_store
+from instrumentation import instrumentation
 
-# Configuração do logger
+# Configuração do logger (escrita em monitor.log feita em background)
 monitor_logger = logging.getLogger('monitor_logger')
 monitor_logger.setLevel(logging.DEBUG)
 
-file_handler = logging.FileHandler('monitor.log')
-file_handler.setLevel(logging.DEBUG)
-
 formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-
-monitor_logger.addHandler(file_handler)
+async_logging.attach(monitor_logger, 'monitor.log', formatter, level=logging.DEBUG)
 monitor_logger.propagate = False
 
+# Informações de um nó saudável publicadas no snapshot
+NodeInfo = namedtuple('NodeInfo', ['name', 'ip', 'latency', 'last_seen'])
+
+# Snapshot imutável e versionado dos nós saudáveis
+NodeSnapshot = namedtuple('NodeSnapshot', ['version', 'timestamp', 'nodes'])
+
+# Amostra suavizada de uso de recursos de um contêiner
+ResourceSample = namedtuple('ResourceSample', ['timestamp', 'cpu_percent', 'memory_percent',
+                                               'rx_rate', 'tx_rate', 'connections'])
+
+class ResourceRing:
+    """
+    Ring buffer de amostras imutáveis com um único escritor.
+    O índice só é publicado depois da escrita, então o leitor obtém o último
+    valor em O(1) sem lock.
+    """
+    def __init__(self, size=60):
+        self.size = size
+        self.buffer = [None] * size
+        self.index = -1
+
+    def append(self, sample):
+        next_index = (self.index + 1) % self.size
+        self.buffer[next_index] = sample
+        self.index = next_index
+
+    def latest(self):
+        index = self.index
+        return self.buffer[index] if index >= 0 else None
+
+    def history(self):
+        index = self.index
+        if index < 0:
+            return []
+        samples = self.buffer[index + 1:] + self.buffer[:index + 1]
+        return [sample for sample in samples if sample is not None]
+
+class ResourceStatsCollector:
+    """
+    Coleta CPU%, memória%, taxas de rede e conexões abertas de cada contêiner
+    a partir do stream de estatísticas do Docker (uma thread por contêiner),
+    com suavização exponencial.
+    """
+    def __init__(self, alpha=0.3, ring_size=60):
+        self.alpha = alpha  # Peso da amostra nova na média móvel exponencial
+        self.ring_size = ring_size
+        self.rings = {}
+        self.threads = {}
+        self.wanted = set()
+        self.running = False
+
+    def start(self, servers):
+        self.running = True
+        self.sync(servers)
+
+    def stop(self):
+        self.running = False
+        self.wanted = set()
+
+    def sync(self, servers):
+        """
+        Garante uma thread de coleta para cada servidor informado; as demais encerram sozinhas.
+        """
+        if not self.running:
+            return
+        self.wanted = set(servers)
+        for name in self.wanted:
+            thread = self.threads.get(name)
+            if thread is None or not thread.is_alive():
+                self.rings.setdefault(name, ResourceRing(self.ring_size))
+                thread = threading.Thread(target=self._stream_loop, args=(name,), daemon=True)
+                self.threads[name] = thread
+                thread.start()
+
+    def latest(self, name):
+        ring = self.rings.get(name)
+        return ring.latest() if ring else None
+
+    def adopt(self, name, values):
+        """
+        Registra uma amostra coletada por outro processo (worker líder).
+        """
+        sample = ResourceSample(*values)
+        ring = self.rings.setdefault(name, ResourceRing(self.ring_size))
+        latest = ring.latest()
+        if latest is None or sample.timestamp > latest.timestamp:
+            ring.append(sample)
+
+    def _stream_loop(self, name):
+        backoff = 1
+        while self.running and name in self.wanted:
+            try:
+                container = container_registry.get_container(name)
+                pid = container.attrs.get('State', {}).get('Pid')
+                previous = None
+                for stats in container.stats(stream=True, decode=True):
+                    if not self.running or name not in self.wanted:
+                        return
+                    now = time.monotonic()
+                    if previous is not None:
+                        self._record(name, stats, previous, now, pid)
+                    previous = (now, stats)
+                    backoff = 1
+            except Exception as e:
+                monitor_logger.warning(f"Coleta de recursos de {name} interrompida: {str(e)}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _record(self, name, stats, previous, now, pid):
+        previous_time, previous_stats = previous
+        elapsed = max(now - previous_time, 1e-3)
+
+        cpu_percent = self._cpu_percent(stats)
+        memory_percent = self._memory_percent(stats)
+        rx_bytes, tx_bytes = self._network_bytes(stats)
+        previous_rx, previous_tx = self._network_bytes(previous_stats)
+        rx_rate = max(rx_bytes - previous_rx, 0) / elapsed
+        tx_rate = max(tx_bytes - previous_tx, 0) / elapsed
+        connections = self._open_connections(pid)
+
+        ring = self.rings[name]
+        last = ring.latest()
+        if last is not None:
+            a = self.alpha
+            cpu_percent = a * cpu_percent + (1 - a) * last.cpu_percent
+            memory_percent = a * memory_percent + (1 - a) * last.memory_percent
+            rx_rate = a * rx_rate + (1 - a) * last.rx_rate
+            tx_rate = a * tx_rate + (1 - a) * last.tx_rate
+            connections = a * connections + (1 - a) * last.connections
+
+        ring.append(ResourceSample(time.time(), cpu_percent, memory_percent, rx_rate, tx_rate, connections))
+
+    @staticmethod
+    def _cpu_percent(stats):
+        cpu_stats = stats.get('cpu_stats', {})
+        precpu_stats = stats.get('precpu_stats', {})
+        cpu_delta = (cpu_stats.get('cpu_usage', {}).get('total_usage', 0)
+                     - precpu_stats.get('cpu_usage', {}).get('total_usage', 0))
+        system_delta = cpu_stats.get('system_cpu_usage', 0) - precpu_stats.get('system_cpu_usage', 0)
+        online_cpus = cpu_stats.get('online_cpus') or len(cpu_stats.get('cpu_usage', {}).get('percpu_usage') or [1])
+        if cpu_delta <= 0 or system_delta <= 0:
+            return 0.0
+        return cpu_delta / system_delta * online_cpus * 100
+
+    @staticmethod
+    def _memory_percent(stats):
+        memory_stats = stats.get('memory_stats', {})
+        limit = memory_stats.get('limit')
+        if not limit:
+            return 0.0
+        # Desconta o cache de páginas (cgroup v1: cache, cgroup v2: inactive_file)
+        detail = memory_stats.get('stats', {})
+        cache = detail.get('inactive_file', detail.get('cache', 0))
+        return max(memory_stats.get('usage', 0) - cache, 0) / limit * 100
+
+    @staticmethod
+    def _network_bytes(stats):
+        networks = stats.get('networks') or {}
+        rx = sum(network.get('rx_bytes', 0) for network in networks.values())
+        tx = sum(network.get('tx_bytes', 0) for network in networks.values())
+        return rx, tx
+
+    @staticmethod
+    def _open_connections(pid):
+        """
+        Conta conexões TCP estabelecidas no namespace de rede do contêiner.
+        """
+        if not pid:
+            return 0
+        count = 0
+        for table in ('tcp', 'tcp6'):
+            try:
+                with open(f'/proc/{pid}/net/{table}') as f:
+                    next(f, None)
+                    count += sum(1 for line in f if line.split()[3] == '01')
+            except (OSError, IndexError):
+                pass
+        return count
+
 class ContainerMonitor:
-    def __init__(self):
-        self.docker_client = docker.from_env()
+    DEFAULT_SERVERS = ['video-streaming-cache-1', 'video-streaming-cache-2', 'video-streaming-cache-3']
+
+    def __init__(self, server_prefix='video-streaming-cache-', tick_interval=1.0):
         self.selected_server = None
         self.running = False
         self.thread = None
-        self.user_active_servers = set(['video-streaming-cache-1', 'video-streaming-cache-2', 'video-streaming-cache-3'])
-        self.active_servers = set(['video-streaming-cache-1', 'video-streaming-cache-2', 'video-streaming-cache-3'])
-        self.health_check_retries = 3
-        self.health_check_backoff = 1
+        self.server_prefix = server_prefix
+        self.tick_interval = tick_interval  # Intervalo entre varreduras do prober (segundos)
+        self.known_servers = self.discover_servers()
+        self.user_active_servers = set(self.known_servers)
+        self.active_servers = set(self.known_servers)
+        self.prober = HealthProber()
+        self.resource_stats = ResourceStatsCollector()
         self.network_conditions = {}
 
+        # Snapshot dos nós saudáveis, substituído atomicamente pelo _collect_loop.
+        # As rotas apenas leem a referência, sem lock e sem sondar os servidores.
+        self.snapshot = NodeSnapshot(version=0, timestamp=0, nodes=())
+        self.snapshot_lock = threading.Lock()
+
         # Lock para garantir a atualização segura de user_active_servers
         self.user_active_servers_lock = threading.Lock()
         
@@ -39,11 +225,36 @@ class ContainerMonitor:
         for server_name in self.user_active_servers:
             self.ensure_container_running(server_name)
 
+    def discover_servers(self):
+        """
+        Descobre os servidores de cache: variável de ambiente CACHE_SERVERS
+        (separados por vírgula), contêineres com o prefixo configurado ou,
+        em último caso, os três servidores padrão.
+        """
+        configured = os.environ.get('CACHE_SERVERS')
+        if configured:
+            return sorted(name.strip() for name in configured.split(',') if name.strip())
+        try:
+            container_registry.refresh_all()
+            discovered = container_registry.names(self.server_prefix)
+            if discovered:
+                monitor_logger.info(f"Servidores de cache descobertos: {discovered}")
+                return discovered
+        except Exception as e:
+            monitor_logger.error(f"Erro ao descobrir servidores de cache: {str(e)}")
+        return list(self.DEFAULT_SERVERS)
+
+    @property
+    def docker_client(self):
+        # Cliente Docker compartilhado com o registro de contêineres
+        return container_registry.client
+
     def ensure_container_running(self, server_name):
         try:
             container = self.docker_client.containers.get(server_name)
             if container.status != 'running':
                 container.start()
+                container_registry.refresh(server_name)
                 monitor_logger.info(f"Contêiner {server_name} iniciado durante a inicialização.")
                 time.sleep(5)  # Aguarda um pouco para o contêiner inicializar completamente
         except DockerNotFound:
@@ -52,6 +263,8 @@ class ContainerMonitor:
             monitor_logger.error(f"Erro ao inicializar o contêiner {server_name}: {str(e)}")
 
     def start_collecting(self):
+        container_registry.start()
+        self.resource_stats.start(self.user_active_servers)
         self.running = True
         self.thread = threading.Thread(target=self._collect_loop)
         self.thread.start()
@@ -61,6 +274,9 @@ class ContainerMonitor:
         self.running = False
         if self.thread:
             self.thread.join()
+        container_registry.stop()
+        self.resource_stats.stop()
+        self.prober.shutdown()
         monitor_logger.info("Monitoramento de contêineres encerrado")
 
     def _collect_loop(self):
@@ -69,45 +285,87 @@ class ContainerMonitor:
                 self.check_containers()
             except Exception as e:
                 monitor_logger.error(f"Erro no loop de monitoramento: {str(e)}", exc_info=True)
-            time.sleep(10)  # Intervalo de verificação de 10 segundos
+            # O prober decide quais servidores estão vencidos a cada tick
+            time.sleep(self.tick_interval)
 
     def check_server_health(self, server_name):
-        ip = resolve_server_ip(server_name)
-        if not ip:
-            monitor_logger.error(f"Não foi possível resolver o IP para {server_name}")
-            return False
+        return self.prober.probe(server_name).healthy
 
-        url = f"http://{ip}:80/"
-        for attempt in range(self.health_check_retries):
-            try:
-                response = requests.head(url, timeout=5)
-                monitor_logger.info(f"Resposta do servidor {server_name}: status {response.status_code}")
-                return response.status_code == 200
-            except RequestException as e:
-                monitor_logger.warning(f"Tentativa {attempt + 1} falhou para {server_name}: {str(e)}")
-                time.sleep(self.health_check_backoff * (2 ** attempt))
+    def get_probe_metrics(self):
+        return self.prober.get_metrics()
 
-        monitor_logger.error(f"Falha ao verificar saúde do servidor {server_name} após {self.health_check_retries} tentativas")
-        return False
+    def get_cpu_usage(self, server_name):
+        sample = self.resource_stats.latest(server_name)
+        return sample.cpu_percent if sample else 0
 
-    def getNodes(self, metric='ip_address'):
-        nodes = []
+    def get_memory_usage(self, server_name):
+        sample = self.resource_stats.latest(server_name)
+        return sample.memory_percent if sample else 0
+
+    def get_resource_stats(self, server_name):
+        """
+        Últimos valores suavizados de recursos do servidor (leitura O(1)).
+        """
+        sample = self.resource_stats.latest(server_name)
+        return sample._asdict() if sample else None
+
+    def get_snapshot(self):
+        """
+        Retorna o snapshot atual dos nós saudáveis (leitura O(1), sem lock).
+        """
+        return self.snapshot
+
+    def publish_snapshot(self, nodes):
+        """
+        Publica um novo snapshot imutável com os nós informados.
+        """
+        with self.snapshot_lock:
+            self.snapshot = NodeSnapshot(
+                version=self.snapshot.version + 1,
+                timestamp=time.time(),
+                nodes=tuple(sorted(nodes, key=lambda node: node.name))
+            )
+        monitor_logger.debug(f"Snapshot de nós publicado (versão {self.snapshot.version}): "
+                            f"{[node.name for node in self.snapshot.nodes]}")
+
+    def adopt_snapshot(self, version, timestamp, nodes):
+        """
+        Adota um snapshot publicado pelo worker líder (modo com vários workers).
+        """
+        previous = {node.name: node.last_seen for node in self.snapshot.nodes}
+        for node in nodes:
+            node = NodeInfo(*node)
+            # Sondas novas do líder também alimentam as séries deste worker
+            if node.latency is not None and previous.get(node.name) != node.last_seen:
+                metrics_store.record(f'probe_latency.{node.name}', node.latency * 1000, node.last_seen)
+        with self.snapshot_lock:
+            self.snapshot = NodeSnapshot(version=version, timestamp=timestamp,
+                                         nodes=tuple(NodeInfo(*node) for node in nodes))
+
+    def adopt_resource_samples(self, samples):
+        for server_name, values in samples.items():
+            self.resource_stats.adopt(server_name, values)
+
+    def set_user_active_servers(self, server_names):
+        """
+        Substitui o conjunto de servidores habilitados pelo usuário (estado compartilhado entre workers).
+        """
         with self.user_active_servers_lock:
-            for server_name in self.user_active_servers:
-                if server_name in self.active_servers:
-                    try:
-                        ip = resolve_server_ip(server_name)
-                        if ip and self.check_server_health(server_name):
-                            nodes.append((server_name, ip))
-                            monitor_logger.info(f"Nó ativo encontrado: {server_name} ({ip})")
-                    except Exception as e:
-                        monitor_logger.error(f"Erro ao obter informações do nó {server_name}: {str(e)}")
-        monitor_logger.info(f"Total de nós ativos: {len(nodes)}")
-        return nodes
+            self.user_active_servers = set(server_names)
+
+    @instrumentation.timed('monitor.getNodes')
+    def getNodes(self, metric='ip_address'):
+        """
+        Retorna os nós saudáveis do último snapshot como tuplas (nome, ip).
+        Não sonda os servidores: o snapshot é mantido pelo _collect_loop.
+        """
+        snapshot = self.snapshot
+        user_active_servers = self.user_active_servers
+        return [(node.name, node.ip) for node in snapshot.nodes if node.name in user_active_servers]
 
     def set_selected_server(self, server_name):
         self.selected_server = server_name
-        monitor_logger.info(f"Servidor selecionado: {server_name}")
+        monitor_logger.info("Servidor selecionado: %s", server_name)
 
     def update_server_state(self, server_name, is_active):
         monitor_logger.info(f"Atualizando estado do servidor {server_name} para {'ativo' if is_active else 'inativo'}")
@@ -121,8 +379,10 @@ class ContainerMonitor:
                     container = self.docker_client.containers.get(server_name)
                     if container.status == 'running':
                         container.stop()
+                        container_registry.refresh(server_name)
                         monitor_logger.info(f"Contêiner {server_name} parado.")
                     self.active_servers.discard(server_name)
+                    self.publish_snapshot([node for node in self.snapshot.nodes if node.name != server_name])
 
         except DockerNotFound:
             monitor_logger.error(f"Contêiner {server_name} não encontrado.")
@@ -140,39 +400,48 @@ class ContainerMonitor:
         with self.user_active_servers_lock:
             active_servers_copy = self.user_active_servers.copy()
 
-        self.active_servers.clear()
-
+        # Apenas servidores em execução são sondados; o status vem do registro (sem chamadas ao Docker)
+        running_servers = []
         for container_name in active_servers_copy:
-            try:
-                container = self.docker_client.containers.get(container_name)
-                is_running = container.status == 'running'
-                is_user_active = container_name in self.user_active_servers
+            status = container_registry.get_status(container_name)
+            if status is None:
+                monitor_logger.error(f"Contêiner {container_name} não encontrado.")
+            elif status != 'running':
+                monitor_logger.info(f"Contêiner {container_name} não está em execução ou não está ativo pelo usuário.")
+            else:
+                running_servers.append(container_name)
 
-                if not is_running or not is_user_active:
-                    monitor_logger.info(f"Contêiner {container_name} não está em execução ou não está ativo pelo usuário.")
-                    continue
+        self.resource_stats.sync(running_servers)
+        results = self.prober.sweep(running_servers)
+        for result in results:
+            if result.latency is not None:
+                metrics_store.record(f'probe_latency.{result.name}', result.latency * 1000, result.timestamp)
+            if not result.healthy:
+                instrumentation.count_probe_failure(result.name)
 
-                is_healthy = self.check_server_health(container_name)
+        active_servers = set()
+        healthy_nodes = []
+        for container_name in running_servers:
+            if container_name not in self.user_active_servers or not self.prober.is_healthy(container_name):
+                continue
+            last_success = self.prober.get_last_success(container_name)
+            active_servers.add(container_name)
+            healthy_nodes.append(NodeInfo(name=container_name, ip=last_success.ip,
+                                          latency=last_success.latency, last_seen=last_success.timestamp))
 
-                if is_healthy and is_running:
-                    monitor_logger.info(f"Servidor {container_name} está saudável e em execução.")
-                    self.active_servers.add(container_name)
-                else:
-                    reasons = []
-                    if not is_running:
-                        reasons.append("não está em execução")
-                    if not is_healthy:
-                        reasons.append("não está respondendo")
-                    reason = " e ".join(reasons)
-                    monitor_logger.warning(f"Servidor {container_name} {reason}, mas está ativo para o usuário.")
-
-            except DockerNotFound:
-                monitor_logger.error(f"Contêiner {container_name} não encontrado.")
-            except Exception as e:
-                monitor_logger.error(f"Erro ao verificar contêiner {container_name}: {str(e)}", exc_info=True)
+        for name in active_servers - self.active_servers:
+            monitor_logger.info(f"Servidor {name} está saudável e em execução.")
+        for name in (self.active_servers & active_servers_copy) - active_servers:
+            monitor_logger.warning(f"Servidor {name} não está respondendo, mas está ativo para o usuário.")
+
+        membership_changed = active_servers != self.active_servers
+        self.active_servers = active_servers
+        if results or membership_changed:
+            self.publish_snapshot(healthy_nodes)
 
-        monitor_logger.info(f"Servidores ativos: {self.active_servers}")
-        monitor_logger.info(f"Servidores ativos para o usuário: {self.user_active_servers}")
+        if membership_changed:
+            monitor_logger.info(f"Servidores ativos: {self.active_servers}")
+            monitor_logger.info(f"Servidores ativos para o usuário: {self.user_active_servers}")
 
 # Criar uma única instância para ser usada em toda a aplicação
 monitor = ContainerMonitor()
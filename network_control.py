@@ -1,24 +1,272 @@
+import os
 import subprocess
 import threading
 import logging
 import netifaces
-import time
-import docker
+from collections import namedtuple
+from concurrent.futures import Future
+from container_registry import container_registry
 
 # Configuração do logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Objeto da árvore de shaping (qdisc, class ou filter). Para filtros, o handle é a prioridade.
+# parent: 'root' ou handle/classid do pai; params: tupla de tokens do tc
+TcObject = namedtuple('TcObject', ['type', 'handle', 'parent', 'kind', 'params'])
+
+class SubprocessTcBackend:
+    """
+    Executa os comandos tc em uma única chamada `tc -batch`.
+    """
+    name = 'tc'
+
+    def __init__(self, use_sudo=True):
+        self.prefix = ['sudo'] if use_sudo else []
+
+    def run_batch(self, commands):
+        """
+        Retorna (sucesso, mensagem de erro). O código de saída do tc é a validação.
+        """
+        result = subprocess.run(self.prefix + ['tc', '-batch', '-'], input='\n'.join(commands) + '\n',
+                                capture_output=True, text=True)
+        return result.returncode == 0, result.stderr.strip()
+
+    def show(self, interface):
+        return '\n'.join(subprocess.check_output(self.prefix + ['tc', kind, 'show', 'dev', interface],
+                                                 universal_newlines=True)
+                         for kind in ('qdisc', 'class', 'filter'))
+
+class DryRunTcBackend:
+    """
+    Simula o tc em memória: registra os comandos e mantém a árvore de qdiscs,
+    classes e filtros resultante, permitindo testar e medir a lógica sem root.
+    """
+    name = 'dry-run'
+    KEYWORDS = ('parent', 'handle', 'classid', 'prio', 'protocol')
+
+    def __init__(self):
+        self.trees = {}  # interface -> {(tipo, handle): TcObject}
+        self.history = []
+        self.batches = 0
+
+    def run_batch(self, commands):
+        self.batches += 1
+        for line_number, command in enumerate(commands, 1):
+            self.history.append(command)
+            error = self._execute(command.split())
+            if error:
+                return False, f"Command failed -:{line_number}: {error}"
+        return True, ''
+
+    def parse(self, tokens):
+        """
+        Converte um comando tc em (ação, interface, TcObject).
+        """
+        object_type, action, interface = tokens[0], tokens[1], tokens[3]
+        fields = {}
+        rest = tokens[4:]
+        while rest and (rest[0] == 'root' or rest[0] in self.KEYWORDS):
+            if rest[0] == 'root':
+                fields['parent'], rest = 'root', rest[1:]
+            else:
+                fields[rest[0]], rest = rest[1], rest[2:]
+        handle = fields.get('prio') if object_type == 'filter' else fields.get('classid', fields.get('handle'))
+        kind = rest[0] if rest else None
+        return action, interface, TcObject(object_type, handle, fields.get('parent'), kind, tuple(rest[1:]))
+
+    def _execute(self, tokens):
+        if len(tokens) < 5 or tokens[0] not in ('qdisc', 'class', 'filter') or tokens[2] != 'dev':
+            return f"comando inválido: {' '.join(tokens)}"
+        action, interface, obj = self.parse(tokens)
+        tree = self.trees.setdefault(interface, {})
+        key = (obj.type, obj.handle)
+        current = tree.get(key)
+
+        if action == 'del':
+            if current is None:
+                return "objeto inexistente"
+            if obj.type == 'class' and any(o.type == 'filter' and obj.handle in o.params for o in tree.values()):
+                return "classe em uso por um filtro"
+            self._remove(tree, key)
+        elif action == 'change':
+            if current is None or current.kind != obj.kind or current.parent != obj.parent:
+                return "objeto inexistente para change"
+            tree[key] = obj
+        elif action == 'replace':
+            if obj.parent == 'root':
+                tree.clear()
+            elif not any(handle == obj.parent for _, handle in tree):
+                return "pai inexistente"
+            if obj.type == 'filter' and 'classid' in obj.params:
+                target = obj.params[obj.params.index('classid') + 1]
+                if ('class', target) not in tree:
+                    return "classe de destino inexistente"
+            if obj.type == 'qdisc':
+                # Um qdisc novo substitui o anterior no mesmo pai, descartando seus filhos
+                for other in [k for k, o in tree.items() if o.type == 'qdisc' and o.parent == obj.parent]:
+                    self._remove(tree, other)
+                if key in tree:
+                    self._remove(tree, key)
+            tree[key] = obj
+        else:
+            return f"ação não suportada: {action}"
+        return None
+
+    def _remove(self, tree, key):
+        obj = tree.pop(key)
+        for child in [k for k, o in tree.items() if o.parent == obj.handle]:
+            if child in tree:
+                self._remove(tree, child)
+
+    def show(self, interface):
+        lines = []
+        for obj in self.trees.get(interface, {}).values():
+            parent = 'root' if obj.parent == 'root' else f'parent {obj.parent}'
+            lines.append(f"{obj.type} {obj.kind} {obj.handle} {parent} {' '.join(obj.params)}".rstrip())
+        return '\n'.join(lines)
+
+TC_BACKENDS = {
+    SubprocessTcBackend.name: SubprocessTcBackend,
+    DryRunTcBackend.name: DryRunTcBackend
+}
+
+class TcRuleEngine:
+    """
+    Aplica a árvore de shaping desejada calculando a diferença para a árvore
+    aplicada: apenas os objetos novos, alterados ou removidos geram comandos
+    (custo proporcional às classes alteradas), sem derrubar a árvore. Quando a
+    raiz muda ou o estado é desconhecido, a árvore é recriada com `replace`.
+    Tudo é enviado em um único batch.
+    """
+    def __init__(self, interface, backend):
+        self.interface = interface
+        self.backend = backend
+        self.applied = None  # Árvore aplicada com sucesso; None = desconhecida
+        self.last_error = None
+        self.stats = {'applies': 0, 'rebuilds': 0, 'changes': 0, 'noops': 0, 'failures': 0, 'commands': 0}
+
+    @staticmethod
+    def key(obj):
+        return (obj.type, obj.handle)
+
+    def diff(self, desired):
+        """
+        Comandos necessários para ir da árvore aplicada à desejada.
+        O primeiro objeto da árvore é sempre o qdisc raiz.
+        """
+        current = self.applied
+        if current is None or current[0] != desired[0]:
+            return [self._command('replace', obj) for obj in desired], True
+
+        current_by_key = {self.key(obj): obj for obj in current}
+        desired_by_key = {self.key(obj): obj for obj in desired}
+        commands = []
+
+        # Remoções em ordem inversa de criação (filtros antes das classes); a folha
+        # de uma classe removida sai junto com ela
+        removed = {self.key(obj) for obj in current if self.key(obj) not in desired_by_key}
+        removed_handles = {handle for _, handle in removed}
+        for obj in reversed(current):
+            if self.key(obj) in removed and not (obj.type == 'qdisc' and obj.parent in removed_handles):
+                commands.append(self._command('del', obj))
+
+        for obj in desired:
+            previous = current_by_key.get(self.key(obj))
+            if previous is None:
+                commands.append(self._command('replace', obj))
+            elif previous != obj:
+                same_place = previous.kind == obj.kind and previous.parent == obj.parent
+                commands.append(self._command('change' if same_place else 'replace', obj))
+        return commands, False
+
+    def _command(self, action, obj):
+        device = f'dev {self.interface}'
+        parent = 'root' if obj.parent == 'root' else f'parent {obj.parent}'
+        if obj.type == 'qdisc':
+            if action == 'del':
+                return f'qdisc del {device} {parent} handle {obj.handle}'
+            head = f'qdisc {action} {device} {parent} handle {obj.handle}'
+        elif obj.type == 'class':
+            if action == 'del':
+                return f'class del {device} {parent} classid {obj.handle}'
+            head = f'class {action} {device} {parent} classid {obj.handle}'
+        else:
+            if action == 'del':
+                return f'filter del {device} {parent} protocol ip prio {obj.handle}'
+            # Filtros são sempre substituídos (mesma prioridade e handle)
+            head = f'filter replace {device} {parent} protocol ip prio {obj.handle} handle 1'
+        return ' '.join(filter(None, [head, obj.kind, ' '.join(obj.params)]))
+
+    def apply(self, desired):
+        desired = tuple(desired)
+        commands, rebuild = self.diff(desired)
+        if not commands:
+            self.stats['noops'] += 1
+            return True
+        ok, error = self.backend.run_batch(commands)
+        self.stats['applies'] += 1
+        self.stats['commands'] += len(commands)
+        if not ok:
+            # Estado parcial desconhecido: a próxima aplicação recria a árvore
+            self.applied = None
+            self.stats['failures'] += 1
+            self.last_error = error
+            logging.error(f"Erro ao aplicar regras tc ({len(commands)} comandos): {error}")
+            return False
+        self.applied = desired
+        self.stats['rebuilds' if rebuild else 'changes'] += 1
+        return True
+
+    def reset(self):
+        self.applied = None
+
+class TcApplyError(Exception):
+    """
+    As regras tc não puderam ser aplicadas; o estado do kernel não mudou para as condições pedidas.
+    """
+
+# Condições de rede imutáveis: perfil global e condições próprias por servidor.
+# servers (nome -> dict) nunca é alterado depois de publicado; cada mudança cria um novo snapshot.
+NetworkConditions = namedtuple('NetworkConditions', ['latency', 'packet_loss', 'bandwidth', 'servers'])
+
+def create_tc_backend(name=None):
+    name = name or os.environ.get('NETWORK_CONTROL_BACKEND', SubprocessTcBackend.name)
+    if name not in TC_BACKENDS:
+        raise ValueError(f"Backend de tc desconhecido: {name}. Opções: {sorted(TC_BACKENDS)}")
+    return TC_BACKENDS[name]()
+
 class NetworkControl:
-    def __init__(self, interface=None):
-        self.latency = 35  # ms
-        self.packet_loss = 0.5  # %
-        self.bandwidth = 10000  # kbit/s
-        self.lock = threading.Lock()
+    """
+    Controle das condições de rede emuladas via tc.
+
+    As atualizações são enfileiradas em um slot único de "estado desejado"
+    (atualizações próximas são coalescidas) e aplicadas por uma thread dedicada.
+    Os leitores usam o snapshot imutável das últimas condições aplicadas, sem lock.
+    """
+    def __init__(self, interface=None, backend=None):
         self.interface = interface or self.detect_interface()
-        self.last_update_time = 0
-        self.update_interval = 1  # Intervalo mínimo entre atualizações (em segundos)
         self.burst = '32kbit'
-        self.tc_latency = '400ms'
+        # Backend 'tc' (padrão) ou 'dry-run'; configurável por NETWORK_CONTROL_BACKEND
+        if backend is None or isinstance(backend, str):
+            backend = create_tc_backend(backend)
+        self.tc_engine = TcRuleEngine(self.interface, backend)
+        self.server_indexes = {}
+        self.server_ips = {}
+        self.ip_resolver = resolve_server_ip
+
+        # Últimas condições aplicadas (lidas sem lock) e próximo estado desejado
+        self.snapshot = NetworkConditions(latency=35, packet_loss=0.5, bandwidth=10000, servers={})
+        # Incrementada a cada novo snapshot: permite que os leitores mantenham caches derivados
+        self.version = 0
+        # Revisão do estado publicado entre workers (crescente): estados mais antigos não são adotados
+        self.revision = 0
+        self.desired = self.snapshot
+        self.pending_futures = []
+        self.applying = False
+        self.lock = threading.Lock()
+        self.pending_changed = threading.Condition(self.lock)
+        self.applier_thread = None
+        self.apply_stats = {'requests': 0, 'coalesced': 0}
 
     def detect_interface(self):
         interfaces = netifaces.interfaces()
@@ -29,91 +277,257 @@ class NetworkControl:
                     return iface
         raise ValueError("Nenhuma interface de rede adequada encontrada")
 
+    # Atributos do perfil global, mantidos para compatibilidade de leitura
+    @property
+    def latency(self):
+        return self.snapshot.latency
+
+    @property
+    def packet_loss(self):
+        return self.snapshot.packet_loss
+
+    @property
+    def bandwidth(self):
+        return self.snapshot.bandwidth
+
+    @property
+    def server_conditions(self):
+        return self.snapshot.servers
+
     def update_conditions(self, latency=None, packet_loss=None, bandwidth=None):
-        with self.lock:
-            current_time = time.time()
-            if current_time - self.last_update_time < self.update_interval:
-                logging.info("Atualização ignorada devido ao rate limiting")
-                return
-
-            changed = False
-            if latency is not None and self.latency != latency:
-                self.latency = latency
-                changed = True
-            if packet_loss is not None and self.packet_loss != packet_loss:
-                self.packet_loss = packet_loss
-                changed = True
-            if bandwidth is not None and self.bandwidth != bandwidth:
-                self.bandwidth = bandwidth
-                changed = True
-
-            if changed:
-                self._apply_tc_rules()
-                self.last_update_time = current_time
+        """
+        Pede novas condições globais. Retorna um Future resolvido com as condições
+        aplicadas quando o kernel corresponder a elas (ou com TcApplyError).
+        """
+        def change(desired):
+            return desired._replace(
+                latency=desired.latency if latency is None else latency,
+                packet_loss=desired.packet_loss if packet_loss is None else packet_loss,
+                bandwidth=desired.bandwidth if bandwidth is None else bandwidth
+            )
+        return self._submit(change)
+
+    def set_server_conditions(self, server_name, latency=None, packet_loss=None, bandwidth=None):
+        """
+        Define condições próprias para o tráfego de um servidor de cache (valores
+        omitidos seguem o perfil global). Apenas a classe desse servidor é alterada.
+        """
+        def change(desired):
+            override = dict(desired.servers.get(server_name, {}))
+            for key, value in (('latency', latency), ('packet_loss', packet_loss), ('bandwidth', bandwidth)):
+                if value is not None:
+                    override[key] = value
+            servers = dict(desired.servers)
+            servers[server_name] = override
+            return desired._replace(servers=servers)
+        return self._submit(change)
+
+    def clear_server_conditions(self, server_name):
+        def change(desired):
+            servers = dict(desired.servers)
+            servers.pop(server_name, None)
+            return desired._replace(servers=servers)
+        return self._submit(change)
+
+    def _submit(self, change):
+        future = Future()
+        with self.pending_changed:
+            desired = change(self.desired)
+            self.apply_stats['requests'] += 1
+            if desired == self.desired == self.snapshot and not self.applying:
+                future.set_result(desired)
+                return future
+            self.desired = desired
+            self.pending_futures.append(future)
+            self._ensure_applier()
+            self.pending_changed.notify()
+        return future
+
+    def _ensure_applier(self):
+        if self.applier_thread is None:
+            self.applier_thread = threading.Thread(target=self._applier_loop, daemon=True)
+            self.applier_thread.start()
+
+    def _applier_loop(self):
+        """
+        Aplica sempre o estado desejado mais recente; pedidos que chegam durante
+        uma aplicação são atendidos juntos na próxima.
+        """
+        while True:
+            with self.pending_changed:
+                while not self.pending_futures:
+                    self.pending_changed.wait()
+                desired = self.desired
+                futures, self.pending_futures = self.pending_futures, []
+                self.applying = True
+                self.apply_stats['coalesced'] += len(futures) - 1
+
+            try:
+                ok = self.tc_engine.apply(self.build_tc_tree(desired))
+                error = self.tc_engine.last_error
+            except Exception as e:
+                ok, error = False, str(e)
+
+            with self.pending_changed:
+                self.applying = False
+                if ok:
+                    self.snapshot = desired
+                    self.version += 1
+                elif self.desired is desired:
+                    # Sem pedidos mais novos: o desejado volta a ser o que está aplicado
+                    self.desired = self.snapshot
+
+            if ok:
+                logging.info(f"Condições de rede aplicadas: Latência={desired.latency}ms, "
+                             f"Perda de Pacotes={desired.packet_loss}%, Largura de Banda={desired.bandwidth}kbit/s "
+                             f"na interface {self.interface}"
+                             + (f" (condições próprias: {desired.servers})" if desired.servers else ""))
+                for future in futures:
+                    future.set_result(desired)
             else:
-                logging.info("Sem mudanças nas condições de rede, atualização ignorada")
+                for future in futures:
+                    future.set_exception(TcApplyError(error))
 
-    def _apply_tc_rules(self):
-        try:
-            # Remover regras existentes
-            subprocess.run(["sudo", "tc", "qdisc", "del", "dev", self.interface, "root"], 
-                           check=False, stderr=subprocess.PIPE)
-
-            # Aplicar novas regras
-            subprocess.run(["sudo", "tc", "qdisc", "add", "dev", self.interface, "root", "handle", "1:", "netem"], 
-                           check=True)
-            subprocess.run(["sudo", "tc", "qdisc", "add", "dev", self.interface, "parent", "1:", "handle", "2:", "tbf", 
-                            "rate", f"{self.bandwidth}kbit", "burst", self.burst, "latency", self.tc_latency], 
-                           check=True)
-            subprocess.run(["sudo", "tc", "qdisc", "add", "dev", self.interface, "parent", "2:", "handle", "3:", "netem", 
-                            "delay", f"{self.latency}ms", "loss", f"{self.packet_loss}%"], 
-                           check=True)
-
-            logging.info(f"Condições de rede aplicadas: Latência={self.latency}ms, Perda de Pacotes={self.packet_loss}%, "
-                         f"Largura de Banda={self.bandwidth}kbit/s na interface {self.interface}")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Erro ao aplicar regras tc: {e.stderr.decode().strip()}")
+    def _server_index(self, server_name):
+        # Índices estáveis por servidor: definem classid, handle da folha e prioridade do filtro.
+        # Publicados em get_state, para que todos os workers usem o mesmo índice para cada servidor.
+        index = self.server_indexes.get(server_name)
+        if index is None:
+            index = self.server_indexes[server_name] = max(self.server_indexes.values(), default=0) + 1
+        return index
 
-        # Mostrar as regras atuais
-        self._show_current_rules()
+    def _shaping(self, latency, packet_loss, bandwidth):
+        return (('rate', f"{bandwidth}kbit", 'ceil', f"{bandwidth}kbit", 'burst', self.burst),
+                ('delay', f"{latency}ms", 'loss', f"{packet_loss}%"))
 
-    def _show_current_rules(self):
-        try:
-            current_rules = subprocess.check_output(["sudo", "tc", "qdisc", "show", "dev", self.interface], 
-                                                    universal_newlines=True)
-            logging.info(f"Regras TC atuais:\n{current_rules}")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Erro ao obter regras tc atuais: {e.stderr.decode().strip()}")
+    def build_tc_tree(self, conditions):
+        """
+        Árvore desejada: HTB na raiz com uma classe padrão (perfil global) e uma
+        classe por servidor com condições próprias, cada uma com uma folha netem
+        e um filtro flower pelo IP de destino do contêiner.
+        """
+        rate, netem = self._shaping(conditions.latency, conditions.packet_loss, conditions.bandwidth)
+        tree = [
+            TcObject('qdisc', '1:', 'root', 'htb', ('default', '1')),
+            TcObject('class', '1:1', '1:', 'htb', rate),
+            TcObject('qdisc', '10:', '1:1', 'netem', netem)
+        ]
+        for server_name in sorted(conditions.servers):
+            ip = self.server_ips.get(server_name) or self.ip_resolver(server_name)
+            if not ip:
+                logging.warning(f"IP de {server_name} desconhecido; condições próprias não aplicadas")
+                continue
+            self.server_ips[server_name] = ip
+            merged = self._merged_conditions(conditions, server_name)
+            rate, netem = self._shaping(merged['latency'], merged['packet_loss'], merged['bandwidth'])
+            index = self._server_index(server_name)
+            classid = f'1:{100 + index}'
+            tree.append(TcObject('class', classid, '1:', 'htb', rate))
+            tree.append(TcObject('qdisc', f'{100 + index}:', classid, 'netem', netem))
+            tree.append(TcObject('filter', str(index), '1:', 'flower', ('dst_ip', ip, 'classid', classid)))
+        return tree
 
-    def get_current_conditions(self):
+    @staticmethod
+    def _merged_conditions(conditions, server_name):
+        merged = {"latency": conditions.latency, "packet_loss": conditions.packet_loss,
+                  "bandwidth": conditions.bandwidth}
+        merged.update(conditions.servers.get(server_name, {}))
+        return merged
+
+    def get_state(self):
+        """
+        Estado completo (perfil global e condições por servidor), publicado entre workers.
+        """
+        snapshot = self.snapshot
+        return {
+            "latency": snapshot.latency,
+            "packet_loss": snapshot.packet_loss,
+            "bandwidth": snapshot.bandwidth,
+            "servers": {name: dict(override) for name, override in snapshot.servers.items()},
+            "server_indexes": dict(self.server_indexes),
+            "revision": self.revision
+        }
+
+    def set_revision(self, revision):
+        """
+        Registra a revisão com que o estado local foi publicado.
+        """
         with self.lock:
-            return {
-                "latency": self.latency,
-                "packet_loss": self.packet_loss,
-                "bandwidth": self.bandwidth,
-                "interface": self.interface
-            }
+            self.revision = max(self.revision, revision)
+
+    def adopt_state(self, state):
+        """
+        Registra condições já aplicadas por outro worker, sem reaplicar as regras tc.
+        Ignorado enquanto houver atualizações locais pendentes e para revisões que não
+        sejam mais novas que a local: entre uma aplicação local e sua publicação, o
+        estado compartilhado ainda é o anterior.
+
+        Os índices dos servidores (classid, handle e prioridade do filtro) são os
+        do worker que aplicou as regras; sem eles, a árvore deste worker poderia
+        associar o índice de um servidor ao IP de outro.
+        """
+        conditions = NetworkConditions(state['latency'], state['packet_loss'], state['bandwidth'],
+                                       {name: dict(override) for name, override in state.get('servers', {}).items()})
+        server_indexes = state.get('server_indexes')
+        revision = state.get('revision')
+        with self.pending_changed:
+            if self.pending_futures or self.applying:
+                return False
+            if revision is not None:
+                if revision <= self.revision:
+                    return False
+                self.revision = revision
+            self.snapshot = self.desired = conditions
+            self.version += 1
+            if server_indexes is None:
+                # Índices desconhecidos: a próxima aplicação recria a árvore inteira
+                self.tc_engine.applied = None
+            else:
+                self.server_indexes = dict(server_indexes)
+                # O kernel já está nesse estado: a próxima diferença parte dele
+                self.tc_engine.applied = tuple(self.build_tc_tree(conditions))
+        return True
+
+    def get_current_conditions(self):
+        snapshot = self.snapshot
+        return {
+            "latency": snapshot.latency,
+            "packet_loss": snapshot.packet_loss,
+            "bandwidth": snapshot.bandwidth,
+            "interface": self.interface
+        }
+
+    def get_conditions(self, server_name=None):
+        """
+        Condições efetivas para o tráfego de um servidor (perfil global se não houver condições próprias).
+        """
+        conditions = self._merged_conditions(self.snapshot, server_name)
+        conditions["interface"] = self.interface
+        return conditions
+
+    def get_apply_stats(self):
+        stats = dict(self.tc_engine.stats)
+        stats.update(self.apply_stats)
+        stats['pending'] = len(self.pending_futures)
+        return stats
 
     def get_tc_rules(self):
         try:
-            output = subprocess.check_output(["sudo", "tc", "qdisc", "show", "dev", self.interface], universal_newlines=True)
-            return output
+            return self.tc_engine.backend.show(self.interface)
         except subprocess.CalledProcessError as e:
-            logging.error(f"Erro ao obter regras tc: {e.stderr.decode().strip()}")
+            logging.error(f"Erro ao obter regras tc: {e}")
             return "Erro ao obter regras tc"
 
 def resolve_server_ip(server_name):
+    """
+    Resolve o IP do contêiner a partir do registro compartilhado,
+    sem criar um cliente Docker a cada chamada.
+    """
     try:
-        client = docker.from_env()
-        container = client.containers.get(server_name)
-        networks = container.attrs['NetworkSettings']['Networks']
-        if 'streaming-service_default' in networks:
-            return networks['streaming-service_default']['IPAddress']
-        # Fallback para qualquer rede se 'streaming-service_default' não for encontrada
-        for network in networks.values():
-            if network['IPAddress']:
-                return network['IPAddress']
-        raise ValueError(f"No IP address found for {server_name}")
+        ip = container_registry.resolve(server_name)
+        if not ip:
+            raise ValueError(f"No IP address found for {server_name}")
+        return ip
     except Exception as e:
         logging.error(f"Erro ao resolver IP para {server_name}: {str(e)}")
         return None
@@ -124,10 +538,8 @@ network_control = NetworkControl()
 if __name__ == "__main__":
     # Teste da classe NetworkControl
     logging.info("Testando NetworkControl...")
-    network_control.update_conditions(latency=50, packet_loss=1, bandwidth=10000)
-    time.sleep(2)
-    network_control.update_conditions(latency=100, packet_loss=2, bandwidth=5000)
-    time.sleep(2)
+    network_control.update_conditions(latency=50, packet_loss=1, bandwidth=10000).result()
+    network_control.update_conditions(latency=100, packet_loss=2, bandwidth=5000).result()
     current_conditions = network_control.get_current_conditions()
     logging.info(f"Condições atuais: {current_conditions}")
     tc_rules = network_control.get_tc_rules()
@@ -0,0 +1,257 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+import time
+from collections import OrderedDict, namedtuple
+
+# Entrada mantida em memória
+MemoryEntry = namedtuple('MemoryEntry', ['data', 'headers'])
+
+# Entrada mantida em disco
+DiskEntry = namedtuple('DiskEntry', ['path', 'size', 'headers'])
+
+class SegmentWriter:
+    """
+    Grava um segmento em um arquivo temporário enquanto ele é repassado ao cliente.
+    """
+    def __init__(self, cache, key, headers):
+        self.cache = cache
+        self.key = key
+        self.headers = headers
+        self.path = cache.path_for(key)
+        self.tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.file = open(self.tmp_path, 'wb')
+        self.size = 0
+
+    def write(self, chunk):
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        self.file.close()
+        with open(f"{self.path}.json", 'w') as f:
+            json.dump(self.headers, f)
+        os.replace(self.tmp_path, self.path)
+        self.cache.insert_disk(self.key, DiskEntry(self.path, self.size, self.headers), from_origin=True)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+class SegmentCache:
+    """
+    Cache local de segmentos (memória + disco) com orçamento de bytes e despejo LRU.
+
+    Misses concorrentes para a mesma URL são coalescidos (single-flight): apenas
+    a primeira requisição busca na origem, as demais esperam o resultado.
+    """
+
+    CACHEABLE_STATUS = 200
+
+    def __init__(self, cache_dir='segment_cache', max_disk_bytes=2 * 1024 ** 3,
+                 max_memory_bytes=256 * 1024 ** 2, max_memory_item=8 * 1024 ** 2, wait_timeout=30):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.max_memory_item = max_memory_item  # Segmentos maiores ficam apenas em disco
+        self.wait_timeout = wait_timeout  # Tempo máximo de espera por uma busca em andamento
+
+        self.memory = OrderedDict()
+        self.disk = OrderedDict()
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'bytes_from_cache': 0,
+            'bytes_from_origin': 0,
+            'evictions': 0
+        }
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _load_index(self):
+        """
+        Reconstrói o índice de disco a partir dos arquivos existentes (mais antigos primeiro).
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith('.tmp'):
+                # Com vários workers, arquivos recentes podem ser gravações em andamento de outro processo
+                if time.time() - os.path.getmtime(path) > self.wait_timeout:
+                    os.remove(path)
+                continue
+            if name.endswith('.json'):
+                continue
+            try:
+                with open(f"{path}.json") as f:
+                    headers = json.load(f)
+                entries.append((os.path.getmtime(path), path, os.path.getsize(path), headers))
+            except (OSError, ValueError):
+                os.remove(path)
+        for _, path, size, headers in sorted(entries):
+            key = headers.pop('X-Cache-Key', path)
+            self.insert_disk(key, DiskEntry(path, size, headers))
+        if entries:
+            logging.info(f"Cache de segmentos carregado: {len(self.disk)} segmentos, {self.disk_bytes} bytes")
+
+    def lookup(self, key):
+        """
+        Retorna ('memory', MemoryEntry), ('disk', DiskEntry) ou None.
+        """
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                self.stats['bytes_from_cache'] += len(entry.data)
+                return 'memory', entry
+            entry = self.disk.get(key)
+            if entry is None:
+                return None
+            self.disk.move_to_end(key)
+            self.stats['disk_hits'] += 1
+            self.stats['bytes_from_cache'] += entry.size
+
+        # Promove segmentos pequenos para a memória
+        if entry.size <= self.max_memory_item:
+            try:
+                with open(entry.path, 'rb') as f:
+                    data = f.read()
+                memory_entry = MemoryEntry(data, entry.headers)
+                self.insert_memory(key, memory_entry)
+                return 'memory', memory_entry
+            except OSError:
+                self.discard_disk(key)
+                return None
+        # O arquivo pode ter sido despejado por outro worker que compartilha o diretório
+        if not os.path.exists(entry.path):
+            self.discard_disk(key)
+            return None
+        return 'disk', entry
+
+    def discard_disk(self, key):
+        with self.lock:
+            entry = self.disk.pop(key, None)
+            if entry is not None:
+                self.disk_bytes -= entry.size
+
+    def begin(self, key):
+        """
+        Registra uma busca na origem. Retorna (é_líder, evento).
+        O líder deve chamar finish(key) ao terminar; os demais esperam o evento.
+        """
+        now = time.monotonic()
+        with self.lock:
+            flight = self.in_flight.get(key)
+            # Buscas mais antigas que o tempo de espera são consideradas abandonadas
+            if flight is not None and now - flight[1] < self.wait_timeout:
+                self.stats['coalesced'] += 1
+                return False, flight[0]
+            event = threading.Event()
+            self.in_flight[key] = (event, now)
+            self.stats['misses'] += 1
+            return True, event
+
+    def wait(self, event):
+        return event.wait(self.wait_timeout)
+
+    def finish(self, key):
+        with self.lock:
+            flight = self.in_flight.pop(key, None)
+        if flight is not None:
+            flight[0].set()
+
+    def tee(self, key, chunks, headers):
+        """
+        Repassa os blocos ao cliente e grava-os no cache. Só confirma a entrada
+        se o download terminar; sempre libera quem aguarda a mesma URL.
+        """
+        writer = None
+        try:
+            try:
+                writer = SegmentWriter(self, key, dict(headers, **{'X-Cache-Key': key}))
+            except OSError as e:
+                logging.error(f"Erro ao criar arquivo no cache de segmentos: {str(e)}")
+            for chunk in chunks:
+                if writer is not None:
+                    writer.write(chunk)
+                yield chunk
+            if writer is not None:
+                writer.commit()
+                writer = None
+        finally:
+            if writer is not None:
+                writer.abort()
+            self.finish(key)
+
+    def insert_memory(self, key, entry):
+        with self.lock:
+            previous = self.memory.pop(key, None)
+            if previous is not None:
+                self.memory_bytes -= len(previous.data)
+            self.memory[key] = entry
+            self.memory_bytes += len(entry.data)
+            while self.memory_bytes > self.max_memory_bytes and self.memory:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_bytes -= len(evicted.data)
+
+    def insert_disk(self, key, entry, from_origin=False):
+        evicted_paths = []
+        with self.lock:
+            headers = dict(entry.headers)
+            headers.pop('X-Cache-Key', None)
+            previous = self.disk.pop(key, None)
+            if previous is not None:
+                self.disk_bytes -= previous.size
+            self.disk[key] = DiskEntry(entry.path, entry.size, headers)
+            self.disk_bytes += entry.size
+            if from_origin:
+                self.stats['bytes_from_origin'] += entry.size
+            while self.disk_bytes > self.max_disk_bytes and len(self.disk) > 1:
+                evicted_key, evicted = self.disk.popitem(last=False)
+                self.disk_bytes -= evicted.size
+                self.stats['evictions'] += 1
+                memory_entry = self.memory.pop(evicted_key, None)
+                if memory_entry is not None:
+                    self.memory_bytes -= len(memory_entry.data)
+                evicted_paths.append(evicted.path)
+
+        for path in evicted_paths:
+            for file_path in (path, f"{path}.json"):
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            hits = stats['memory_hits'] + stats['disk_hits']
+            stats['hit_ratio'] = hits / (hits + stats['misses']) if hits + stats['misses'] else 0.0
+            stats['memory_bytes'] = self.memory_bytes
+            stats['disk_bytes'] = self.disk_bytes
+            stats['entries'] = len(self.disk)
+            stats['in_flight'] = len(self.in_flight)
+        return stats
+
+# Criar uma única instância para ser usada em toda a aplicação
+segment_cache = SegmentCache(
+    cache_dir=os.environ.get('SEGMENT_CACHE_DIR', 'segment_cache'),
+    max_disk_bytes=int(os.environ.get('SEGMENT_CACHE_MAX_BYTES', 2 * 1024 ** 3)),
+    max_memory_bytes=int(os.environ.get('SEGMENT_CACHE_MEMORY_BYTES', 256 * 1024 ** 2))
+)
@@ -0,0 +1,101 @@
+import threading
+import logging
+import time
+import urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+
+class UpstreamSegment:
+    """
+    Resposta de origem aberta em modo streaming, com o tempo até o primeiro byte.
+    """
+    def __init__(self, response, start_time, ttfb):
+        self.response = response
+        self.start_time = start_time
+        self.ttfb = ttfb
+
+    @property
+    def status_code(self):
+        return self.response.status_code
+
+class SegmentProxy:
+    """
+    Proxy de segmentos com uma Session keep-alive por host de origem.
+    O corpo é repassado em blocos, sem manter o segmento inteiro em memória.
+    """
+
+    CHUNK_SIZE = 256 * 1024  # 256 KiB por bloco
+
+    # Cabeçalhos repassados do cliente para a origem
+    REQUEST_HEADERS = ('Range', 'If-Range', 'If-None-Match', 'If-Modified-Since')
+
+    # Cabeçalhos repassados da origem para o cliente
+    RESPONSE_HEADERS = ('Content-Type', 'Content-Length', 'Content-Range', 'Accept-Ranges',
+                        'Content-Encoding', 'ETag', 'Last-Modified', 'Cache-Control')
+
+    def __init__(self, pool_maxsize=32, timeout=(5, 30)):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout  # (conexão, leitura) em segundos
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get_session(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        session = self.sessions.get(origin)
+        if session is None:
+            with self.lock:
+                session = self.sessions.get(origin)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                    session.mount(f"{parsed.scheme}://", adapter)
+                    self.sessions[origin] = session
+                    logging.info(f"Nova sessão de proxy criada para a origem {origin}")
+        return session
+
+    def open(self, url, client_headers=None):
+        """
+        Abre a requisição à origem e retorna assim que os cabeçalhos chegam.
+        """
+        headers = {}
+        if client_headers:
+            for name in self.REQUEST_HEADERS:
+                value = client_headers.get(name)
+                if value:
+                    headers[name] = value
+
+        start_time = time.perf_counter()
+        response = self.get_session(url).get(url, headers=headers, stream=True, timeout=self.timeout)
+        ttfb = time.perf_counter() - start_time
+        return UpstreamSegment(response, start_time, ttfb)
+
+    def response_headers(self, upstream):
+        return {name: upstream.response.headers[name]
+                for name in self.RESPONSE_HEADERS if name in upstream.response.headers}
+
+    def iter_body(self, upstream, on_complete=None):
+        """
+        Gera o corpo da origem em blocos, sem decodificar (o Content-Encoding é repassado).
+        Ao final chama on_complete(bytes_transferidos, ttfb, tempo_total) se o download terminou.
+        """
+        transferred = 0
+        completed = False
+        try:
+            for chunk in upstream.response.raw.stream(self.CHUNK_SIZE, decode_content=False):
+                transferred += len(chunk)
+                yield chunk
+            completed = True
+        finally:
+            upstream.response.close()
+            if completed and on_complete:
+                on_complete(transferred, upstream.ttfb, time.perf_counter() - upstream.start_time)
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+# Criar uma única instância para ser usada em toda a aplicação
+segment_proxy = SegmentProxy()
@@ -0,0 +1,183 @@
+import os
+import re
+import time
+import secrets
+import threading
+from collections import OrderedDict
+from shared_state import shared_state, write_buffer
+
+# Parâmetro da RELOAD-URI e cookie que identificam a sessão de steering de um player
+SESSION_PARAM = 'session'
+SESSION_COOKIE = 'steering_session'
+
+# Hash do estado compartilhado com os registros das sessões (modo com vários workers)
+SESSIONS_HASH = 'steering_sessions'
+
+# IDs aceitos do cliente: os mesmos caracteres de secrets.token_urlsafe, tamanho limitado
+SESSION_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{8,64}')
+
+def is_valid_session_id(session_id):
+    return bool(session_id) and SESSION_ID_PATTERN.fullmatch(session_id) is not None
+
+class SteeringSession:
+    """
+    Estado de steering de um player (registro compacto com __slots__).
+    """
+    __slots__ = ('session_id', 'created_at', 'last_seen', 'requests', 'last_throughput', 'last_qoe',
+                 'current_server', 'default_server_index', 'last_performance_update',
+                 'throughput_mean', 'throughput_var', 'qoe_mean', 'ttl')
+
+    def __init__(self, session_id, now):
+        self.session_id = session_id
+        self.created_at = now
+        self.last_seen = now
+        self.requests = 0
+        self.last_throughput = 0
+        self.last_qoe = None
+        self.current_server = None
+        self.default_server_index = 0
+        self.last_performance_update = now
+        # Médias e variância móveis usadas no TTL adaptativo
+        self.throughput_mean = None
+        self.throughput_var = 0.0
+        self.qoe_mean = None
+        self.ttl = None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, record):
+        session = cls(record['session_id'], record['created_at'])
+        for name in cls.__slots__:
+            if name in record:
+                setattr(session, name, record[name])
+        return session
+
+class SessionTable:
+    """
+    Tabela de sessões em um OrderedDict mantido em ordem de último acesso:
+    busca, criação e renovação em O(1); as sessões expiradas (TTL) ou
+    excedentes (max_sessions) saem pelo início da fila.
+
+    Com estado compartilhado entre processos, a tabela local é um cache: cada
+    sessão alterada (save) é gravada em SESSIONS_HASH pelo buffer de escrita, e
+    um registro compartilhado mais recente que o local (a sessão foi atendida
+    por outro worker) substitui o local no próximo acesso. O intervalo de
+    sincronização (0.5 s) é bem menor que o TTL das mensagens de steering.
+    """
+    def __init__(self, ttl=300, max_sessions=100000, state=None, buffer=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'created': 0, 'expired': 0, 'evicted': 0, 'adopted': 0}
+        self.state = state if state is not None and state.is_shared else None
+        self.buffer = buffer
+        self.dirty = {}  # Sessões alteradas ainda não gravadas no estado compartilhado
+        if self.state is not None:
+            buffer.flush_hooks.append(self._flush)
+
+    @staticmethod
+    def new_session_id():
+        return secrets.token_urlsafe(12)
+
+    def get_or_create(self, session_id=None):
+        """
+        Retorna (sessão, criada). IDs desconhecidos (ex.: sessão já expirada) são recriados com o mesmo ID.
+        """
+        record = self.state.hget(SESSIONS_HASH, session_id) if self.state is not None and session_id else None
+        now = time.time()
+        with self.lock:
+            session = self.sessions.get(session_id) if session_id else None
+            if record is not None and (session is None or record['last_seen'] > session.last_seen):
+                # Sessão atendida por outro worker desde o último acesso local
+                session = self.sessions[session_id] = SteeringSession.from_dict(record)
+                self.stats['adopted'] += 1
+            created = session is None
+            if created:
+                session_id = session_id or self.new_session_id()
+                session = self.sessions[session_id] = SteeringSession(session_id, now)
+                # Round-robin defasado: sessões novas não começam todas pelo mesmo servidor
+                session.default_server_index = self.stats['created']
+                self.stats['created'] += 1
+            else:
+                self.sessions.move_to_end(session_id)
+                session.last_seen = now
+            self._evict(now)
+        return session, created
+
+    def get(self, session_id):
+        return self.sessions.get(session_id)
+
+    def save(self, session):
+        """
+        Agenda a gravação da sessão alterada no estado compartilhado (sem efeito em um único processo).
+        """
+        if self.state is None:
+            return
+        with self.lock:
+            self.dirty[session.session_id] = session
+        self.buffer.changed()
+
+    def _flush(self, state):
+        with self.lock:
+            dirty, self.dirty = self.dirty, {}
+        for session_id, session in dirty.items():
+            state.hset(SESSIONS_HASH, session_id, session.to_dict())
+
+    def expire_shared(self, now=None):
+        """
+        Remove do estado compartilhado os registros sem acesso há mais de ttl
+        (executado por um único worker). Um registro regravado desde a leitura é mantido.
+        """
+        if self.state is None:
+            return 0
+        expire_before = (now or time.time()) - self.ttl
+        expired = 0
+        for session_id, record in self.state.hgetall(SESSIONS_HASH).items():
+            if record['last_seen'] < expire_before and self.state.hdelete_if(SESSIONS_HASH, session_id, record):
+                expired += 1
+        return expired
+
+    def _evict(self, now):
+        sessions = self.sessions
+        expire_before = now - self.ttl
+        evicted = 0
+        while sessions:
+            oldest = next(iter(sessions.values()))
+            if oldest.last_seen < expire_before:
+                self.stats['expired'] += 1
+            elif len(sessions) > self.max_sessions:
+                self.stats['evicted'] += 1
+            else:
+                break
+            sessions.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def expire(self):
+        """
+        Remove as sessões expiradas mesmo sem novas requisições (chamado periodicamente).
+        """
+        with self.lock:
+            return self._evict(time.time())
+
+    def get_stats(self):
+        self.expire()
+        with self.lock:
+            stats = dict(self.stats)
+            stats.update(active=len(self.sessions), ttl=self.ttl, max_sessions=self.max_sessions,
+                         shared=self.state is not None)
+        return stats
+
+# Criar uma única instância para ser usada em toda a aplicação
+session_table = SessionTable(
+    ttl=float(os.environ.get('STEERING_SESSION_TTL', 300)),
+    max_sessions=int(os.environ.get('STEERING_MAX_SESSIONS', 100000)),
+    state=shared_state,
+    buffer=write_buffer
+)
@@ -0,0 +1,360 @@
+import os
+import json
+import sqlite3
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+class LocalState:
+    """
+    Estado compartilhado dentro de um único processo (modo de desenvolvimento).
+    """
+    is_shared = False
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.queues = {}
+        self.logs = {}
+        self.log_ids = {}
+        # Reentrante: as operações podem ser agrupadas em transaction()
+        self.lock = threading.RLock()
+
+    def transaction(self):
+        return self.lock
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+    def setdefault(self, key, value):
+        with self.lock:
+            return self.values.setdefault(key, value)
+
+    def hget(self, name, field, default=None):
+        return self.hashes.get(name, {}).get(field, default)
+
+    def hset(self, name, field, value):
+        with self.lock:
+            self.hashes.setdefault(name, {})[field] = value
+
+    def hsetdefault(self, name, field, value):
+        with self.lock:
+            return self.hashes.setdefault(name, {}).setdefault(field, value)
+
+    def hgetall(self, name):
+        with self.lock:
+            return dict(self.hashes.get(name, {}))
+
+    def hincr(self, name, field, amount=1):
+        with self.lock:
+            values = self.hashes.setdefault(name, {})
+            values[field] = values.get(field, 0) + amount
+            return values[field]
+
+    def hswap(self, name, field, value):
+        with self.lock:
+            values = self.hashes.setdefault(name, {})
+            previous = values.get(field)
+            values[field] = value
+            return previous
+
+    def hdelete_if(self, name, field, expected):
+        with self.lock:
+            values = self.hashes.get(name, {})
+            if field in values and values[field] == expected:
+                del values[field]
+                return True
+            return False
+
+    def push(self, name, item):
+        with self.lock:
+            self.queues.setdefault(name, deque()).append(item)
+
+    def drain(self, name, limit=1000):
+        with self.lock:
+            items = self.queues.get(name)
+            if not items:
+                return []
+            return [items.popleft() for _ in range(min(limit, len(items)))]
+
+    def append(self, name, item):
+        with self.lock:
+            self.log_ids[name] = self.log_ids.get(name, 0) + 1
+            self.logs.setdefault(name, deque()).append((self.log_ids[name], item))
+
+    def read_since(self, name, after_id, limit=1000):
+        with self.lock:
+            entries = [entry for entry in self.logs.get(name, ()) if entry[0] > after_id]
+        return entries[:limit]
+
+    def trim(self, name, keep):
+        with self.lock:
+            entries = self.logs.get(name)
+            while entries and len(entries) > keep:
+                entries.popleft()
+
+class SQLiteState:
+    """
+    Estado compartilhado entre processos (workers) em um arquivo SQLite em modo WAL.
+    Os valores são armazenados como JSON.
+    """
+    is_shared = True
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        conn = self.connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (name TEXT NOT NULL, field TEXT NOT NULL, "
+                     "value TEXT NOT NULL, PRIMARY KEY (name, field))")
+        conn.execute("CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "name TEXT NOT NULL, value TEXT NOT NULL)")
+        # Registros só de acréscimo, lidos por todos os workers (diferente da fila, consumida por um só)
+        conn.execute("CREATE TABLE IF NOT EXISTS log (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "name TEXT NOT NULL, value TEXT NOT NULL)")
+
+    def connection(self):
+        # Uma conexão por thread, reaberta após fork (conexões SQLite não podem ser herdadas)
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Transação de escrita (BEGIN IMMEDIATE). Dentro de uma transação já aberta
+        pela mesma thread, as operações apenas participam dela.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, key, default=None):
+        return self.hget('', key, default)
+
+    def set(self, key, value):
+        self.hset('', key, value)
+
+    def setdefault(self, key, value):
+        return self.hsetdefault('', key, value)
+
+    def hget(self, name, field, default=None):
+        row = self.connection().execute("SELECT value FROM kv WHERE name = ? AND field = ?", (name, field)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def hset(self, name, field, value):
+        self.connection().execute("INSERT INTO kv (name, field, value) VALUES (?, ?, ?) "
+                                  "ON CONFLICT (name, field) DO UPDATE SET value = excluded.value",
+                                  (name, field, json.dumps(value)))
+
+    def hsetdefault(self, name, field, value):
+        conn = self.connection()
+        conn.execute("INSERT OR IGNORE INTO kv (name, field, value) VALUES (?, ?, ?)", (name, field, json.dumps(value)))
+        return self.hget(name, field, value)
+
+    def hgetall(self, name):
+        rows = self.connection().execute("SELECT field, value FROM kv WHERE name = ?", (name,)).fetchall()
+        return {field: json.loads(value) for field, value in rows}
+
+    def hincr(self, name, field, amount=1):
+        with self.transaction():
+            value = self.hget(name, field, 0) + amount
+            self.hset(name, field, value)
+        return value
+
+    def hswap(self, name, field, value):
+        """
+        Grava o valor e retorna o anterior (None se não havia), atomicamente entre processos.
+        """
+        with self.transaction():
+            previous = self.hget(name, field)
+            self.hset(name, field, value)
+        return previous
+
+    def hdelete_if(self, name, field, expected):
+        """
+        Remove o campo apenas se o valor ainda for o esperado; retorna se removeu.
+        """
+        cursor = self.connection().execute("DELETE FROM kv WHERE name = ? AND field = ? AND value = ?",
+                                           (name, field, json.dumps(expected)))
+        return cursor.rowcount > 0
+
+    def push(self, name, item):
+        self.connection().execute("INSERT INTO queue (name, value) VALUES (?, ?)", (name, json.dumps(item)))
+
+    def drain(self, name, limit=1000):
+        with self.transaction() as conn:
+            rows = conn.execute("SELECT id, value FROM queue WHERE name = ? ORDER BY id LIMIT ?", (name, limit)).fetchall()
+            if rows:
+                conn.execute("DELETE FROM queue WHERE name = ? AND id <= ?", (name, rows[-1][0]))
+        return [json.loads(value) for _, value in rows]
+
+    def append(self, name, item):
+        self.connection().execute("INSERT INTO log (name, value) VALUES (?, ?)", (name, json.dumps(item)))
+
+    def read_since(self, name, after_id, limit=1000):
+        """
+        Entradas (id, item) do registro posteriores a after_id, em ordem.
+        """
+        rows = self.connection().execute("SELECT id, value FROM log WHERE name = ? AND id > ? ORDER BY id LIMIT ?",
+                                         (name, after_id, limit)).fetchall()
+        return [(entry_id, json.loads(value)) for entry_id, value in rows]
+
+    def trim(self, name, keep):
+        """
+        Mantém apenas as keep entradas mais recentes do registro.
+        """
+        self.connection().execute("DELETE FROM log WHERE name = ? AND id <= "
+                                  "(SELECT MAX(id) FROM log WHERE name = ?) - ?", (name, name, keep))
+
+class WriteBuffer:
+    """
+    Escritas frequentes de um worker (contadores, último valor de chaves, filas),
+    acumuladas em memória e gravadas no estado compartilhado em uma única
+    transação por flush (chamado pelo laço de sincronização). Assim as requisições
+    não disputam o lock de escrita do SQLite. As leituras do próprio worker (get)
+    já veem as escritas pendentes.
+
+    flush_hooks são chamados dentro da transação do flush, para escritas que
+    dependem do valor atual (ex.: trocas de atribuição com ajuste de contadores).
+    Sem estado compartilhado entre processos, cada escrita é aplicada na hora.
+    """
+    def __init__(self, state):
+        self.state = state
+        self.lock = threading.Lock()
+        self.values = {}  # (hash ou None, campo) -> último valor
+        self.increments = {}  # (hash, campo) -> soma
+        self.items = []  # (fila, item)
+        self.entries = []  # (registro, item)
+        self.flush_hooks = []
+        self.dirty = False
+        self.stats = {'flushes': 0, 'writes': 0}
+
+    def get(self, key, default=None):
+        with self.lock:
+            if (None, key) in self.values:
+                return self.values[(None, key)]
+        return self.state.get(key, default)
+
+    def set(self, key, value):
+        with self.lock:
+            self.values[(None, key)] = value
+        self.changed()
+
+    def hset(self, name, field, value):
+        with self.lock:
+            self.values[(name, field)] = value
+        self.changed()
+
+    def hincr(self, name, field, amount=1):
+        with self.lock:
+            self.increments[(name, field)] = self.increments.get((name, field), 0) + amount
+        self.changed()
+
+    def push(self, name, item):
+        with self.lock:
+            self.items.append((name, item))
+        self.changed()
+
+    def append(self, name, item):
+        with self.lock:
+            self.entries.append((name, item))
+        self.changed()
+
+    def changed(self):
+        """
+        Há escritas pendentes (também chamado por quem registrou um flush_hook).
+        """
+        self.dirty = True
+        if not self.state.is_shared:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            values, self.values = self.values, {}
+            increments, self.increments = self.increments, {}
+            items, self.items = self.items, []
+            entries, self.entries = self.entries, []
+        state = self.state
+        with state.transaction():
+            for (name, field), value in values.items():
+                if name is None:
+                    state.set(field, value)
+                else:
+                    state.hset(name, field, value)
+            for (name, field), amount in increments.items():
+                state.hincr(name, field, amount)
+            for name, item in items:
+                state.push(name, item)
+            for name, item in entries:
+                state.append(name, item)
+            for hook in self.flush_hooks:
+                hook(state)
+        self.stats['flushes'] += 1
+        self.stats['writes'] += len(values) + len(increments) + len(items) + len(entries)
+
+class LeaderLock:
+    """
+    Eleição de líder entre workers via flock: apenas o processo que detém o
+    lock executa as tarefas de background (monitor, treinamento, etc.).
+    Sem caminho configurado, o próprio processo é sempre o líder.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.file = None
+        self.is_leader = False
+
+    def acquire(self):
+        if self.is_leader:
+            return True
+        if self.path is None:
+            self.is_leader = True
+            return True
+        import fcntl
+        file = open(self.path, 'a+')
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        file.seek(0)
+        file.truncate()
+        file.write(str(os.getpid()))
+        file.flush()
+        self.file = file
+        self.is_leader = True
+        logging.info(f"Processo {os.getpid()} assumiu a liderança das tarefas de background")
+        return True
+
+def create_shared_state():
+    """
+    STEERING_SHARED_STATE aponta para o arquivo SQLite usado entre workers;
+    sem ela, o estado fica apenas no processo atual.
+    """
+    path = os.environ.get('STEERING_SHARED_STATE')
+    if path:
+        return SQLiteState(path), LeaderLock(f"{path}.lock")
+    return LocalState(), LeaderLock()
+
+# Criar uma única instância para ser usada em toda a aplicação
+shared_state, leader_lock = create_shared_state()
+write_buffer = WriteBuffer(shared_state)
@@ -0,0 +1,373 @@
+"""
+Simulador offline das decisões de steering.
+
+Executa a pilha real (rota /manifest.json, Main.select_server, DashParser.build,
+AIServerSelector) pelo test_client do Flask, sem Docker, sem tc e sem navegador:
+o monitor recebe snapshots sintéticos dos nós, o network_control usa o backend
+'dry-run' e um modelo de rede simulado define as condições de cada cache.
+
+Modos:
+  - população sintética de players (--players, --duration), que seguem a
+    RELOAD-URI e o TTL devolvidos pelo servidor;
+  - replay de um log de requisições em JSON lines (--replay), uma requisição por
+    linha: {"t": s, "session": id, "pathway": nome, "throughput": bit/s, "content": id}.
+    --record grava as requisições de uma execução sintética nesse formato.
+
+Relata decisões por segundo, latência p50/p99 da decisão, distribuição da QoE e
+o equilíbrio de carga entre os caches. --max-p99-ms, --min-rate e --min-fairness
+fazem o processo terminar com código 1 em caso de regressão (uso em CI).
+"""
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import argparse
+import tempfile
+import urllib.parse
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Intervalo (s simulados) entre atualizações do modelo de rede
+NETWORK_STEP = 2.0
+
+# Players por cache antes de a banda do cache começar a ser dividida
+PLAYERS_PER_CACHE = 50
+
+# Nome do enlace do cliente no modelo de rede (condições globais, usadas na QoE)
+CLIENT_LINK = 'client'
+
+class NetworkModel:
+    """
+    Condições do enlace do cliente e de cada cache em passeio aleatório em torno
+    de um perfil base, com degradações ocasionais (incidentes) de alguns passos.
+    """
+    def __init__(self, servers, rng, latency=35, packet_loss=0.5, bandwidth=10000, incident_rate=0.02):
+        self.rng = rng
+        self.base = {'latency': latency, 'packet_loss': packet_loss, 'bandwidth': bandwidth}
+        self.incident_rate = incident_rate
+        self.links = {name: dict(self.base) for name in [CLIENT_LINK] + list(servers)}
+        self.incidents = dict.fromkeys(self.links, 0)
+
+    @property
+    def client(self):
+        return self.links[CLIENT_LINK]
+
+    @property
+    def conditions(self):
+        return {name: conditions for name, conditions in self.links.items() if name != CLIENT_LINK}
+
+    def step(self):
+        rng = self.rng
+        base = self.base
+        for name, conditions in self.links.items():
+            if self.incidents[name] == 0 and rng.random() < self.incident_rate:
+                self.incidents[name] = rng.randint(3, 15)
+            degraded = self.incidents[name] > 0
+            self.incidents[name] = max(self.incidents[name] - 1, 0)
+
+            # Reversão à média: as condições oscilam sem se afastar do perfil base
+            target_latency = base['latency'] * (4 if degraded else 1)
+            conditions['latency'] = max(1.0, conditions['latency'] + 0.3 * (target_latency - conditions['latency'])
+                                        + rng.gauss(0, base['latency'] * 0.1))
+            target_loss = base['packet_loss'] * (4 if degraded else 1)
+            conditions['packet_loss'] = min(max(0.01, conditions['packet_loss'] + 0.3 * (target_loss - conditions['packet_loss'])
+                                                + rng.gauss(0, 0.05)), 2.0)
+            target_bandwidth = base['bandwidth'] / (5 if degraded else 1)
+            conditions['bandwidth'] = max(500.0, conditions['bandwidth'] * rng.lognormvariate(0, 0.1)
+                                          + 0.3 * (target_bandwidth - conditions['bandwidth']))
+        return self
+
+class Player:
+    __slots__ = ('session_id', 'content', 'pathway', 'reload_path')
+
+    def __init__(self, content):
+        self.session_id = None
+        self.content = content
+        self.pathway = ''
+        self.reload_path = '/manifest.json'
+
+class SimulatedEnvironment:
+    """
+    Importa a aplicação com backends sem efeitos colaterais e substitui o monitor
+    e a resolução de IPs por dados sintéticos.
+    """
+    def __init__(self, servers, strategy=None, use_ai=False, seed=0):
+        os.environ.setdefault('NETWORK_CONTROL_BACKEND', 'dry-run')
+        os.environ['CACHE_SERVERS'] = ','.join(servers)
+        os.environ.setdefault('STEERING_METRICS', 'on')
+        if REPO_DIR not in sys.path:
+            sys.path.insert(0, REPO_DIR)
+
+        import app
+        from container_registry import container_registry, ContainerInfo
+        self.app = app
+        # Sem cookies: cada player simulado se identifica apenas pela RELOAD-URI
+        self.client = app.app.test_client(use_cookies=False)
+        self.servers = servers
+        self.ips = {name: f'10.0.0.{index + 2}' for index, name in enumerate(servers)}
+        self.snapshot_version = 0
+        # Tempo simulado: o TTL adaptativo mede estabilidade no relógio da simulação, não no de parede
+        self.now = 0.0
+        app.adaptive_ttl.clock = lambda: self.now
+
+        # Registro de contêineres preenchido com os caches simulados (nenhuma consulta ao Docker)
+        container_registry.ttl = float('inf')
+        for name, ip in self.ips.items():
+            container_registry._store(ContainerInfo(name=name, id=None, status='running', ip=ip, updated_at=time.time()))
+        app.network_control.ip_resolver = self.ips.get
+        app.monitor.set_user_active_servers(servers)
+        app.load_balancer.rng.seed(seed)
+        app.main_app.use_ai_steering = use_ai
+        if strategy:
+            app.main_app.steering_strategy = strategy
+
+    def apply_network(self, network):
+        """
+        Aplica as condições do modelo (regras tc no backend dry-run) e publica o snapshot dos nós.
+        """
+        network_control = self.app.network_control
+        conditions = network.conditions
+        futures = [network_control.update_conditions(**network.client)]
+        futures.extend(network_control.set_server_conditions(name, **values) for name, values in conditions.items())
+        for future in futures:
+            future.result(timeout=10)
+        now = time.time()
+        self.snapshot_version += 1
+        nodes = [(name, self.ips[name], conditions[name]['latency'] / 1000, now) for name in self.servers]
+        self.app.monitor.adopt_snapshot(self.snapshot_version, now, nodes)
+
+    def request(self, path, params):
+        """
+        Retorna (mensagem de steering, duração em s).
+        """
+        query = urllib.parse.urlencode({name: value for name, value in params.items() if value not in (None, '')})
+        separator = '&' if '?' in path else '?'
+        start = time.perf_counter()
+        response = self.client.get(f'{path}{separator}{query}' if query else path)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f"/manifest.json respondeu {response.status_code}: {response.get_data(as_text=True)}")
+        return response.get_json(), elapsed
+
+    def session_qoe(self, session_id):
+        session = self.app.session_table.get(session_id)
+        return session.last_qoe if session else None
+
+    def stage_latencies(self):
+        """
+        Duração média (ms) de cada etapa instrumentada.
+        """
+        stages = {}
+        for (stage,), (_, total, count) in self.app.instrumentation.stage_duration.series.items():
+            stages[stage] = {'count': count, 'mean_ms': round(total / count * 1000, 4) if count else None}
+        return stages
+
+    def close(self):
+        self.app.do_cleanup()
+
+def measured_throughput(conditions, client, load, rng):
+    """
+    Throughput (bit/s) que o player informaria: a banda do cache, dividida entre
+    os players quando o cache está cheio, limitada pelo enlace do cliente e com
+    ruído de medição.
+    """
+    share = max(1.0, load / PLAYERS_PER_CACHE)
+    return min(conditions['bandwidth'] / share, client['bandwidth']) * 1000 * rng.uniform(0.6, 0.95)
+
+def run_synthetic(env, network, players, duration, rng, record=None):
+    """
+    Players chegam ao longo do primeiro TTL e seguem a RELOAD-URI/TTL de cada resposta.
+    """
+    samples = []
+    population = [Player(f'content-{rng.randrange(max(players // 10, 1))}') for _ in range(players)]
+    queue = [(rng.uniform(0, 10), index) for index in range(players)]
+    heapq.heapify(queue)
+    load = dict.fromkeys(env.servers, 0)
+    next_step = 0.0
+
+    while queue:
+        sim_time, index = heapq.heappop(queue)
+        if sim_time > duration:
+            break
+        if sim_time >= next_step:
+            env.apply_network(network.step())
+            next_step = sim_time + NETWORK_STEP
+
+        env.now = sim_time
+        player = population[index]
+        conditions = network.conditions.get(player.pathway)
+        throughput = measured_throughput(conditions, network.client, load[player.pathway], rng) if conditions else 0
+        params = {'_DASH_pathway': player.pathway, '_DASH_throughput': round(throughput)}
+        if player.session_id is None:
+            params['content'] = player.content
+        message, elapsed = env.request(player.reload_path, params)
+
+        reload_uri = urllib.parse.urlsplit(message['RELOAD-URI'])
+        session_id = urllib.parse.parse_qs(reload_uri.query).get('session', [None])[0]
+        if record is not None:
+            record.write(json.dumps({'t': round(sim_time, 3), 'session': session_id, 'pathway': player.pathway,
+                                     'throughput': round(throughput), 'content': player.content}) + '\n')
+
+        pathway = message['PATHWAY-PRIORITY'][0]
+        if player.pathway in load:
+            load[player.pathway] -= 1
+        if pathway in load:
+            load[pathway] += 1
+        player.session_id = session_id
+        player.pathway = pathway
+        player.reload_path = f'{reload_uri.path}?{reload_uri.query}'
+        samples.append((elapsed, pathway, env.session_qoe(session_id)))
+        heapq.heappush(queue, (sim_time + message.get('TTL', 10), index))
+    return samples
+
+def run_replay(env, network, path):
+    """
+    Reenvia as requisições do log na ordem do campo "t"; o modelo de rede avança com o tempo do log.
+    """
+    with open(path, encoding='utf-8') as f:
+        records = sorted((json.loads(line) for line in f if line.strip()), key=lambda record: record.get('t', 0))
+    samples = []
+    next_step = None
+    for record in records:
+        sim_time = env.now = record.get('t', 0)
+        if next_step is None or sim_time >= next_step:
+            env.apply_network(network.step())
+            next_step = sim_time + NETWORK_STEP
+        params = {'session': record.get('session'), 'content': record.get('content'),
+                  '_DASH_pathway': record.get('pathway'), '_DASH_throughput': record.get('throughput')}
+        message, elapsed = env.request('/manifest.json', params)
+        session_id = urllib.parse.parse_qs(urllib.parse.urlsplit(message['RELOAD-URI']).query).get('session', [None])[0]
+        samples.append((elapsed, message['PATHWAY-PRIORITY'][0], env.session_qoe(session_id)))
+    return samples
+
+def jain_fairness(values):
+    """
+    Índice de Jain: 1.0 com carga perfeitamente igual, 1/n com tudo em um único servidor.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values) or not values.any():
+        return None
+    return float(values.sum() ** 2 / (len(values) * (values ** 2).sum()))
+
+def build_report(env, samples, wall_time):
+    latencies = np.array([elapsed for elapsed, _, _ in samples]) * 1000
+    qoes = np.array([qoe for _, _, qoe in samples if qoe is not None])
+    decisions = {name: 0 for name in env.servers}
+    for _, pathway, _ in samples:
+        decisions[pathway] = decisions.get(pathway, 0) + 1
+    server_load = env.app.server_load.get_stats()
+    sessions = [server_load.get(name, {}).get('sessions', 0) for name in env.servers]
+
+    return {
+        'decisions': len(samples),
+        'wall_time_s': round(wall_time, 3),
+        # Só o tempo dentro das requisições: o modelo de rede e o próprio simulador ficam de fora
+        'decisions_per_second': round(len(samples) / (latencies.sum() / 1000), 1) if len(samples) else None,
+        'latency_ms': {
+            'p50': round(float(np.percentile(latencies, 50)), 3),
+            'p99': round(float(np.percentile(latencies, 99)), 3),
+            'max': round(float(latencies.max()), 3)
+        } if len(latencies) else None,
+        'qoe': {
+            'mean': round(float(qoes.mean()), 3),
+            'p5': round(float(np.percentile(qoes, 5)), 3),
+            'p50': round(float(np.percentile(qoes, 50)), 3),
+            'p95': round(float(np.percentile(qoes, 95)), 3),
+            'histogram': dict(zip([f'{edge:.1f}' for edge in np.arange(1, 5, 0.5)],
+                                  np.histogram(qoes, bins=8, range=(1, 5))[0].tolist()))
+        } if len(qoes) else None,
+        'load': {
+            'decisions': decisions,
+            'active_sessions': dict(zip(env.servers, sessions)),
+            'fairness': jain_fairness([decisions[name] for name in env.servers]),
+            'session_fairness': jain_fairness(sessions)
+        },
+        'ttl': env.app.adaptive_ttl.get_stats(),
+        'stages': env.stage_latencies()
+    }
+
+def check_thresholds(report, args):
+    failures = []
+    latency = report['latency_ms'] or {}
+    if args.max_p99_ms is not None and latency.get('p99', 0) > args.max_p99_ms:
+        failures.append(f"p99 {latency['p99']}ms > {args.max_p99_ms}ms")
+    if args.min_rate is not None and (report['decisions_per_second'] or 0) < args.min_rate:
+        failures.append(f"{report['decisions_per_second']} decisões/s < {args.min_rate}")
+    fairness = report['load']['fairness']
+    if args.min_fairness is not None and (fairness or 0) < args.min_fairness:
+        failures.append(f"equilíbrio de carga {fairness} < {args.min_fairness}")
+    return failures
+
+def print_report(report):
+    latency = report['latency_ms'] or {}
+    print(f"Decisões: {report['decisions']} em {report['wall_time_s']}s "
+          f"({report['decisions_per_second']} decisões/s)")
+    print(f"Latência da decisão: p50={latency.get('p50')}ms p99={latency.get('p99')}ms max={latency.get('max')}ms")
+    if report['qoe']:
+        qoe = report['qoe']
+        print(f"QoE: média={qoe['mean']} p5={qoe['p5']} p50={qoe['p50']} p95={qoe['p95']}")
+    load = report['load']
+    print(f"Decisões por cache: {load['decisions']} (índice de Jain: {load['fairness']})")
+    print(f"Sessões ativas por cache: {load['active_sessions']} (índice de Jain: {load['session_fairness']})")
+    print(f"TTL médio: {report['ttl']['mean_ttl']}s (limites {report['ttl']['min_ttl']}-{report['ttl']['max_ttl']}s)")
+    for stage, values in sorted(report['stages'].items()):
+        print(f"  {stage}: {values['count']} chamadas, média {values['mean_ms']}ms")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulador offline das decisões de steering')
+    parser.add_argument('--replay', help='Log de requisições (JSON lines) a reenviar')
+    parser.add_argument('--record', help='Grava as requisições da execução sintética (JSON lines)')
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=120, help='Duração simulada (s)')
+    parser.add_argument('--servers', type=int, default=3)
+    parser.add_argument('--strategy', help='Estratégia do método padrão (ex.: least_sessions)')
+    parser.add_argument('--ai', action='store_true', help='Usa o steering por IA')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--incident-rate', type=float, default=0.02,
+                        help='Probabilidade de degradação de cada enlace a cada passo do modelo de rede')
+    parser.add_argument('--workdir', help='Diretório dos logs e modelos da execução (padrão: temporário)')
+    parser.add_argument('--json', help='Grava o relatório neste arquivo')
+    parser.add_argument('--max-p99-ms', type=float)
+    parser.add_argument('--min-rate', type=float, help='Mínimo de decisões por segundo')
+    parser.add_argument('--min-fairness', type=float, help='Índice de Jain mínimo das decisões por cache')
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    record_path = os.path.abspath(args.record) if args.record else None
+    replay_path = os.path.abspath(args.replay) if args.replay else None
+    # Logs, eventos e modelos da aplicação ficam fora do diretório do projeto
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir or tempfile.mkdtemp(prefix='steering-sim-'))
+
+    rng = random.Random(args.seed)
+    servers = [f'video-streaming-cache-{index + 1}' for index in range(args.servers)]
+    env = SimulatedEnvironment(servers, strategy=args.strategy, use_ai=args.ai, seed=args.seed)
+    network = NetworkModel(servers, rng, incident_rate=args.incident_rate)
+    try:
+        start = time.perf_counter()
+        if replay_path:
+            samples = run_replay(env, network, replay_path)
+        else:
+            record = open(record_path, 'w', encoding='utf-8') if record_path else None
+            try:
+                samples = run_synthetic(env, network, args.players, args.duration, rng, record)
+            finally:
+                if record:
+                    record.close()
+        report = build_report(env, samples, time.perf_counter() - start)
+    finally:
+        env.close()
+
+    print_report(report)
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_thresholds(report, args)
+    for failure in failures:
+        print(f"REGRESSÃO: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,330 @@
+import os
+import csv
+import time
+import threading
+import logging
+from collections import namedtuple
+
+# Ponto do trace: instante relativo (s) e condições; None mantém o valor atual
+TracePoint = namedtuple('TracePoint', ['time', 'latency', 'packet_loss', 'bandwidth'])
+
+# Tamanho do pacote entregue a cada oportunidade de um trace mahimahi (bytes)
+MAHIMAHI_PACKET_BYTES = 1500
+
+CSV_COLUMNS = {
+    'time': ('time', 'timestamp', 't', 'time_s', 'seconds'),
+    'latency': ('latency', 'latency_ms', 'rtt', 'rtt_ms', 'delay', 'delay_ms'),
+    'packet_loss': ('packet_loss', 'loss', 'loss_pct', 'packetloss'),
+    'bandwidth': ('bandwidth', 'bandwidth_kbps', 'throughput', 'throughput_kbps', 'kbps')
+}
+
+def parse_csv(lines):
+    """
+    CSV com cabeçalho: tempo (s) e qualquer combinação de latência (ms),
+    perda (%) e largura de banda (kbit/s).
+    """
+    reader = csv.DictReader(line for line in lines if line.strip() and not line.startswith('#'))
+    fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+    columns = {key: next((fields[alias] for alias in aliases if alias in fields), None)
+               for key, aliases in CSV_COLUMNS.items()}
+    if columns['time'] is None:
+        raise ValueError("Trace CSV sem coluna de tempo")
+
+    def value(row, key, cast):
+        column = columns[key]
+        if column is None or row.get(column) in (None, ''):
+            return None
+        return cast(row[column])
+
+    # Latência e banda podem ser fracionárias no arquivo; o tc recebe valores inteiros
+    def rounded(text):
+        return int(round(float(text)))
+
+    return [TracePoint(float(row[columns['time']]), value(row, 'latency', rounded),
+                       value(row, 'packet_loss', float), value(row, 'bandwidth', rounded)) for row in reader]
+
+def parse_hsdpa(lines):
+    """
+    Logs do dataset HSDPA (3G, Noruega): timestamp, ms desde o início,
+    latitude, longitude, bytes recebidos, ms decorridos desde a amostra anterior.
+    """
+    points = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 6:
+            continue
+        elapsed_ms = float(parts[5])
+        if elapsed_ms <= 0:
+            continue
+        bandwidth = int(float(parts[4]) * 8 / elapsed_ms)  # bytes/ms -> kbit/s
+        points.append(TracePoint(float(parts[1]) / 1000, None, None, max(bandwidth, 1)))
+    return points
+
+def parse_mbps(lines):
+    """
+    Formato de duas colunas usado por traces 4G/5G convertidos (ex.: Pensieve, Lumos5G):
+    tempo (s) e vazão (Mbit/s).
+    """
+    points = []
+    for line in lines:
+        parts = line.replace(',', ' ').split()
+        if len(parts) < 2 or line.startswith('#'):
+            continue
+        try:
+            points.append(TracePoint(float(parts[0]), None, None, max(int(float(parts[1]) * 1000), 1)))
+        except ValueError:
+            continue  # Cabeçalho
+    return points
+
+def parse_mahimahi(lines, window=1.0):
+    """
+    Traces mahimahi: cada linha é o instante (ms) de uma oportunidade de entrega
+    de um pacote de 1500 bytes. Convertido em largura de banda por janela.
+    """
+    counts = {}
+    for line in lines:
+        line = line.strip()
+        if line:
+            slot = int(int(line) / 1000 / window)
+            counts[slot] = counts.get(slot, 0) + 1
+    if not counts:
+        return []
+    return [TracePoint(slot * window, None, None,
+                       max(int(counts.get(slot, 0) * MAHIMAHI_PACKET_BYTES * 8 / 1000 / window), 1))
+            for slot in range(max(counts) + 1)]
+
+TRACE_FORMATS = {
+    'csv': parse_csv,
+    'hsdpa': parse_hsdpa,
+    'mbps': parse_mbps,
+    'mahimahi': parse_mahimahi
+}
+
+def detect_format(path, first_line):
+    if path.endswith('.csv') or any(c.isalpha() for c in first_line):
+        return 'csv' if ',' in first_line else 'mbps'
+    parts = first_line.split()
+    if len(parts) >= 6:
+        return 'hsdpa'
+    if len(parts) == 1:
+        return 'mahimahi'
+    return 'mbps'
+
+def load_trace(path=None, content=None, trace_format=None):
+    """
+    Carrega um trace de um arquivo ou de um texto, normalizando o tempo para começar em zero.
+    """
+    lines = content.splitlines() if content is not None else open(path, encoding='utf-8').read().splitlines()
+    first_line = next((line for line in lines if line.strip()), '')
+    trace_format = trace_format or detect_format(path or '', first_line)
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"Formato de trace desconhecido: {trace_format}. Opções: {sorted(TRACE_FORMATS)}")
+    points = sorted(TRACE_FORMATS[trace_format](lines), key=lambda point: point.time)
+    if not points:
+        raise ValueError("Trace vazio")
+    start = points[0].time
+    return [point._replace(time=point.time - start) for point in points], trace_format
+
+def compress_trace(points, tolerance=0.05, min_interval=0.0):
+    """
+    Remove pontos que não mudam as condições além da tolerância relativa e
+    junta pontos mais próximos que min_interval (s de trace), mantendo o último.
+    """
+    def differs(a, b):
+        if a is None or b is None:
+            return a != b
+        return abs(a - b) > tolerance * max(abs(b), 1e-9)
+
+    compressed = []
+    for point in points:
+        if compressed:
+            last = compressed[-1]
+            if point.time - last.time < min_interval:
+                # Mantém o instante do ponto anterior com as condições mais recentes
+                compressed[-1] = point._replace(time=last.time)
+                continue
+            if not any(differs(getattr(point, key), getattr(last, key))
+                       for key in ('latency', 'packet_loss', 'bandwidth')):
+                continue
+        compressed.append(point)
+    return compressed
+
+class TracePlayer:
+    """
+    Reproduz um trace chamando apply_conditions(latency, packet_loss, bandwidth)
+    em um escalonador de tempo absoluto: cada ponto é agendado em relação ao
+    início da reprodução, então atrasos não se acumulam. Se a reprodução
+    atrasar, os pontos vencidos são pulados e apenas o mais recente é aplicado.
+    """
+    def __init__(self, apply_conditions, stop_requested=None, status_listener=None, finished_listener=None):
+        self.apply_conditions = apply_conditions
+        # Permite que outro processo peça a parada (ex.: outro worker do gunicorn)
+        self.stop_requested = stop_requested or (lambda started_at: False)
+        self.status_listener = status_listener
+        self.finished_listener = finished_listener
+        self.points = []
+        self.name = None
+        self.trace_format = None
+        self.original_points = 0
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.status = self._initial_status()
+
+    @staticmethod
+    def _initial_status():
+        return {'running': False, 'speed': 1.0, 'loop': False, 'loops_completed': 0, 'position': 0,
+                'applied': 0, 'skipped': 0, 'max_lateness': 0.0, 'mean_lateness': 0.0,
+                'max_ack_latency': 0.0, 'failures': 0, 'started_at': None}
+
+    def load(self, points, name, trace_format, tolerance=0.05, min_interval=0.0):
+        with self.lock:
+            if self.status['running']:
+                raise RuntimeError("Trace em reprodução; pare-o antes de carregar outro")
+            self.original_points = len(points)
+            self.points = compress_trace(points, tolerance, min_interval)
+            self.name = name
+            self.trace_format = trace_format
+        logging.info(f"Trace {name} carregado ({trace_format}): {self.original_points} pontos, "
+                     f"{len(self.points)} após compressão, {self.duration:.1f}s")
+        return self.summary()
+
+    def export(self):
+        """
+        Trace carregado (já comprimido) em formato JSON, publicado para os demais workers.
+        """
+        with self.lock:
+            return {'name': self.name, 'format': self.trace_format, 'original_points': self.original_points,
+                    'points': [list(point) for point in self.points]}
+
+    def adopt(self, trace):
+        """
+        Usa um trace carregado por outro worker (sem comprimir de novo).
+        """
+        with self.lock:
+            if self.status['running']:
+                raise RuntimeError("Trace em reprodução; pare-o antes de carregar outro")
+            self.points = [TracePoint(*point) for point in trace['points']]
+            self.name = trace['name']
+            self.trace_format = trace['format']
+            self.original_points = trace['original_points']
+
+    @property
+    def duration(self):
+        return self.points[-1].time if self.points else 0.0
+
+    def summary(self):
+        return {'name': self.name, 'format': self.trace_format, 'points': len(self.points),
+                'original_points': self.original_points, 'duration': self.duration}
+
+    def start(self, speed=1.0, loop=False):
+        if speed <= 0:
+            raise ValueError("O fator de velocidade deve ser positivo")
+        with self.lock:
+            if not self.points:
+                raise RuntimeError("Nenhum trace carregado")
+            if self.status['running']:
+                raise RuntimeError("Trace já em reprodução")
+            self.status = self._initial_status()
+            self.status.update(running=True, speed=speed, loop=loop, started_at=time.time())
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._play, args=(list(self.points), speed, loop), daemon=True)
+            self.thread.start()
+        logging.info(f"Reprodução do trace {self.name} iniciada (velocidade {speed}x, loop={loop})")
+
+    def stop(self):
+        self.stop_event.set()
+        thread = self.thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+
+    def _play(self, points, speed, loop):
+        # Duração de uma volta em tempo real; o último ponto vale até o fim de seu intervalo médio
+        period = (points[-1].time + (points[-1].time / max(len(points) - 1, 1))) / speed if len(points) > 1 else 0
+        start = time.monotonic()
+        started_at = self.status['started_at']
+        lateness_total = 0.0
+        iteration = 0
+        try:
+            while not self.stop_event.is_set():
+                offset = start + iteration * period
+                index = 0
+                while index < len(points):
+                    target = offset + points[index].time / speed
+                    # Espera até o instante absoluto do ponto (interrompível por stop)
+                    remaining = target - time.monotonic()
+                    if remaining > 0 and self.stop_event.wait(remaining):
+                        return
+                    if self.stop_requested(started_at):
+                        return
+
+                    # Atrasado: pula os pontos que também já venceram e aplica o mais recente
+                    now = time.monotonic()
+                    while index + 1 < len(points) and offset + points[index + 1].time / speed <= now:
+                        index += 1
+                        self.status['skipped'] += 1
+
+                    point = points[index]
+                    lateness = now - (offset + point.time / speed)
+                    self._apply(point)
+                    self.status['applied'] += 1
+                    self.status['position'] = index
+                    lateness_total += lateness
+                    self.status['max_lateness'] = max(self.status['max_lateness'], lateness)
+                    self.status['mean_lateness'] = lateness_total / self.status['applied']
+                    self._notify()
+                    index += 1
+
+                self.status['loops_completed'] += 1
+                if not loop or period <= 0:
+                    return
+                iteration += 1
+        finally:
+            self.status['running'] = False
+            self._notify()
+            logging.info(f"Reprodução do trace {self.name} encerrada: {self.status['applied']} pontos aplicados, "
+                         f"{self.status['skipped']} pulados")
+            if self.finished_listener is not None:
+                self.finished_listener()
+
+    def _notify(self):
+        if self.status_listener is None:
+            return
+        try:
+            self.status_listener(self.get_status())
+        except Exception as e:
+            logging.error(f"Erro ao publicar o estado do trace: {e}")
+
+    def _apply(self, point):
+        requested_at = time.monotonic()
+        try:
+            future = self.apply_conditions(point.latency, point.packet_loss, point.bandwidth)
+        except Exception as e:
+            self.status['failures'] += 1
+            logging.error(f"Erro ao aplicar ponto do trace: {e}")
+            return
+        if future is None:
+            return
+
+        def on_done(done):
+            if done.exception() is not None:
+                self.status['failures'] += 1
+                return
+            ack_latency = time.monotonic() - requested_at
+            self.status['max_ack_latency'] = max(self.status['max_ack_latency'], ack_latency)
+        future.add_done_callback(on_done)
+
+    def get_status(self):
+        status = dict(self.status)
+        status.update(self.summary())
+        return status
+
+def resolve_trace_path(trace_dir, name):
+    """
+    Caminho de um trace dentro do diretório de traces (sem sair dele).
+    """
+    base = os.path.abspath(trace_dir)
+    path = os.path.abspath(os.path.join(base, name))
+    if os.path.commonpath([base, path]) != base:
+        raise ValueError("Caminho de trace fora do diretório de traces")
+    return path
@@ -0,0 +1,6 @@
+# Ponto de entrada WSGI do modo de produção (gunicorn).
+# Cada worker importa este módulo e inicia suas tarefas de background;
+# apenas o worker que obtém o lock de liderança executa o monitor e o treinamento.
+from app import app as application, start_background_services
+
+start_background_services()